@@ -0,0 +1,87 @@
+"""Compare concurrent-client throughput of the sync and async read endpoints.
+
+Start the two deployments against the same database, with production
+settings and the same number of worker processes, e.g.::
+
+    gunicorn egbin_ssp.wsgi:application --bind 127.0.0.1:8000 --workers 4
+    uvicorn egbin_ssp.asgi:application --port 8001 --workers 4
+
+gunicorn is not in requirements.txt; `pip install gunicorn` to run this.
+Don't use runserver as the sync side: it is a development server and
+says nothing about how the WSGI deployment behaves.
+
+then run::
+
+    python -m benchmarks.concurrency --token <access token> \\
+        --sync http://localhost:8000/api/ --async http://localhost:8001/api/async/
+
+Every endpoint is hit by --clients threads at once, --requests times in
+total, against both deployments. Each line of the report gives requests per
+second and the p50/p95 latency.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+
+import requests
+
+
+ENDPOINTS = [
+    'inconvenience-requests/',
+    'inconvenience-request-lines/',
+    'inconvenience-request-lines/own/',
+    'users/',
+    'days/',
+]
+
+_sessions = local()
+
+
+def get_session():
+    # One keep-alive session per client thread
+    if not hasattr(_sessions, 'session'):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def timed_get(url, headers):
+    started = time.perf_counter()
+    response = get_session().get(url, headers=headers)
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def run(url, headers, clients, total):
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        started = time.perf_counter()
+        latencies = sorted(pool.map(lambda _: timed_get(url, headers), range(total)))
+        elapsed = time.perf_counter() - started
+    return {
+        'rps': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync', dest='sync_url', default='http://localhost:8000/api/', help='Base URL of the WSGI deployment')
+    parser.add_argument('--async', dest='async_url', default='http://localhost:8001/api/async/', help='Base URL of the ASGI async endpoints')
+    parser.add_argument('--token', required=True, help='JWT access token to send')
+    parser.add_argument('--clients', type=int, default=50, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and deployment')
+    parser.add_argument('--endpoint', action='append', help='Only these endpoints (relative to the base URLs)')
+    args = parser.parse_args(argv)
+
+    headers = {'Authorization': f'Bearer {args.token}'}
+    print(f'{"endpoint":36} {"mode":5} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+    for endpoint in args.endpoint or ENDPOINTS:
+        for mode, base_url in (('sync', args.sync_url), ('async', args.async_url)):
+            result = run(base_url + endpoint, headers, args.clients, args.requests)
+            print(f'{endpoint:36} {mode:5} {result["rps"]:8.1f} {result["p50_ms"]:8.1f} {result["p95_ms"]:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Synthetic data for the benchmarks.
+
+Everything is written with bulk_create. Lines are priced with
+calculate_allowances, and each employee's days are handed out from a running
+pointer into the calendar, so the data satisfies the same rules as data
+entered through the API (one booking per employee and day).
+"""
+import itertools
+from collections import namedtuple
+from datetime import date
+
+from django.contrib.auth.models import Group
+from django.contrib.auth.hashers import make_password
+
+from inconvenience_allowance.allowance import calculate_allowances
+from inconvenience_allowance.day_calendar import day_calendar, generate_days
+from inconvenience_allowance.models import (
+    Day, InconvenienceRequest, InconvenienceRequestLine, InconvenienceRequestLineDay,
+)
+from inconvenience_allowance.sequences import reserve_request_ids
+from user.models import Department, User
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
+
+
+Sizes = namedtuple('Sizes', [
+    'departments', 'users_per_department', 'requests_per_department', 'lines_per_request', 'days_per_line', 'years',
+], defaults=(5, 40, 20, 10, 2, 2))
+
+Fixtures = namedtuple('Fixtures', ['sizes', 'departments', 'users', 'spare_days', 'first_year'])
+
+# Requests cycle through these so every list filter has something to do
+STATUSES = ['draft', 'submitted', 'manager_approved', 'work_done', 'completed']
+
+
+def build_fixtures(sizes, first_year=2000):
+    """Create departments, users, days, requests and lines of the given sizes.
+
+    `users` maps each role to its users; there is one rep, line manager and
+    HR officer per department. The year after the fixtures is left unbooked and returned
+    as `spare_days` for benchmarks that create lines.
+    """
+    last_year = first_year + sizes.years - 1
+    generate_days(date(first_year, 1, 1), date(last_year + 1, 12, 31), [date(year, 1, 1) for year in range(first_year, last_year + 2)])
+    day_calendar.invalidate()
+    days = day_calendar.range(date(first_year, 1, 1), date(last_year, 12, 31))
+    spare_days = day_calendar.range(date(last_year + 1, 1, 1), date(last_year + 1, 12, 31))
+
+    departments = Department.objects.bulk_create([
+        Department(name=f'Benchmark department {index}') for index in range(sizes.departments)
+    ])
+    password = make_password('benchmark')
+    users = User.objects.bulk_create([
+        User(
+            email=f'user{department.id}-{index}@benchmark.local', password=password,
+            first_name=f'First{index}', last_name=f'Last{department.id}',
+            department=department, staff_id=f'B{department.id:03}{index:05}',
+        )
+        for department in departments
+        for index in range(sizes.users_per_department)
+    ])
+
+    groups = {name: Group.objects.get_or_create(name=name)[0] for name in (DEPARTMENT_REP, LINE_MANAGER, HR, EMPLOYEE)}
+    memberships = []
+    users_by_role = {DEPARTMENT_REP: [], LINE_MANAGER: [], HR: [], EMPLOYEE: []}
+    users_by_department = {}
+    for user in users:
+        users_by_department.setdefault(user.department_id, []).append(user)
+    for department_users in users_by_department.values():
+        # The first three users of each department are its rep, line
+        # manager and an HR officer; the rest are employees
+        for user, role in itertools.zip_longest(department_users, [DEPARTMENT_REP, LINE_MANAGER, HR], fillvalue=EMPLOYEE):
+            if user is None:
+                raise ValueError('Every department needs at least three users.')
+            users_by_role[role].append(user)
+            memberships.append(User.groups.through(user_id=user.id, group_id=groups[role].id))
+    User.groups.through.objects.bulk_create(memberships)
+
+    requests = []
+    request_ids = reserve_request_ids(sizes.departments * sizes.requests_per_department, year=first_year)
+    statuses = itertools.cycle(STATUSES)
+    for department, rep in zip(departments, users_by_role[DEPARTMENT_REP]):
+        for _ in range(sizes.requests_per_department):
+            requests.append(InconvenienceRequest(
+                request_id=request_ids[len(requests)], title='Benchmark request', description='Benchmark work',
+                department=department, department_rep=rep, status=next(statuses),
+            ))
+    InconvenienceRequest.objects.bulk_create(requests)
+
+    # Each employee books the next `days_per_line` unbooked days
+    next_day = {}
+    employees_by_department = {
+        department_id: itertools.cycle(department_users) for department_id, department_users in users_by_department.items()
+    }
+    lines, line_days = [], []
+    for inconvenience_request in requests:
+        employees = employees_by_department[inconvenience_request.department_id]
+        for _ in range(sizes.lines_per_request):
+            employee = next(employees)
+            start = next_day.get(employee.id, 0)
+            if start + sizes.days_per_line > len(days):
+                raise ValueError('Not enough days for every booking; increase years.')
+            next_day[employee.id] = start + sizes.days_per_line
+            lines.append(InconvenienceRequestLine(
+                inconvenience_request=inconvenience_request, employee=employee, job_description='Benchmark work',
+            ))
+            line_days.append(days[start:start + sizes.days_per_line])
+    for line, allowance in zip(lines, calculate_allowances(line_days)):
+        line.apply_allowance(allowance)
+    InconvenienceRequestLine.objects.bulk_create(lines, batch_size=1000)
+    InconvenienceRequestLineDay.objects.bulk_create([
+        InconvenienceRequestLineDay(line_id=line.id, day_id=day.id, employee_id=line.employee_id)
+        for line, booked in zip(lines, line_days)
+        for day in booked
+    ], batch_size=1000)
+
+    return Fixtures(sizes, departments, users_by_role, spare_days, first_year)
+
+
+def counts():
+    return {
+        'departments': Department.objects.count(),
+        'users': User.objects.count(),
+        'days': Day.objects.count(),
+        'requests': InconvenienceRequest.objects.count(),
+        'lines': InconvenienceRequestLine.objects.count(),
+        'bookings': InconvenienceRequestLineDay.objects.count(),
+    }
@@ -0,0 +1,114 @@
+"""Run the benchmark scenarios against a fresh SQLite database.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --departments 10 --lines-per-request 50 --scenario list_endpoints
+    python -m benchmarks.run --baseline old.json
+
+The database is created in a temporary file (or --database), migrated and
+filled with synthetic fixtures of the requested size. The results are written
+as JSON together with the sizes, row counts and git revision, so runs can be
+compared. --baseline prints how each median changed against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results):
+    lines = []
+    for scenario, cases in results.items():
+        for case, current in cases.items():
+            previous = baseline.get(scenario, {}).get(case)
+            if not previous:
+                continue
+            change = (current['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100 if previous['median_ms'] else 0
+            lines.append(
+                f"{scenario + ' ' + case:70} {previous['median_ms']:10.2f} -> {current['median_ms']:10.2f} ms "
+                f"({change:+6.1f}%)  queries {previous['queries']} -> {current['queries']}"
+            )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLite file to use (default: a temporary file)')
+    parser.add_argument('--departments', type=int, default=5)
+    parser.add_argument('--users-per-department', type=int, default=40)
+    parser.add_argument('--requests-per-department', type=int, default=20)
+    parser.add_argument('--lines-per-request', type=int, default=10)
+    parser.add_argument('--days-per-line', type=int, default=2)
+    parser.add_argument('--years', type=int, default=2, help='Calendar years of days to book lines on')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case, after one warm-up run')
+    parser.add_argument('--scenario', action='append', help='Only run these scenarios')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of standard output')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='egbin-benchmark-'), 'db.sqlite3')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'egbin_ssp.settings.sqlite')
+    os.environ['SQLITE_PATH'] = database
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from .fixtures import Sizes, build_fixtures, counts
+    from .scenarios import SCENARIOS
+
+    names = args.scenario or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}; choose from {', '.join(SCENARIOS)}")
+
+    call_command('migrate', verbosity=0)
+    sizes = Sizes(
+        args.departments, args.users_per_department, args.requests_per_department,
+        args.lines_per_request, args.days_per_line, args.years,
+    )
+    fixtures = build_fixtures(sizes)
+
+    results = {}
+    for name in names:
+        print(f'Running {name}...', file=sys.stderr)
+        results[name] = SCENARIOS[name](fixtures, args.repeat)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'settings': os.environ['DJANGO_SETTINGS_MODULE'],
+            'repeat': args.repeat,
+        },
+        'sizes': sizes._asdict(),
+        'counts': counts(),
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            print(compare(json.load(file)['results'], results), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Benchmark scenarios.
+
+Each scenario returns a dict of measurements keyed by case name. A case is
+run `repeat` times after one warm-up run. Every run is timed and its queries
+are counted. Cases that write run inside a transaction that is rolled back,
+so every run starts from the same data.
+"""
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inconvenience_allowance.models import InconvenienceRequest, InconvenienceRequestLine
+from inconvenience_allowance.serializers import InconvenienceRequestSerializer
+from user.models import User
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
+
+
+def measure(run, repeat, rollback=False):
+    """Time `run` and count its queries; returns the summary for one case."""
+    timings = []
+    queries = []
+    for index in range(repeat + 1):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            if rollback:
+                transaction.set_rollback(True)
+        if index:
+            # The first run only warms caches
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+    return {
+        'runs': repeat,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+    }
+
+
+def client_for(user):
+    # A fresh user object per request, loaded like JWT authentication would,
+    # so the user and role lookups are paid as on a real request
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    return client
+
+
+def expect(response, status_code):
+    if response.status_code != status_code:
+        raise AssertionError(f'{response.request["PATH_INFO"]} returned {response.status_code}: {response.content[:200]!r}')
+    return response
+
+
+def bulk_line_creation(fixtures, repeat, sizes=(1, 10, 50)):
+    """POST a batch of lines to a draft request as the department rep."""
+    department = fixtures.departments[0]
+    rep = fixtures.users[DEPARTMENT_REP][0]
+    inconvenience_request = InconvenienceRequest.objects.filter(department=department, status='draft').first()
+    employees = list(User.objects.filter(department=department).order_by('id'))
+    dates = [day.date.isoformat() for day in fixtures.spare_days[:fixtures.sizes.days_per_line]]
+
+    results = {}
+    for size in sorted({min(size, len(employees)) for size in sizes}):
+        payload = [{'employee': employee.id, 'dates': dates} for employee in employees[:size]]
+
+        def run():
+            response = client_for(rep).post(
+                f'/api/inconvenience-request-lines/{inconvenience_request.id}/', payload, format='json'
+            )
+            expect(response, 201)
+        results[f'{size}_lines'] = measure(run, repeat, rollback=True)
+    return results
+
+
+def nested_request_serialization(fixtures, repeat):
+    """Serialize every request of a department with its lines and days."""
+    department = fixtures.departments[0]
+
+    def run():
+        queryset = InconvenienceRequestSerializer.setup_eager_loading(
+            InconvenienceRequest.objects.filter(department=department)
+        )
+        InconvenienceRequestSerializer(queryset, many=True).data
+    return {'department_requests': measure(run, repeat)}
+
+
+def update_calculations(fixtures, repeat, count=200):
+    """Reprice lines one at a time, as InconvenienceRequestLine.update_calculations does."""
+    line_ids = list(InconvenienceRequestLine.objects.order_by('id').values_list('id', flat=True)[:count])
+
+    def run():
+        for line in InconvenienceRequestLine.objects.filter(id__in=line_ids).prefetch_related('days'):
+            line.update_calculations()
+    return {f'{len(line_ids)}_lines': measure(run, repeat)}
+
+
+LIST_ENDPOINTS = {
+    'requests': '/api/inconvenience-requests/',
+    'lines': '/api/inconvenience-request-lines/',
+    'own_lines': '/api/inconvenience-request-lines/own/',
+    'users': '/api/users/',
+}
+
+
+def list_endpoints(fixtures, repeat):
+    """GET each list endpoint as a user of each role."""
+    results = {}
+    for role in (HR, DEPARTMENT_REP, LINE_MANAGER, EMPLOYEE):
+        user = fixtures.users[role][0]
+        for name, path in LIST_ENDPOINTS.items():
+            results[f'{name}:{role}'] = measure(lambda: expect(client_for(user).get(path), 200), repeat)
+    return results
+
+
+def status_transitions(fixtures, repeat):
+    """Move a request one step through the workflow as the role allowed to."""
+    department = fixtures.departments[0]
+    steps = [
+        ('draft', 'submitted', fixtures.users[DEPARTMENT_REP][0]),
+        ('submitted', 'manager_approved', fixtures.users[LINE_MANAGER][0]),
+        ('manager_approved', 'work_done', fixtures.users[LINE_MANAGER][0]),
+        ('work_done', 'hr_approval', fixtures.users[HR][0]),
+    ]
+    results = {}
+    for current, new, user in steps:
+        inconvenience_request = InconvenienceRequest.objects.filter(department=department, status=current).first()
+        if inconvenience_request is None:
+            continue
+
+        def run():
+            response = client_for(user).post(
+                f'/api/inconvenience-requests/{inconvenience_request.id}/transition-status/', {'status': new}, format='json'
+            )
+            expect(response, 200)
+        results[f'{current}->{new}'] = measure(run, repeat, rollback=True)
+    return results
+
+
+SCENARIOS = {
+    'bulk_line_creation': bulk_line_creation,
+    'nested_request_serialization': nested_request_serialization,
+    'update_calculations': update_calculations,
+    'list_endpoints': list_endpoints,
+    'status_transitions': status_transitions,
+}
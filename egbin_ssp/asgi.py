@@ -11,6 +11,13 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'egbin_ssp.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'egbin_ssp.settings.production')
+# Async views run their queries on per-request threads, so a persistent
+# connection would be left open per thread rather than reused. Django advises
+# against them under ASGI; set DB_CONN_MAX_AGE explicitly to override.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+from egbin_ssp.startup import log_performance_settings  # noqa: E402
+log_performance_settings(asgi=True)
@@ -0,0 +1,72 @@
+"""Base class for the async read endpoints under /api/async/.
+
+DRF's APIView is synchronous, so under ASGI each DRF request runs on a worker
+thread. AsyncAPIView is a plain Django async view: it checks the JWT, takes
+the user and their roles from its claims (falling back to the database, see
+user/authentication.py), and serializes objects the view already loaded. A slow request then holds a coroutine instead of a
+thread.
+
+Errors go through the project exception handler and come back in the same
+``{'status_code', 'errors'}`` shape as the DRF views.
+"""
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
+from user.authentication import ClaimsJWTAuthentication
+
+from .exceptions import custom_exception_handler
+from .metrics import serialized
+from .pagination import AsyncIdPagination
+
+
+async def authenticate(request):
+    """Async equivalent of ClaimsJWTAuthentication.authenticate() that also loads the user's roles."""
+    backend = ClaimsJWTAuthentication()
+    header = backend.get_header(request)
+    raw_token = backend.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise NotAuthenticated()
+
+    # Signature and expiry checks don't touch the database
+    token = backend.get_validated_token(raw_token)
+    user = await backend.aget_user(token)
+    if 'role_names' not in user.__dict__:
+        # Tokens without claims load a plain user
+        await user.aload_roles()
+    return user
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+class AsyncAPIView(View):
+    http_method_names = ['get', 'head', 'options']
+    authentication_required = True
+    pagination_class = AsyncIdPagination
+    chunk_size = 500
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if self.authentication_required:
+                request.user = await authenticate(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    def handle_exception(self, exc):
+        response = custom_exception_handler(exc, {'view': self})
+        if response is None:
+            raise exc
+        return json_response(response.data, status=response.status_code)
+
+    async def list_response(self, request, queryset, serializer_class):
+        """Async counterpart of PaginatedListMixin.list_response()."""
+        queryset = serializer_class.setup_eager_loading(queryset)
+        paginator = self.pagination_class()
+        page = await paginator.paginate_queryset(queryset, request, self.chunk_size)
+        if page is None:
+            objects = [obj async for obj in queryset.aiterator(chunk_size=self.chunk_size)]
+            return json_response(serialized(serializer_class(objects, many=True)))
+        return json_response(paginator.get_paginated_data(serialized(serializer_class(page, many=True))))
@@ -0,0 +1,23 @@
+"""SQLite backend that accepts CharFields without max_length.
+
+The models rely on PostgreSQL's unlimited varchar (User.staff_id,
+InconvenienceRequestLine.job_description). SQLite ignores varchar lengths
+anyway, so such columns are simply created as plain varchar here. Used by
+the sqlite settings profile.
+"""
+from django.db.backends.sqlite3 import base, features
+
+
+def _varchar(data):
+    if data['max_length'] is None:
+        return 'varchar'
+    return 'varchar(%(max_length)s)' % data
+
+
+class DatabaseFeatures(features.DatabaseFeatures):
+    supports_unlimited_charfield = True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    data_types = {**base.DatabaseWrapper.data_types, 'CharField': _varchar}
+    features_class = DatabaseFeatures
@@ -0,0 +1,293 @@
+"""Per-request metrics: SQL count and time, serializer time and view time.
+
+RequestMetricsMiddleware measures every request and reports it in three ways:
+
+- a ``Server-Timing`` response header, which browser dev tools display;
+- one JSON log line on the ``egbin_ssp.requests`` logger, at INFO (settings
+  keep that logger at WARNING unless REQUEST_LOG_LEVEL says otherwise);
+- per-route histograms, served in the Prometheus text format at /metrics.
+
+Routes are labelled with their URL name, e.g. ``inconvenience-request-list``
+or ``user_list``. SQL is counted by an execute_wrapper installed on every
+database connection. It reports to the current request through a context
+variable, so queries the async ORM runs on a worker thread are counted too.
+The request
+time is split three ways, which add up to the total:
+
+- db: all SQL;
+- serializer: producing ``serializer.data`` where the view asks for it
+  through ``serialized()``, minus the SQL that triggers (e.g. evaluating a
+  lazy queryset). Responses DRF's generic viewsets build themselves (e.g.
+  department create and update) are not split out;
+- view: everything else (view code, middleware, rendering).
+
+A streaming response is read after the view returns. Its iterator is wrapped
+so the SQL it runs is counted, and the log line and histograms are written
+once it has been read or closed. The Server-Timing header has already been
+sent by then, so for streams it only covers the time to the first byte.
+
+Histograms are kept in process memory, so each worker reports its own. Under
+several workers, scrape each worker or accept per-worker samples. /metrics
+requires ``Authorization: Bearer <METRICS_TOKEN>``; without METRICS_TOKEN it
+is only served when DEBUG is on.
+"""
+import hmac
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger('egbin_ssp.requests')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._serializing = False
+
+    def add_query(self, elapsed):
+        self.db_time += elapsed
+        self.queries += 1
+        if self._serializing:
+            self.serializer_time -= elapsed
+
+    @property
+    def view_time(self):
+        return max(self.duration - self.db_time - self.serializer_time, 0.0)
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={self.duration * 1000:.1f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def serialized(serializer):
+    """Return `serializer.data`, counting the time it takes as serializer time.
+
+    Views call this where they build a response; nested calls are counted once.
+    """
+    metrics = current_metrics.get()
+    if metrics is None or metrics._serializing:
+        return serializer.data
+    metrics._serializing = True
+    started = time.perf_counter()
+    try:
+        return serializer.data
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics._serializing = False
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        series[1] += 1
+        series[2] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, count, total) in sorted(self._series.items()):
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.duration = Histogram('http_request_duration_seconds', 'Time to handle the request.', DURATION_BUCKETS)
+        self.db_duration = Histogram('http_request_db_duration_seconds', 'Time spent running SQL.', DURATION_BUCKETS)
+        self.serializer_duration = Histogram(
+            'http_request_serializer_duration_seconds', 'Time spent serializing responses.', DURATION_BUCKETS
+        )
+        self.view_duration = Histogram(
+            'http_request_view_duration_seconds', 'Time spent outside SQL and serialization.', DURATION_BUCKETS
+        )
+        self.queries = Histogram('http_request_db_queries', 'SQL queries run by the request.', QUERY_BUCKETS)
+
+    def record(self, route, method, status, metrics):
+        labels = (('route', route), ('method', method))
+        with self._lock:
+            self.duration.observe(labels + (('status', str(status)),), metrics.duration)
+            self.db_duration.observe(labels, metrics.db_time)
+            self.serializer_duration.observe(labels, metrics.serializer_time)
+            self.view_duration.observe(labels, metrics.view_time)
+            self.queries.observe(labels, metrics.queries)
+
+    def exposition(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.duration, self.db_duration, self.serializer_duration, self.view_duration, self.queries):
+                lines.extend(histogram.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unnamed'
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder, dispatch_uid='egbin_ssp.metrics')
+        for alias in connections:
+            install_query_recorder(connections[alias])
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.duration = time.perf_counter() - metrics.started
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = metrics.server_timing()
+        if response.streaming:
+            report = lambda: self.report(request, response, metrics)  # noqa: E731
+            if response.is_async:
+                response.streaming_content = measure_async_stream(response.streaming_content, metrics, report)
+            else:
+                response.streaming_content = measure_stream(response.streaming_content, metrics, report)
+        else:
+            self.report(request, response, metrics)
+        return response
+
+    def report(self, request, response, metrics):
+        metrics.duration = time.perf_counter() - metrics.started
+        route = route_name(request)
+        registry.record(route, request.method, response.status_code, metrics)
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(metrics.duration * 1000, 2),
+            'db_queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'serializer_ms': round(metrics.serializer_time * 1000, 2),
+            'view_ms': round(metrics.view_time * 1000, 2),
+        }))
+
+
+def measure_stream(chunks, metrics, report):
+    """Yield `chunks`, counting the SQL each one runs in `metrics`; call `report` at the end."""
+    chunks = iter(chunks)
+    try:
+        while True:
+            token = current_metrics.set(metrics)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                current_metrics.reset(token)
+            yield chunk
+    finally:
+        report()
+
+
+async def measure_async_stream(chunks, metrics, report):
+    """measure_stream for an async iterator."""
+    chunks = aiter(chunks)
+    try:
+        while True:
+            token = current_metrics.set(metrics)
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                return
+            finally:
+                current_metrics.reset(token)
+            yield chunk
+    finally:
+        report()
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4')
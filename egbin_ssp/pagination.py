@@ -0,0 +1,78 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def configured_page_size():
+    """API_PAGE_SIZE, or its old name INCONVENIENCE_ALLOWANCE_PAGE_SIZE when only that is set."""
+    return getattr(settings, 'API_PAGE_SIZE', None) or getattr(settings, 'INCONVENIENCE_ALLOWANCE_PAGE_SIZE', None)
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on `id`, newest first.
+
+    Pagination kicks in when the client sends `cursor` or `page_size`, or for
+    every request once API_PAGE_SIZE is set, so existing clients that expect
+    a plain list keep working until they opt in.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    default_page_size = 100
+
+    def get_page_size(self, request):
+        configured = configured_page_size()
+        params = request.query_params
+        if not configured and self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        self.page_size = configured or self.default_page_size
+        return super().get_page_size(request)
+
+
+class AsyncIdPagination:
+    """Keyset pagination on `id` for the async views.
+
+    Same opt-in rule and page sizes as IdCursorPagination. The cursor is the
+    last id of the previous page and only forward (`next`) links are given,
+    which keeps a page to one query that can be run with the async ORM.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = IdCursorPagination.max_page_size
+    default_page_size = IdCursorPagination.default_page_size
+
+    def get_page_size(self, request):
+        configured = configured_page_size()
+        params = request.GET
+        if not configured and self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        try:
+            page_size = int(params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return configured or self.default_page_size
+        if page_size <= 0:
+            return configured or self.default_page_size
+        return min(page_size, self.max_page_size)
+
+    async def paginate_queryset(self, queryset, request, chunk_size=500):
+        """Return the requested page of `queryset`, or None when not paginating."""
+        page_size = self.get_page_size(request)
+        if page_size is None:
+            return None
+        queryset = queryset.order_by('-id')
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(id__lt=int(cursor))
+            except ValueError:
+                raise NotFound('Invalid cursor')
+        page = [obj async for obj in queryset[:page_size + 1].aiterator(chunk_size=chunk_size)]
+        self.next_link = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_link = replace_query_param(request.build_absolute_uri(), self.cursor_query_param, page[-1].id)
+        return page
+
+    def get_paginated_data(self, data):
+        return {'next': self.next_link, 'previous': None, 'results': data}
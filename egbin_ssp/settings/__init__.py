@@ -0,0 +1,13 @@
+"""
+Settings profiles for egbin_ssp.
+
+- egbin_ssp.settings.development: DEBUG on, the PostgreSQL database from the
+  DB_* environment variables. This is what ``egbin_ssp.settings`` itself
+  resolves to, so existing DJANGO_SETTINGS_MODULE values keep working.
+- egbin_ssp.settings.production: DEBUG off, persistent health-checked
+  connections, cached templates and cache-backed sessions. wsgi.py and
+  asgi.py default to it.
+- egbin_ssp.settings.sqlite: production tuning on a local SQLite file, for
+  benchmarking without a PostgreSQL server.
+"""
+from .development import *  # noqa: F401,F403
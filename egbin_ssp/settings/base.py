@@ -0,0 +1,307 @@
+"""
+Django settings for egbin_ssp project, shared by every profile.
+
+Generated by 'django-admin startproject' using Django 5.0.7. The profiles in
+development.py, production.py and sqlite.py build on these settings.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.0/ref/settings/
+"""
+
+from pathlib import Path
+import os
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get('SECRET_KEY')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = ['*']
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    # 'unfold',
+    # "unfold.contrib.filters",
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+
+    #thirdparty
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
+    'drf_spectacular',
+    'corsheaders',
+    # 'django_select2',
+
+    #apps
+    'user',
+    'inconvenience_allowance'
+]
+
+MIDDLEWARE = [
+    'egbin_ssp.metrics.RequestMetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+CORS_ALLOWED_ORIGINS = [
+    'https://egbin-ssp-api-c8axfebjhacngsb4.eastus-01.azurewebsites.net',
+    'http://localhost:5173'
+,    # Add other allowed origins here...
+]
+CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = [
+    'authorization',
+    'content-type',
+    'x-requested-with',
+    'accept',
+    'origin',
+    'user-agent',
+    'access-control-allow-origin'
+]
+
+ROOT_URLCONF = 'egbin_ssp.urls'
+CSRF_TRUSTED_ORIGINS = ['https://egbin-ssp-api-c8axfebjhacngsb4.eastus-01.azurewebsites.net','http://localhost:5173'
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'egbin_ssp.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME'),
+        'USER':os.environ.get('DB_USER'),
+        'PASSWORD':os.environ.get('DB_PASSWORD'),
+        'HOST': os.environ.get('DB_HOST'),  # e.g., 'your_server_name.postgres.database.azure.com'
+        'PORT':'5432',
+        # 'OPTIONS': {
+        #     'sslmode': 'require',  # Ensure SSL mode is enabled
+        # },
+    }
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.0/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.0/howto/static-files/
+
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+
+# Enable WhiteNoise to serve static files
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# REST Framework settings
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'user.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticated',
+    ),
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'EXCEPTION_HANDLER': 'egbin_ssp.exceptions.custom_exception_handler'
+}
+
+from datetime import timedelta
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
+    'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    'SLIDING_TOKEN_LIFETIME': timedelta(days=30),
+    'SLIDING_TOKEN_REFRESH_LIFETIME_LATE_USER': timedelta(days=1),
+    'SLIDING_TOKEN_LIFETIME_LATE_USER': timedelta(days=30),
+}
+AUTH_USER_MODEL = 'user.User'
+
+# Seconds the in-memory Day calendar is trusted before it is reloaded; Day
+# changes also invalidate it immediately through the cache (see day_calendar.py)
+DAY_CALENDAR_TIMEOUT = 60
+
+# Seconds a cached allowance report is kept. Changes to lines drop cached
+# reports straight away through the cache (see inconvenience_allowance/reports.py)
+ALLOWANCE_REPORT_CACHE_TIMEOUT = 300
+
+# Per-request SQL/serializer/view timings (see egbin_ssp/metrics.py). The
+# Server-Timing header can be turned off. /metrics requires this bearer
+# token; without one it is only served when DEBUG is on
+SERVER_TIMING_HEADER = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Workflow notifications are queued in an outbox and delivered by
+# `manage.py send_notifications` (see inconvenience_allowance/notifications.py).
+# Failed digests are retried after NOTIFICATION_RETRY_DELAY seconds, doubling
+# each attempt. Use the FileBackend with NOTIFICATION_FILE_PATH to write
+# digests to a file instead of sending mail. A worker has
+# NOTIFICATION_CLAIM_TIMEOUT seconds to deliver a batch it claimed before
+# another worker may claim it again
+NOTIFICATION_BACKEND = os.environ.get('NOTIFICATION_BACKEND', 'inconvenience_allowance.notifications.EmailBackend')
+NOTIFICATION_FILE_PATH = os.environ.get('NOTIFICATION_FILE_PATH', os.path.join(BASE_DIR, 'notifications.jsonl'))
+NOTIFICATION_RETRY_DELAY = 60
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_CLAIM_TIMEOUT = 300
+
+# Mail for the EmailBackend. For local testing run any SMTP stand-in on
+# EMAIL_PORT, or set EMAIL_BACKEND to Django's console/file backend
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS') == 'true'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Default page size for the cursor-paginated list endpoints. When unset,
+# lists are only paginated if the client sends `cursor` or `page_size`.
+# The old name, INCONVENIENCE_ALLOWANCE_PAGE_SIZE, is still read when this
+# is unset
+API_PAGE_SIZE = None
+
+# Seconds a user's group names stay in the shared cache; leave unset to load
+# them once per request only. Enable together with a cache shared by all
+# workers, otherwise membership changes only invalidate the local process.
+USER_ROLES_CACHE_TIMEOUT = int(os.environ.get('USER_ROLES_CACHE_TIMEOUT', 0)) or None
+
+# Whether access tokens are authenticated from their claims without a
+# database query (see user/tokens.py). None trusts them only when the default
+# cache is shared by all workers, since that is how claim changes reach them.
+TOKEN_CLAIMS_TRUSTED = None
+
+# Seconds a user loaded for a stale or claim-less token is cached, under the
+# user's token version (see user/authentication.py)
+TOKEN_USER_CACHE_TIMEOUT = 60
+
+# Seconds the in-memory set of blacklisted refresh tokens is trusted before it
+# is reloaded; blacklisting also reaches other workers through the cache (see
+# user/blacklist.py). Expired tokens are deleted by `manage.py prune_tokens`
+TOKEN_BLACKLIST_TIMEOUT = 60
+
+# Processes hashing passwords for POST /api/users/import/ (see user/imports.py).
+# 1 hashes in the web worker itself; more start a spawned pool per import.
+# Large imports are better run with `manage.py import_users --workers N`
+USER_IMPORT_WORKERS = int(os.environ.get('USER_IMPORT_WORKERS', 1))
+
+# Inconvenience allowance rates per day category, as (effective_from, rate)
+# pairs; a rate applies from its date until the next entry for the category
+INCONVENIENCE_ALLOWANCE_RATES = {
+    'weekend': [('2000-01-01', 3500)],
+    'public_holiday': [('2000-01-01', 15000)],
+}
+
+# Microsoft sign-in (see user/microsoft.py). Tokens issued to this app are
+# verified locally against the tenant's signing keys; anything else, or any
+# token when the tenant/client IDs are unset, is checked with Microsoft Graph
+MICROSOFT_TENANT_ID = os.environ.get('MICROSOFT_TENANT_ID')
+MICROSOFT_CLIENT_ID = os.environ.get('MICROSOFT_CLIENT_ID')
+MICROSOFT_TOKEN_VERIFIERS = [
+    'user.microsoft.JWKSTokenVerifier',
+    'user.microsoft.GraphTokenVerifier',
+]
+MICROSOFT_JWKS_REFRESH = 3600
+MICROSOFT_HTTP_TIMEOUT = 5
+MICROSOFT_VERIFIED_TOKEN_TTL = 300
+# Graph-verified tokens with no readable expiry are remembered for less
+MICROSOFT_OPAQUE_TOKEN_TTL = 60
+
+SPECTACULAR_SETTINGS = {
+    'TITLE': 'EGBIN SSP API',
+    'DESCRIPTION': '',
+    'VERSION': '1.0.0',
+    'SERVE_INCLUDE_SCHEMA': False,
+    # OTHER SETTINGS
+}
+
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'egbin_ssp': {'handlers': ['console'], 'level': 'INFO'},
+        # One INFO line per request (see metrics.py); REQUEST_LOG_LEVEL=INFO turns them on
+        'egbin_ssp.requests': {'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING')},
+    },
+}
@@ -0,0 +1,4 @@
+from .base import *  # noqa: F401,F403
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
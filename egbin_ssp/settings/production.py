@@ -0,0 +1,40 @@
+import copy
+import os
+
+from .base import *  # noqa: F401,F403
+from . import base
+
+# Copies, so the changes below never leak into egbin_ssp.settings.base or
+# other settings modules that import it in the same process
+DATABASES = copy.deepcopy(base.DATABASES)
+TEMPLATES = copy.deepcopy(base.TEMPLATES)
+
+DEBUG = False
+
+# Reuse database connections across requests instead of connecting per
+# request, and check them before reuse so a dropped connection is replaced.
+# (Driver-level pooling needs psycopg 3 and Django 5.1; we are on psycopg2.)
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Compile templates (admin, browsable API, docs) once per process
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# A shared cache lets role, calendar and token caches work across workers;
+# RedisCache needs the `redis` package installed
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# Sessions are read from the cache and only fall back to the database on a miss
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -0,0 +1,19 @@
+"""Production tuning on a local SQLite database, for benchmarking."""
+import os
+
+from .production import *  # noqa: F401,F403
+from .base import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'egbin_ssp.db_backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Persistent unless DB_CONN_MAX_AGE says otherwise, as asgi.py does
+        'CONN_MAX_AGE': int(os.environ['DB_CONN_MAX_AGE']) if 'DB_CONN_MAX_AGE' in os.environ else None,
+        # A file rather than the in-memory default, so tests can write to it
+        # from several threads (RequestIdReservationTests)
+        'TEST': {'NAME': os.environ.get('SQLITE_TEST_PATH', BASE_DIR / 'test_db.sqlite3')},
+    }
+}
+
+SECRET_KEY = os.environ.get('SECRET_KEY', 'sqlite-benchmark-only')
@@ -0,0 +1,40 @@
+import logging
+import os
+
+from django.conf import settings
+
+from .pagination import configured_page_size
+
+
+logger = logging.getLogger('egbin_ssp')
+
+
+def performance_settings():
+    """The active settings that most affect per-request cost."""
+    database = settings.DATABASES['default']
+    loaders = settings.TEMPLATES[0].get('OPTIONS', {}).get('loaders') or []
+    cached_templates = any(
+        isinstance(loader, (list, tuple)) and loader[0] == 'django.template.loaders.cached.Loader'
+        for loader in loaders
+    )
+    return {
+        'settings_module': os.environ.get('DJANGO_SETTINGS_MODULE'),
+        'debug': settings.DEBUG,
+        'database_engine': database['ENGINE'],
+        'conn_max_age': database.get('CONN_MAX_AGE', 0),
+        'conn_health_checks': database.get('CONN_HEALTH_CHECKS', False),
+        'cache_backend': settings.CACHES['default']['BACKEND'],
+        'session_engine': settings.SESSION_ENGINE,
+        'cached_templates': cached_templates,
+        'user_roles_cache_timeout': getattr(settings, 'USER_ROLES_CACHE_TIMEOUT', None),
+        'api_page_size': configured_page_size(),
+    }
+
+
+def log_performance_settings(asgi=False):
+    report = performance_settings()
+    logger.info('Performance settings: %s', ', '.join(f'{key}={value}' for key, value in report.items()))
+    if report['debug']:
+        logger.warning('DEBUG is on: every SQL query is kept in memory for the lifetime of the request.')
+    if report['conn_max_age'] == 0 and not asgi:
+        logger.warning('CONN_MAX_AGE is 0: a new database connection is opened for every request.')
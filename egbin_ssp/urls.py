@@ -20,6 +20,7 @@ from django.urls import path,include
 from user.urls import router as DepartmentRouter
 from inconvenience_allowance.urls import router as DayRouter
 
+from egbin_ssp.metrics import metrics_view
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
 
@@ -33,6 +34,13 @@ urlpatterns = [
     path('api/', include('inconvenience_allowance.urls')),
     path('api/', include(DayRouter.urls)),
 
+    #async read endpoints, for ASGI deployments
+    path('api/async/users/', include('user.async_urls')),
+    path('api/async/', include('inconvenience_allowance.async_urls')),
+
+    #prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+
     #documentation urls
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
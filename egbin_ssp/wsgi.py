@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'egbin_ssp.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'egbin_ssp.settings.production')
 
 application = get_wsgi_application()
+
+from egbin_ssp.startup import log_performance_settings  # noqa: E402
+log_performance_settings()
@@ -0,0 +1,64 @@
+"""Which requests and lines a user may read, by role.
+
+Shared by the sync views and their async counterparts so both apply the same
+rules. Reads keep the role order the views have always checked: the request
+list checks for a department rep first, single requests and lines check for
+HR first, as the edit and delete views do. They do not follow primary_role(),
+which only decides the transitions a user may make (workflow.py).
+
+The queryset helpers only build querysets; nothing here hits the database,
+which lets the async views evaluate the result with the async ORM.
+"""
+from rest_framework.exceptions import PermissionDenied
+
+from egbin_ssp.exceptions import SerializerValidationException
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
+from .models import InconvenienceRequest, InconvenienceRequestLine
+
+
+def requests_visible_to(user):
+    if user.has_role(DEPARTMENT_REP):
+        return InconvenienceRequest.objects.filter(department_id=user.department_id)
+    if user.has_role(HR):
+        # HR can view all records
+        return InconvenienceRequest.objects.all().exclude(status='draft')
+    if user.has_role(LINE_MANAGER, EMPLOYEE):
+        # Other roles can view only their department records
+        return InconvenienceRequest.objects.filter(department_id=user.department_id).exclude(status='draft')
+    raise SerializerValidationException("Not Permitted", code=403)
+
+
+def check_request_access(user, inconvenience_request):
+    """Raise PermissionDenied unless `user` may read `inconvenience_request`."""
+    same_department = inconvenience_request.department_id == user.department_id
+    is_draft = inconvenience_request.status == 'draft'
+    if user.has_role(HR):
+        # HR can view all requests
+        allowed = not is_draft
+    elif user.has_role(LINE_MANAGER):
+        allowed = same_department and not is_draft
+    elif user.has_role(DEPARTMENT_REP):
+        allowed = same_department
+    else:
+        # Employees can view requests of their own department
+        allowed = same_department and not is_draft
+    if not allowed:
+        raise PermissionDenied("Not permitted to access this request.")
+
+
+def lines_visible_to(user):
+    lines = InconvenienceRequestLine.objects.all()
+    if user.has_role(HR):
+        # HR can view all request lines
+        return lines.exclude(inconvenience_request__status='draft')
+    if user.has_role(LINE_MANAGER):
+        return lines.filter(inconvenience_request__department_id=user.department_id).exclude(inconvenience_request__status='draft')
+    if user.has_role(DEPARTMENT_REP):
+        return lines.filter(inconvenience_request__department_id=user.department_id)
+    if user.has_role(EMPLOYEE):
+        return lines.filter(inconvenience_request__department_id=user.department_id).exclude(inconvenience_request__status='draft')
+    raise SerializerValidationException("Not permitted to view request lines.", code=403)
+
+
+def own_lines(user):
+    return InconvenienceRequestLine.objects.filter(employee_id=user.id).exclude(inconvenience_request__status='draft')
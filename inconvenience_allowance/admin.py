@@ -1,7 +1,26 @@
 from django.contrib import admin
-from .models import InconvenienceRequest, InconvenienceRequestLine, Day
+from .models import InconvenienceRequest, InconvenienceRequestLine, InconvenienceRequestLineDay, Day, Notification
 # Register your models here.
 
+
+class InconvenienceRequestLineDayInline(admin.TabularInline):
+    # days uses an explicit through model, so it is edited inline; the
+    # employee is copied from the line on save
+    model = InconvenienceRequestLineDay
+    fields = ('day',)
+    extra = 0
+
+
+class InconvenienceRequestLineAdmin(admin.ModelAdmin):
+    inlines = [InconvenienceRequestLineDayInline]
+
+
 admin.site.register(InconvenienceRequest)
-admin.site.register(InconvenienceRequestLine)
-admin.site.register(Day)
\ No newline at end of file
+admin.site.register(InconvenienceRequestLine, InconvenienceRequestLineAdmin)
+admin.site.register(Day)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('event', 'recipient', 'inconvenience_request', 'status', 'attempts', 'next_attempt_at')
+    list_filter = ('status', 'event')
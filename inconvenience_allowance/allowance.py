@@ -0,0 +1,104 @@
+"""Inconvenience allowance pricing.
+
+Pricing is a pure function of the days on a line: each day is charged at the
+rate configured for its category on its date. Rates come from the
+``INCONVENIENCE_ALLOWANCE_RATES`` setting, which maps a day category to a list
+of ``(effective_from, rate)`` pairs. A rate applies from its effective date
+until the next one takes over; days before the earliest entry use that entry.
+
+Nothing in here touches the database, so callers pass in the ``Day`` objects
+(or anything with ``date`` and ``category`` attributes) they already loaded.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date
+
+from django.conf import settings
+
+
+WEEKEND = 'weekend'
+PUBLIC_HOLIDAY = 'public_holiday'
+
+Allowance = namedtuple('Allowance', ['no_of_weekend', 'no_of_ph', 'no_of_days', 'amount'])
+
+
+class RateTable:
+    """Rates per day category, ordered by effective date."""
+
+    def __init__(self, rates):
+        self._dates = {}
+        self._rates = {}
+        for category, entries in rates.items():
+            entries = sorted(
+                (self._to_date(effective_from), rate) for effective_from, rate in entries
+            )
+            if not entries:
+                continue
+            self._dates[category] = [effective_from for effective_from, _ in entries]
+            self._rates[category] = [rate for _, rate in entries]
+
+    @staticmethod
+    def _to_date(value):
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(value)
+
+    def periods(self):
+        """Yield (category, start, end, rate) for every rate period.
+
+        `start` is None for the earliest period (which also covers earlier
+        days) and `end`, exclusive, is None for the current one.
+        """
+        for category, dates in self._dates.items():
+            rates = self._rates[category]
+            for index, rate in enumerate(rates):
+                start = dates[index] if index else None
+                end = dates[index + 1] if index + 1 < len(dates) else None
+                yield category, start, end, rate
+
+    def rate(self, category, on=None):
+        """Return the rate for `category` on date `on` (today when omitted)."""
+        if category not in self._rates:
+            return 0
+        if on is None:
+            on = date.today()
+        index = bisect_right(self._dates[category], on) - 1
+        return self._rates[category][max(index, 0)]
+
+
+def get_rate_table():
+    return RateTable(settings.INCONVENIENCE_ALLOWANCE_RATES)
+
+
+def calculate_allowance(days, rates=None):
+    """Price a single line from its days."""
+    return calculate_allowances([days], rates)[0]
+
+
+def calculate_allowances(lines, rates=None):
+    """Price many lines in one call.
+
+    `lines` is a sequence of day sequences, one per line. Rate lookups are
+    shared across the whole batch, so pricing thousands of lines only resolves
+    each distinct (category, date) pair once.
+    """
+    if rates is None:
+        rates = get_rate_table()
+    prices = {}
+    results = []
+    for days in lines:
+        no_of_weekend = no_of_ph = no_of_days = 0
+        amount = 0
+        for day in days:
+            key = (day.category, day.date)
+            price = prices.get(key)
+            if price is None:
+                price = prices[key] = rates.rate(day.category, day.date)
+            if day.category == WEEKEND:
+                no_of_weekend += 1
+            elif day.category == PUBLIC_HOLIDAY:
+                no_of_ph += 1
+            no_of_days += 1
+            amount += price
+        results.append(Allowance(no_of_weekend, no_of_ph, no_of_days, amount))
+    return results
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InconvenienceAllowanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inconvenience_allowance'
+
+    def ready(self):
+        from . import signals  # noqa: F401
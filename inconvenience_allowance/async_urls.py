@@ -0,0 +1,17 @@
+from django.urls import path
+from .async_views import (
+    AsyncInconvenienceRequestView,
+    AsyncInconvenienceRequestDetailView,
+    AsyncInconvenienceRequestLineView,
+    AsyncInconvenienceRequestLineOwnView,
+    AsyncDayListView,
+)
+
+
+urlpatterns = [
+    path('inconvenience-requests/', AsyncInconvenienceRequestView.as_view(), name='async-inconvenience-request-list'),
+    path('inconvenience-requests/<int:pk>/', AsyncInconvenienceRequestDetailView.as_view(), name='async-inconvenience-request-detail'),
+    path('inconvenience-request-lines/', AsyncInconvenienceRequestLineView.as_view(), name='async-inconvenience-request-line-list'),
+    path('inconvenience-request-lines/own/', AsyncInconvenienceRequestLineOwnView.as_view(), name='async-inconvenience-request-line-own'),
+    path('days/', AsyncDayListView.as_view(), name='async-day-list'),
+]
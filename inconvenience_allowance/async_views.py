@@ -0,0 +1,43 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+
+from egbin_ssp.async_views import AsyncAPIView, json_response
+from egbin_ssp.metrics import serialized
+from .access import check_request_access, lines_visible_to, own_lines, requests_visible_to
+from .day_calendar import day_calendar
+from .models import InconvenienceRequest
+from .serializers import DaySerializer, InconvenienceRequestLineSerializer, InconvenienceRequestSerializer
+from .views import day_range_filters, request_list_serializer
+
+
+class AsyncInconvenienceRequestView(AsyncAPIView):
+    async def get(self, request):
+        return await self.list_response(request, requests_visible_to(request.user), request_list_serializer(request.GET))
+
+
+class AsyncInconvenienceRequestDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        queryset = InconvenienceRequestSerializer.setup_eager_loading(InconvenienceRequest.objects.filter(pk=pk))
+        inconvenience_requests = [obj async for obj in queryset.aiterator(chunk_size=1)]
+        if not inconvenience_requests:
+            raise Http404("No InconvenienceRequest matches the given query.")
+        check_request_access(request.user, inconvenience_requests[0])
+        return json_response(serialized(InconvenienceRequestSerializer(inconvenience_requests[0])))
+
+
+class AsyncInconvenienceRequestLineView(AsyncAPIView):
+    async def get(self, request):
+        return await self.list_response(request, lines_visible_to(request.user), InconvenienceRequestLineSerializer)
+
+
+class AsyncInconvenienceRequestLineOwnView(AsyncAPIView):
+    async def get(self, request):
+        return await self.list_response(request, own_lines(request.user), InconvenienceRequestLineSerializer)
+
+
+class AsyncDayListView(AsyncAPIView):
+    async def get(self, request):
+        # The calendar is usually served from memory, but may reload from the
+        # database, so it runs in the sync thread
+        days = await sync_to_async(day_calendar.range)(*day_range_filters(request.GET))
+        return json_response(serialized(DaySerializer(days, many=True)))
@@ -0,0 +1,162 @@
+"""In-process calendar over the Day table.
+
+Weekends and public holidays change a few times a year but are read on every
+line validation, so the whole table is kept in memory as a date -> Day map
+plus a sorted list of dates for range queries.
+
+The snapshot is rebuilt when:
+- a Day is saved or deleted (see signals.py), which bumps a version number in
+  Django's cache. With a cache shared by all workers (Redis, Memcached,
+  database) every worker picks the change up on its next read.
+- it is older than DAY_CALENDAR_TIMEOUT seconds, as a safety net for the
+  default per-process cache.
+- a lookup misses a date that is actually in the table.
+"""
+import hashlib
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+
+VERSION_KEY = 'day-calendar-version'
+
+
+class DayCalendar:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = None
+        self._days_by_id = {}
+        self._dates = []
+        self._version = None
+        self._loaded_at = 0
+        self._fingerprint = None
+
+    def _current_version(self):
+        return cache.get_or_set(VERSION_KEY, 1, None)
+
+    def _load(self, version):
+        from .models import Day
+        days = list(Day.objects.order_by('date'))
+        self._days = {day.date: day for day in days}
+        self._days_by_id = {day.id: day for day in days}
+        self._dates = [day.date for day in days]
+        self._fingerprint = hashlib.md5(
+            repr([(day.id, day.date, day.category) for day in days]).encode(), usedforsecurity=False
+        ).hexdigest()
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _snapshot(self):
+        version = self._current_version()
+        timeout = getattr(settings, 'DAY_CALENDAR_TIMEOUT', 60)
+        with self._lock:
+            if (self._days is None or version != self._version
+                    or time.monotonic() - self._loaded_at > timeout):
+                self._load(version)
+            return self._days, self._days_by_id, self._dates
+
+    def invalidate(self):
+        with self._lock:
+            self._days = None
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+
+    def get(self, date):
+        days, _, _ = self._snapshot()
+        return days.get(date)
+
+    def get_by_id(self, day_id):
+        _, days_by_id, _ = self._snapshot()
+        return days_by_id.get(day_id)
+
+    def resolve(self, dates):
+        """Map each of `dates` that is a Day to its Day; unknown dates are left out."""
+        days, _, _ = self._snapshot()
+        resolved = {date: days[date] for date in dates if date in days}
+        missing = set(dates) - set(resolved)
+        if missing:
+            # Another worker may have added these since our snapshot
+            from .models import Day
+            if Day.objects.filter(date__in=missing).exists():
+                self.invalidate()
+                days, _, _ = self._snapshot()
+                resolved = {date: days[date] for date in dates if date in days}
+        return resolved
+
+    def range(self, start=None, end=None, categories=None):
+        """Days between `start` and `end` inclusive, optionally of some categories only."""
+        days, _, dates = self._snapshot()
+        lo = bisect_left(dates, start) if start else 0
+        hi = bisect_right(dates, end) if end else len(dates)
+        selected = [days[date] for date in dates[lo:hi]]
+        if categories:
+            selected = [day for day in selected if day.category in categories]
+        return selected
+
+    def all(self):
+        return self.range()
+
+    def fingerprint(self):
+        """Hash of the current days; it changes whenever any day does."""
+        self._snapshot()
+        return self._fingerprint
+
+
+day_calendar = DayCalendar()
+
+
+def weekend_dates(start, end):
+    """Every Saturday and Sunday from `start` to `end` inclusive.
+
+    Steps a week at a time from the first Saturday instead of testing each
+    day, so a multi-year range costs about a hundred iterations per year.
+    """
+    first_saturday = start + timedelta(days=(5 - start.weekday()) % 7)
+    week = timedelta(days=7)
+    dates = []
+    saturday = first_saturday
+    # Include a Sunday at the very start of the range
+    if start.weekday() == 6:
+        dates.append(start)
+    while saturday <= end:
+        dates.append(saturday)
+        if saturday + timedelta(days=1) <= end:
+            dates.append(saturday + timedelta(days=1))
+        saturday += week
+    return dates
+
+
+def generate_days(start, end, public_holidays=()):
+    """Create the weekend and public holiday Days between `start` and `end`.
+
+    Dates that already have a Day are left untouched. Public holidays win over
+    weekends falling on the same date. Returns (inserted, skipped) counts.
+    """
+    from .models import Day
+    categories = {date: 'weekend' for date in weekend_dates(start, end)}
+    for date in public_holidays:
+        categories[date] = 'public_holiday'
+
+    existing = set(
+        Day.objects.filter(Q(date__range=(start, end)) | Q(date__in=list(public_holidays)))
+        .values_list('date', flat=True)
+    )
+    new_days = [
+        Day(date=date, category=category)
+        for date, category in sorted(categories.items())
+        if date not in existing
+    ]
+    with transaction.atomic():
+        Day.objects.bulk_create(new_days, ignore_conflicts=True)
+        # bulk_create doesn't send post_save, so invalidate here
+        transaction.on_commit(day_calendar.invalidate)
+    return len(new_days), len(categories) - len(new_days)
@@ -0,0 +1,100 @@
+"""Payroll export of completed request lines.
+
+Lines are read with iterator(chunk_size=...). Each chunk's employees and
+departments are joined in and its days prefetched, and every row is written
+as soon as it is built, so memory stays flat however many lines there are.
+
+CSV is streamed straight to the client (under WSGI or ASGI, see
+streaming.py) or to a file. XLSX is written with
+XlsxWriter in constant_memory mode. XLSX is a zip archive that can only be
+finished once every row is known, so it goes to a temporary file first and is
+then sent from there.
+"""
+import csv
+import tempfile
+
+from django.db.models import Prefetch
+from django.http import FileResponse
+
+from .models import Day, InconvenienceRequestLine
+from .reports import filter_lines
+from .streaming import streaming_response
+
+
+HEADER = [
+    'Request ID', 'Employee', 'Staff ID', 'Department', 'Dates',
+    'Weekends', 'Public holidays', 'Days', 'Amount',
+]
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def payroll_lines(start=None, end=None):
+    """Completed lines, optionally only those with a day booked between `start` and `end`."""
+    lines = InconvenienceRequestLine.objects.filter(inconvenience_request__status='completed')
+    return filter_lines(lines, start, end).select_related(
+        'employee', 'inconvenience_request__department'
+    ).prefetch_related(
+        Prefetch('days', queryset=Day.objects.order_by('date'))
+    ).order_by('id')
+
+
+def payroll_rows(lines, chunk_size=2000):
+    for line in lines.iterator(chunk_size=chunk_size):
+        employee = line.employee
+        department = line.inconvenience_request.department
+        yield [
+            line.inconvenience_request.request_id,
+            f"{employee.first_name} {employee.last_name}",
+            employee.staff_id or '',
+            department.name if department else '',
+            ' '.join(day.date.isoformat() for day in line.days.all()),
+            line.no_of_weekend or 0,
+            line.no_of_ph or 0,
+            line.no_of_days or 0,
+            line.amount or 0,
+        ]
+
+
+class Echo:
+    """File-like object whose write() hands back what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_csv(rows, file):
+    writer = csv.writer(file)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+
+
+def write_xlsx(rows, file):
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Payroll')
+    worksheet.write_row(0, 0, HEADER)
+    for index, row in enumerate(rows, start=1):
+        worksheet.write_row(index, 0, row)
+    workbook.close()
+
+
+def csv_response(request, rows, filename):
+    response = streaming_response(request, csv_chunks(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_response(rows, filename):
+    file = tempfile.TemporaryFile()
+    write_xlsx(rows, file)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
@@ -0,0 +1,32 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from inconvenience_allowance.exports import payroll_lines, payroll_rows, write_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Export the lines of completed inconvenience requests for payroll as CSV or XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='File to write; "-" writes CSV to standard output')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help='Defaults to the --output extension, else csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='Only lines with a day on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Only lines with a day on or before this date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Number of lines read per query')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        file_format = options['format'] or ('xlsx' if output.endswith('.xlsx') else 'csv')
+        if file_format == 'xlsx' and output == '-':
+            raise CommandError('XLSX needs an --output file.')
+
+        rows = payroll_rows(payroll_lines(options['start'], options['end']), options['chunk_size'])
+        if file_format == 'xlsx':
+            write_xlsx(rows, output)
+        elif output == '-':
+            write_csv(rows, self.stdout)
+        else:
+            with open(output, 'w', newline='') as file:
+                write_csv(rows, file)
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f'Wrote payroll export to {output}.'))
@@ -0,0 +1,33 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from inconvenience_allowance.day_calendar import generate_days
+
+
+class Command(BaseCommand):
+    help = 'Create weekend and public holiday days for a year or a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, action='append', help='Year to generate; repeat for several years')
+        parser.add_argument('--start', type=date.fromisoformat, help='First date of the range (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date of the range (YYYY-MM-DD)')
+        parser.add_argument('--public-holiday', type=date.fromisoformat, action='append', default=[], dest='public_holidays',
+                            help='Public holiday date (YYYY-MM-DD); repeat for several holidays')
+
+    def handle(self, *args, **options):
+        years = options['year']
+        start, end = options['start'], options['end']
+        if years and (start or end):
+            raise CommandError('Use either --year or --start/--end, not both.')
+        if years:
+            start, end = date(min(years), 1, 1), date(max(years), 12, 31)
+            if len(years) != max(years) - min(years) + 1:
+                raise CommandError('Repeated --year values must be consecutive; use --start/--end for anything else.')
+        elif not (start and end):
+            raise CommandError('Provide --year or both --start and --end.')
+        if start > end:
+            raise CommandError('--start must be on or before --end.')
+
+        inserted, skipped = generate_days(start, end, options['public_holidays'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated calendar from {start} to {end}: {inserted} days inserted, {skipped} skipped.'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from inconvenience_allowance.allowance import get_rate_table
+from inconvenience_allowance.models import InconvenienceRequestLine
+from inconvenience_allowance.reports import invalidate_reports
+
+
+class Command(BaseCommand):
+    help = 'Recalculate day counts and amounts on inconvenience request lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--request', type=int, help='Only recalculate lines of this inconvenience request')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of lines priced and written per batch')
+
+    def handle(self, *args, **options):
+        lines = InconvenienceRequestLine.objects.prefetch_related('days').order_by('id')
+        if options['request']:
+            lines = lines.filter(inconvenience_request_id=options['request'])
+
+        rates = get_rate_table()
+        batch_size = options['batch_size']
+        updated = 0
+        batch = []
+        for line in lines.iterator(chunk_size=batch_size):
+            batch.append(line)
+            if len(batch) >= batch_size:
+                updated += InconvenienceRequestLine.reprice(batch, rates)
+                batch = []
+        if batch:
+            updated += InconvenienceRequestLine.reprice(batch, rates)
+        invalidate_reports()
+
+        self.stdout.write(self.style.SUCCESS(f'Recalculated {updated} request lines.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from inconvenience_allowance.models import InconvenienceRequest
+from inconvenience_allowance.totals import recompute
+
+
+class Command(BaseCommand):
+    help = 'Recompute the line totals stored on inconvenience requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--request', type=int, help='Only repair this inconvenience request')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of requests updated per statement')
+
+    def handle(self, *args, **options):
+        if options['request']:
+            repaired = recompute([options['request']])
+        else:
+            request_ids = list(InconvenienceRequest.objects.order_by('id').values_list('id', flat=True))
+            batch_size = options['batch_size']
+            repaired = 0
+            for start in range(0, len(request_ids), batch_size):
+                # One short UPDATE per batch rather than one over the whole table
+                repaired += recompute(request_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed totals of {repaired} requests.'))
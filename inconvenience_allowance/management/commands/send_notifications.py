@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from inconvenience_allowance.notifications import send_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending workflow notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Notifications to claim per batch')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is due now, then exit')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                try:
+                    sent, failed = send_batch(options['batch_size'])
+                except OSError as error:
+                    # The backend could not be reached; the batch was
+                    # released, so it is picked up again on the next pass
+                    if options['once']:
+                        raise CommandError(f'Could not deliver notifications: {error}')
+                    self.stderr.write(f'Could not deliver notifications: {error}')
+                    time.sleep(options['interval'])
+                    continue
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} notifications, {failed} failed.')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+def seed_request_sequences(apps, schema_editor):
+    # Continue numbering after the highest existing IAR/<year>/NNNN per year
+    InconvenienceRequest = apps.get_model('inconvenience_allowance', 'InconvenienceRequest')
+    RequestSequence = apps.get_model('inconvenience_allowance', 'RequestSequence')
+    last_values = {}
+    for request_id in InconvenienceRequest.objects.values_list('request_id', flat=True).iterator():
+        try:
+            _, year, number = request_id.split('/')
+            year, number = int(year), int(number)
+        except ValueError:
+            continue
+        last_values[year] = max(number, last_values.get(year, 0))
+    RequestSequence.objects.bulk_create([
+        RequestSequence(year=year, last_value=last_value)
+        for year, last_value in last_values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inconvenience_allowance', '0004_alter_inconveniencerequestline_attendance_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(unique=True)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_request_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def copy_line_employees(apps, schema_editor):
+    InconvenienceRequestLine = apps.get_model('inconvenience_allowance', 'InconvenienceRequestLine')
+    InconvenienceRequestLineDay = apps.get_model('inconvenience_allowance', 'InconvenienceRequestLineDay')
+    InconvenienceRequestLineDay.objects.update(
+        employee_id=Subquery(InconvenienceRequestLine.objects.filter(pk=OuterRef('line_id')).values('employee_id')[:1])
+    )
+
+    double_bookings = list(
+        InconvenienceRequestLineDay.objects.values('employee_id', 'day_id')
+        .annotate(bookings=Count('id')).filter(bookings__gt=1)[:20]
+    )
+    if double_bookings:
+        listed = ', '.join(f"employee {row['employee_id']} on day {row['day_id']}" for row in double_bookings)
+        raise RuntimeError(
+            f"Cannot enforce one booking per employee and day; resolve these double bookings first: {listed}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inconvenience_allowance', '0005_requestsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Take over the table Django created for the implicit days M2M
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='InconvenienceRequestLineDay',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='inconvenience_allowance.day')),
+                        ('line', models.ForeignKey(db_column='inconveniencerequestline_id', on_delete=django.db.models.deletion.CASCADE, related_name='day_bookings', to='inconvenience_allowance.inconveniencerequestline')),
+                    ],
+                    options={
+                        'db_table': 'inconvenience_allowance_inconveniencerequestline_days',
+                        'unique_together': {('line', 'day')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='inconveniencerequestline',
+                    name='days',
+                    field=models.ManyToManyField(related_name='inconvenience_request_lines', through='inconvenience_allowance.InconvenienceRequestLineDay', to='inconvenience_allowance.day'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inconveniencerequestlineday',
+            name='employee',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='day_bookings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_line_employees, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='inconveniencerequestlineday',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='day_bookings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='inconveniencerequestlineday',
+            constraint=models.UniqueConstraint(fields=('employee', 'day'), name='unique_employee_day_booking'),
+        ),
+        migrations.AddIndex(
+            model_name='inconveniencerequest',
+            index=models.Index(fields=['department', 'status'], name='request_department_status_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:44
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def compute_totals(apps, schema_editor):
+    InconvenienceRequest = apps.get_model('inconvenience_allowance', 'InconvenienceRequest')
+    InconvenienceRequestLine = apps.get_model('inconvenience_allowance', 'InconvenienceRequestLine')
+
+    def aggregate(expression, output_field):
+        lines = (
+            InconvenienceRequestLine.objects.filter(inconvenience_request=OuterRef('pk'))
+            .order_by().values('inconvenience_request').annotate(value=expression).values('value')
+        )
+        return Coalesce(Subquery(lines, output_field=output_field), Value(0), output_field=output_field)
+
+    InconvenienceRequest.objects.update(
+        total_amount=aggregate(Sum('amount'), FloatField()),
+        line_count=aggregate(Count('pk'), IntegerField()),
+        total_weekend_days=aggregate(Sum('no_of_weekend'), IntegerField()),
+        total_ph_days=aggregate(Sum('no_of_ph'), IntegerField()),
+        employee_count=aggregate(Count('employee', distinct=True), IntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inconvenience_allowance', '0007_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inconveniencerequest',
+            name='employee_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inconveniencerequest',
+            name='line_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inconveniencerequest',
+            name='total_amount',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inconveniencerequest',
+            name='total_ph_days',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inconveniencerequest',
+            name='total_weekend_days',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inconvenience_allowance', '0008_request_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inconveniencerequest',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted'), ('manager_approved', 'Manager Approved'), ('work_done', 'Work Done'), ('hr_approval', 'HR Approval'), ('completed', 'Completed'), ('rejected', 'Rejected')], default='draft', max_length=20),
+        ),
+    ]
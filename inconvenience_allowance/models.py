@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from user.models import User, Department
-from datetime import datetime
+from .allowance import calculate_allowance, calculate_allowances
+from .sequences import reserve_request_ids
+from .totals import TotalsChange, line_totals
 
 
 
@@ -17,6 +20,17 @@ class Day(models.Model):
 
 
 
+class RequestSequence(models.Model):
+    # Last request number handed out per year; rows are locked with
+    # select_for_update while numbers are reserved (see sequences.py)
+    year = models.PositiveIntegerField(unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_value}"
+
+
+
 class InconvenienceRequest(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -37,15 +51,29 @@ class InconvenienceRequest(models.Model):
     line_manager = models.ForeignKey(User, on_delete=models.PROTECT, related_name='line_manager_requests',null=True, blank=True)
     hr = models.ForeignKey(User, on_delete=models.PROTECT, related_name='hr_requests', null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Totals over the lines, kept in step as lines change (see totals.py)
+    total_amount = models.FloatField(default=0, editable=False)
+    line_count = models.IntegerField(default=0, editable=False)
+    total_weekend_days = models.IntegerField(default=0, editable=False)
+    total_ph_days = models.IntegerField(default=0, editable=False)
+    employee_count = models.IntegerField(default=0, editable=False)
+
+    TOTALS_FIELDS = {'total_amount', 'line_count', 'total_weekend_days', 'total_ph_days', 'employee_count'}
+
+    class Meta:
+        indexes = [
+            # List views filter by department and include/exclude by status
+            models.Index(fields=['department', 'status'], name='request_department_status_idx'),
+        ]
 
     def generate_request_id(self):
-        current_year = datetime.now().year
-        last_request = InconvenienceRequest.objects.order_by('id').last()
-        if not last_request:
-            new_id = 1
-        else:
-            new_id = last_request.id + 1
-        return f"IAR/{current_year}/{new_id:04d}"
+        return reserve_request_ids(1)[0]
+
+    @classmethod
+    def touch(cls, request_ids):
+        # A request is serialized with its lines, so changing a line bumps
+        # the request's updated_at, which versions it for conditional GETs
+        cls.objects.filter(pk__in=request_ids).update(updated_at=timezone.now())
     
     def __str__(self):
         return f"Request {self.id} by {self.department_rep}"
@@ -55,6 +83,13 @@ class InconvenienceRequest(models.Model):
         if not self.request_id:
             self.request_id = self.generate_request_id()
 
+        if not self._state.adding and not args and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # Totals only change through F() updates (totals.py); writing back
+            # the values loaded with this object could undo a concurrent one
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTALS_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def transition_status(self, new_status):
@@ -69,28 +104,64 @@ class InconvenienceRequest(models.Model):
         if new_status not in valid_transitions.get(self.status, []):
             raise ValueError(f"Invalid status transition from {self.status} to {new_status}")
 
-        self.status = new_status
-        self.save()
+        # Notifications are written to the outbox in the same transaction as
+        # the status change and delivered later by the send_notifications
+        # worker, so the request never waits on mail
+        with transaction.atomic():
+            self.status = new_status
+            self.save()
 
-        # Additional actions can be taken here, such as sending notifications
-        if new_status == 'submitted':
-            self.notify_line_manager()
-        elif new_status == 'manager_approval':
-            self.notify_hr()
-        elif new_status == 'hr_approval':
-            self.notify_completion()
+            if new_status == 'submitted':
+                self.notify_line_manager()
+            elif new_status == 'manager_approved':
+                self.notify_hr()
+            elif new_status == 'hr_approval':
+                self.notify_completion()
 
     def notify_line_manager(self):
-        # Logic to notify the line manager
-        pass
+        from .notifications import enqueue
+        enqueue([self], 'submitted')
 
     def notify_hr(self):
-        # Logic to notify HR
-        pass
+        from .notifications import enqueue
+        enqueue([self], 'manager_approved')
 
     def notify_completion(self):
-        # Logic to notify about completion
-        pass
+        from .notifications import enqueue
+        enqueue([self], 'completed')
+
+
+
+class Notification(models.Model):
+    # Outbox of workflow notifications; see notifications.py
+    EVENT_CHOICES = [
+        ('submitted', 'Submitted'),
+        ('manager_approved', 'Manager Approved'),
+        ('completed', 'Completed'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    inconvenience_request = models.ForeignKey(InconvenienceRequest, on_delete=models.CASCADE, related_name='notifications')
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for pending rows that are due
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for {self.recipient} ({self.status})"
 
 
 
@@ -109,7 +180,7 @@ class InconvenienceRequestLine(models.Model):
     inconvenience_request = models.ForeignKey(InconvenienceRequest, on_delete=models.CASCADE, related_name='lines')
     job_description = models.CharField()   
     employee = models.ForeignKey(User, on_delete=models.PROTECT, related_name='inconvenience_request_lines')
-    days = models.ManyToManyField(Day, related_name='inconvenience_request_lines')
+    days = models.ManyToManyField(Day, through='InconvenienceRequestLineDay', related_name='inconvenience_request_lines')
     no_of_weekend = models.IntegerField(null=True, blank=True)
     no_of_ph = models.IntegerField(null=True, blank=True)
     no_of_days = models.IntegerField(null=True, blank=True)
@@ -120,32 +191,99 @@ class InconvenienceRequestLine(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+    # Fields that decide what a line adds to its request's totals
+    TOTALS_FIELDS = {'inconvenience_request_id', 'employee_id', 'amount', 'no_of_weekend', 'no_of_ph'}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        line = super().from_db(db, field_names, values)
+        # Remember what the stored line adds to its request, so a save or
+        # delete can apply the difference (see totals.py)
+        if cls.TOTALS_FIELDS.issubset(field_names):
+            line.stored_totals = line_totals(line)
+        return line
+
     def __str__(self):
         return f"Line {self.id} - Request {self.inconvenience_request.id}"
     
     def save(self, *args, **kwargs):
-        if self.pk is not None:  # Existing instance
-            self.update_calculations()
-            super().save(*args, **kwargs)
-
-        else:  # New instance
-            super().save(*args, **kwargs)  # Save first to ensure pk is set
-            self.update_calculations()
+        # A new line has no days yet, so price it as empty before the insert
+        # to persist the computed fields; days added later are priced by the
+        # m2m_changed handler in signals.py
+        is_new = self.pk is None
+        self.update_calculations(days=[] if is_new else None)
+        super().save(*args, **kwargs)
+        if not is_new:
+            # Keep the employee copied onto the day bookings in step
+            self.day_bookings.exclude(employee_id=self.employee_id).update(employee_id=self.employee_id)
 
-    def update_calculations(self):
+    def update_calculations(self, days=None):
         # Update no_of_weekend, no_of_ph, no_of_days, and amount
-        self.no_of_weekend = self.calculate_no_of_weekends()
-        self.no_of_ph = self.calculate_no_of_public_holidays()
-        self.no_of_days = self.days.count()
-        self.amount = self.calculate_amount()
+        # `days` lets bulk callers pass the Day objects they already resolved
+        if days is None:
+            days = list(self.days.all())
+        self.apply_allowance(calculate_allowance(days))
+
+    def apply_allowance(self, allowance):
+        self.no_of_weekend = allowance.no_of_weekend
+        self.no_of_ph = allowance.no_of_ph
+        self.no_of_days = allowance.no_of_days
+        self.amount = allowance.amount
 
-    def calculate_no_of_weekends(self):
-        return sum(1 for day in self.days.all() if day.category=='weekend')  # Assuming weekends are Saturday (5) and Sunday (6)
+    @classmethod
+    def reprice(cls, lines, rates=None):
+        """Price `lines` from their (prefetched) days and store them, keeping their requests' totals in step."""
+        allowances = calculate_allowances([line.days.all() for line in lines], rates)
+        for line, allowance in zip(lines, allowances):
+            line.apply_allowance(allowance)
+        with transaction.atomic():
+            cls.objects.bulk_update(lines, ['no_of_weekend', 'no_of_ph', 'no_of_days', 'amount'])
+            change = TotalsChange()
+            for line in lines:
+                change.saved(line)
+            change.apply()
+        return len(lines)
 
-    def calculate_no_of_public_holidays(self):
-        return sum(1 for day in self.days.all() if day.category=='public_holiday')  # Assuming Day model has an 'is_public_holiday' field
 
-    def calculate_amount(self):
-        return (self.no_of_weekend * 3500) + (self.no_of_ph * 15000)
 
+class InconvenienceRequestLineDayQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # line.days.add()/set() write through rows with bulk_create and
+        # never call save(), so copy the employees of their lines here
+        objs = list(objs)
+        line_ids = {obj.line_id for obj in objs if obj.employee_id is None}
+        if line_ids:
+            employees = dict(InconvenienceRequestLine.objects.filter(pk__in=line_ids).values_list('pk', 'employee_id'))
+            for obj in objs:
+                if obj.employee_id is None:
+                    obj.employee_id = employees.get(obj.line_id)
+        return super().bulk_create(objs, *args, **kwargs)
 
+
+class InconvenienceRequestLineDay(models.Model):
+    # Through model for InconvenienceRequestLine.days. The line's employee is
+    # copied here so the database itself refuses to book someone twice for
+    # the same day. Uses the table Django created for the original M2M.
+    # save(), bulk_create() and the days relation fill the employee in; code
+    # that writes this table with update() or raw SQL must set it itself,
+    # and keep it in step when a line's employee changes.
+    line = models.ForeignKey(InconvenienceRequestLine, on_delete=models.CASCADE, related_name='day_bookings', db_column='inconveniencerequestline_id')
+    day = models.ForeignKey(Day, on_delete=models.CASCADE, related_name='bookings')
+    employee = models.ForeignKey(User, on_delete=models.PROTECT, related_name='day_bookings')
+
+    objects = InconvenienceRequestLineDayQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'inconvenience_allowance_inconveniencerequestline_days'
+        unique_together = [('line', 'day')]
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'day'], name='unique_employee_day_booking'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} on {self.day.date}"
+
+    def save(self, *args, **kwargs):
+        if self.employee_id is None:
+            self.employee_id = self.line.employee_id
+        super().save(*args, **kwargs)
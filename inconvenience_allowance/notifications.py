@@ -0,0 +1,219 @@
+"""Workflow notifications through a transactional outbox.
+
+Status transitions only insert Notification rows, in the same transaction as
+the status change. A notification therefore exists exactly when its change
+was committed, and the API never waits on mail.
+
+The send_notifications command drains the outbox in batches, in three steps,
+so no transaction or row lock is held while mail is sent:
+
+1. claim: a short transaction selects due rows with SELECT ... FOR UPDATE
+   SKIP LOCKED (where the database supports it), counts an attempt and moves
+   next_attempt_at NOTIFICATION_CLAIM_TIMEOUT seconds ahead. Once committed,
+   other workers no longer see the rows as due.
+2. deliver: all of a recipient's rows in the batch are combined into one
+   digest message and sent.
+3. record: a second transaction marks the rows sent, or schedules a retry.
+   Rows that were never tried, e.g. because the backend could not connect,
+   are released as they were.
+
+A worker that dies between claiming and recording leaves its rows to be
+claimed again once the claim expires, so a digest may be sent twice but is
+never lost. A failed digest is retried after NOTIFICATION_RETRY_DELAY
+seconds, doubling on every attempt, and is marked failed after
+NOTIFICATION_MAX_ATTEMPTS.
+
+Delivery goes through NOTIFICATION_BACKEND:
+
+- EmailBackend (the default) sends through Django's EMAIL_BACKEND. Point
+  EMAIL_HOST/EMAIL_PORT at a local SMTP stand-in, or use the console, file or
+  locmem email backends, to test without a mail server.
+- FileBackend appends each digest as a JSON line to NOTIFICATION_FILE_PATH.
+"""
+import json
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from user.models import User
+from user.roles import HR, LINE_MANAGER
+
+from .models import Notification
+
+
+DEFAULT_BACKEND = 'inconvenience_allowance.notifications.EmailBackend'
+
+MESSAGES = {
+    'submitted': '{request_id} "{title}" was submitted and is waiting for your approval.',
+    'manager_approved': '{request_id} "{title}" was approved by the line manager.',
+    'completed': '{request_id} "{title}" has been completed.',
+}
+
+Digest = namedtuple('Digest', ['recipient', 'subject', 'body'])
+
+
+def recipients(requests, event):
+    """(request, recipient id) pairs to notify of `event` on `requests`.
+
+    Looked up with at most one query for the whole batch.
+    """
+    if event == 'submitted':
+        # The line managers of each request's department
+        managers = {}
+        department_ids = {inconvenience_request.department_id for inconvenience_request in requests}
+        for department_id, user_id in User.objects.filter(
+            groups__name=LINE_MANAGER, department_id__in=department_ids
+        ).values_list('department_id', 'id'):
+            managers.setdefault(department_id, set()).add(user_id)
+        return [
+            (inconvenience_request, user_id)
+            for inconvenience_request in requests
+            for user_id in managers.get(inconvenience_request.department_id, ())
+        ]
+    if event == 'manager_approved':
+        hr_officers = set(User.objects.filter(groups__name=HR).values_list('id', flat=True))
+        return [(inconvenience_request, user_id) for inconvenience_request in requests for user_id in hr_officers]
+    # Completion goes back to the department rep who raised the request
+    return [(inconvenience_request, inconvenience_request.department_rep_id) for inconvenience_request in requests]
+
+
+def enqueue(requests, event):
+    """Add a notification of `event` on each of `requests` to the outbox."""
+    Notification.objects.bulk_create([
+        Notification(recipient_id=recipient_id, inconvenience_request=inconvenience_request, event=event)
+        for inconvenience_request, recipient_id in recipients(requests, event)
+    ])
+
+
+def build_digest(recipient, notifications):
+    lines = [
+        MESSAGES[notification.event].format(
+            request_id=notification.inconvenience_request.request_id,
+            title=notification.inconvenience_request.title,
+        )
+        for notification in notifications
+    ]
+    if len(lines) == 1:
+        subject = lines[0]
+    else:
+        subject = f'{len(lines)} updates on inconvenience requests'
+    return Digest(recipient.email, subject, '\n'.join(lines))
+
+
+class EmailBackend:
+    """Sends digests through Django's email backend, over one connection per batch."""
+
+    def __enter__(self):
+        self.connection = get_connection()
+        self.connection.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+
+    def send(self, digest):
+        EmailMessage(digest.subject, digest.body, to=[digest.recipient], connection=self.connection).send()
+
+
+class FileBackend:
+    """Appends digests as JSON lines to NOTIFICATION_FILE_PATH."""
+
+    def __enter__(self):
+        self.file = open(settings.NOTIFICATION_FILE_PATH, 'a', encoding='utf-8')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+    def send(self, digest):
+        self.file.write(json.dumps(digest._asdict()) + '\n')
+        self.file.flush()
+
+
+def get_backend():
+    return import_string(getattr(settings, 'NOTIFICATION_BACKEND', DEFAULT_BACKEND))()
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_RETRY_DELAY', 60) * 2 ** (attempts - 1))
+
+
+def claim_batch(batch_size=100):
+    """Claim up to `batch_size` due notifications, with their recipients and requests."""
+    now = timezone.now()
+    claimed_until = now + timedelta(seconds=getattr(settings, 'NOTIFICATION_CLAIM_TIMEOUT', 300))
+    with transaction.atomic():
+        due = Notification.objects.filter(status='pending', next_attempt_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            # Lock only the outbox rows, not the joined users and requests
+            of = ('self',) if connection.features.has_select_for_update_of else ()
+            due = due.select_for_update(skip_locked=True, of=of)
+        notifications = list(
+            due.select_related('recipient', 'inconvenience_request').order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if notifications:
+            Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(
+                attempts=F('attempts') + 1, next_attempt_at=claimed_until,
+            )
+    for notification in notifications:
+        notification.attempts += 1
+        notification.next_attempt_at = claimed_until
+    return notifications
+
+
+def record_results(notifications, errors):
+    """Store the outcome of a delivery; `errors` maps each tried recipient id to its exception or None."""
+    now = timezone.now()
+    max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+    tried = [notification for notification in notifications if notification.recipient_id in errors]
+    untried = [notification.pk for notification in notifications if notification.recipient_id not in errors]
+    for notification in tried:
+        error = errors[notification.recipient_id]
+        if error is None:
+            notification.status = 'sent'
+            notification.sent_at = now
+        else:
+            notification.last_error = repr(error)
+            notification.next_attempt_at = now + retry_delay(notification.attempts)
+            if notification.attempts >= max_attempts:
+                notification.status = 'failed'
+    with transaction.atomic():
+        Notification.objects.bulk_update(tried, ['status', 'next_attempt_at', 'last_error', 'sent_at'])
+        if untried:
+            Notification.objects.filter(pk__in=untried).update(attempts=F('attempts') - 1, next_attempt_at=now)
+
+
+def send_batch(batch_size=100, backend=None):
+    """Deliver up to `batch_size` due notifications; returns (sent, failed) row counts.
+
+    Errors opening or closing the backend are raised once the results so far
+    are recorded.
+    """
+    notifications = claim_batch(batch_size)
+    if not notifications:
+        return 0, 0
+
+    by_recipient = {}
+    for notification in notifications:
+        by_recipient.setdefault(notification.recipient_id, []).append(notification)
+
+    errors = {}
+    try:
+        with backend or get_backend() as delivery:
+            for recipient_id, rows in by_recipient.items():
+                try:
+                    delivery.send(build_digest(rows[0].recipient, rows))
+                except Exception as error:
+                    errors[recipient_id] = error
+                else:
+                    errors[recipient_id] = None
+    finally:
+        record_results(notifications, errors)
+    sent = sum(len(by_recipient[recipient_id]) for recipient_id, error in errors.items() if error is None)
+    return sent, len(notifications) - sent
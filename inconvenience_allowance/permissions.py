@@ -1,36 +1,30 @@
 from rest_framework import permissions
-from django.contrib.auth.models import Group
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
 
 class IsDepartmentRep(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Department Representatives').exists()
+        return request.user.is_authenticated and request.user.has_role(DEPARTMENT_REP)
 
 class IsHR(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='HR').exists()
+        return request.user.is_authenticated and request.user.has_role(HR)
 
 class IsLineManager(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Line Managers').exists()
+        return request.user.is_authenticated and request.user.has_role(LINE_MANAGER)
 
 class IsEmployee(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Employees').exists()
+        return request.user.is_authenticated and request.user.has_role(EMPLOYEE)
 
 
 class IsInDepartment(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Assuming `department` is a ForeignKey or related field in your model
-        if request.user.groups.filter(name='HR').exists():
+        if request.user.has_role(HR):
             return True  # HR can view all records
 
-        if request.user.groups.filter(name='Department Representatives').exists():
-            return obj.department == request.user.department
-
-        if request.user.groups.filter(name='Line Managers').exists():
-            return obj.department == request.user.department
-
-        if request.user.groups.filter(name='Employees').exists():
-            return obj.department == request.user.department
+        if request.user.has_role(DEPARTMENT_REP, LINE_MANAGER, EMPLOYEE):
+            return obj.department_id == request.user.department_id
 
         return False
@@ -0,0 +1,169 @@
+"""Allowance totals for reporting.
+
+``allowance_report`` groups request lines by any of department, employee,
+month, status and day category, and sums their day counts and amounts in a
+single grouped query.
+
+Lines store their totals but not how the amount splits between weekends and
+public holidays, or between the months their days fall in. So when grouping
+by category or month, the query runs over the day bookings instead. Each booking gets the share of its line's stored amount
+that its price under the rate table (priced in SQL, the same way the lines
+were priced) is of the line's. Every grouping therefore sums the same stored
+amounts, even for lines priced before a rate was changed.
+
+Months are those of the booked days, the same dates the start/end filters
+look at. The filters select the lines with at least one day booked in that
+range; such a line counts in full.
+
+Reports are cached under a version number. It is bumped whenever lines, their
+days, their requests or the calendar change (see signals.py). With the
+default per-process cache, other workers only pick up a change once
+ALLOWANCE_REPORT_CACHE_TIMEOUT has passed.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Concat, NullIf, TruncMonth
+
+from .allowance import PUBLIC_HOLIDAY, WEEKEND, get_rate_table
+from .models import InconvenienceRequestLineDay
+
+
+VERSION_KEY = 'allowance-report-version'
+
+GROUPS = ['department', 'employee', 'month', 'status', 'category']
+
+# Report columns are selected under this prefix so they can't clash with the
+# model's own fields (employee, amount, ...)
+ALIAS = 'report_'
+
+
+def group_columns(group_by, prefix=''):
+    """Output columns for `group_by`, as lookups from a line (or from `prefix`)."""
+    columns = {}
+    for group in group_by:
+        if group == 'department':
+            columns['department'] = F(prefix + 'inconvenience_request__department_id')
+            columns['department_name'] = F(prefix + 'inconvenience_request__department__name')
+        elif group == 'employee':
+            columns['employee'] = F(prefix + 'employee_id')
+            columns['employee_name'] = Concat(prefix + 'employee__first_name', Value(' '), prefix + 'employee__last_name')
+            columns['staff_id'] = F(prefix + 'employee__staff_id')
+        elif group == 'month' and prefix:
+            columns['month'] = TruncMonth('day__date')
+        elif group == 'status':
+            columns['status'] = F(prefix + 'inconvenience_request__status')
+        elif group == 'category' and prefix:
+            columns['category'] = F('day__category')
+    return {ALIAS + name: expression for name, expression in columns.items()}
+
+
+def booking_price(rates):
+    """SQL expression for the price of one day booking under `rates`."""
+    whens = []
+    for category, start, end, rate in rates.periods():
+        condition = Q(day__category=category)
+        if start:
+            condition &= Q(day__date__gte=start)
+        if end:
+            condition &= Q(day__date__lt=end)
+        whens.append(When(condition, then=Value(rate)))
+    return Case(*whens, default=Value(0), output_field=FloatField())
+
+
+def line_totals(lines, group_by):
+    aggregates = {
+        ALIAS + 'lines': Count('id'),
+        ALIAS + 'no_of_days': Sum('no_of_days'),
+        ALIAS + 'no_of_weekend': Sum('no_of_weekend'),
+        ALIAS + 'no_of_ph': Sum('no_of_ph'),
+        ALIAS + 'amount': Sum('amount'),
+    }
+    columns = group_columns(group_by)
+    if not columns:
+        return [lines.aggregate(**aggregates)]
+    return lines.values(**columns).annotate(**aggregates).order_by(*columns)
+
+
+def line_price(rates):
+    """SQL expression for the price of a booking's whole line under `rates`."""
+    return Subquery(
+        InconvenienceRequestLineDay.objects.filter(line=OuterRef('line'))
+        .order_by().values('line').annotate(price=Sum(booking_price(rates))).values('price'),
+        output_field=FloatField(),
+    )
+
+
+def booking_share(rates):
+    """SQL expression for a booking's share of its line's stored amount.
+
+    Needs the line's price aliased as `line_price`. Shares follow the
+    bookings' prices under `rates`; a line none of whose days has a rate is
+    split evenly over its days.
+    """
+    return Case(
+        When(line_price__gt=0, then=F('line__amount') * booking_price(rates) / F('line_price')),
+        default=F('line__amount') / NullIf(F('line__no_of_days'), 0),
+        output_field=FloatField(),
+    )
+
+
+def booking_totals(lines, group_by):
+    columns = group_columns(group_by, prefix='line__')
+    rates = get_rate_table()
+    bookings = InconvenienceRequestLineDay.objects.filter(line__in=lines.values('id')).alias(line_price=line_price(rates))
+    return bookings.values(**columns).annotate(**{
+        ALIAS + 'lines': Count('line_id', distinct=True),
+        ALIAS + 'no_of_days': Count('id'),
+        ALIAS + 'no_of_weekend': Count('id', filter=Q(day__category=WEEKEND)),
+        ALIAS + 'no_of_ph': Count('id', filter=Q(day__category=PUBLIC_HOLIDAY)),
+        ALIAS + 'amount': Sum(booking_share(rates)),
+    }).order_by(*columns)
+
+
+def filter_lines(lines, start=None, end=None):
+    """The `lines` with at least one day booked between `start` and `end`, inclusive."""
+    if not (start or end):
+        return lines
+    bookings = InconvenienceRequestLineDay.objects.all()
+    if start:
+        bookings = bookings.filter(day__date__gte=start)
+    if end:
+        bookings = bookings.filter(day__date__lte=end)
+    # A subquery rather than a join on days, so a line with several days in
+    # range is still counted once
+    return lines.filter(pk__in=bookings.values('line'))
+
+
+def allowance_report(lines, group_by=(), start=None, end=None):
+    """Totals of `lines` (a line queryset) per group, plus overall totals."""
+    lines = filter_lines(lines, start, end)
+
+    # The SQL identifies the user's visible lines and the filters
+    key = 'allowance-report:{}:{}'.format(
+        cache.get_or_set(VERSION_KEY, 1, None),
+        hashlib.sha256('{}|{}'.format(lines.query, ','.join(group_by)).encode()).hexdigest(),
+    )
+    report = cache.get(key)
+    if report is None:
+        if 'category' in group_by or 'month' in group_by:
+            rows = booking_totals(lines, group_by)
+        else:
+            rows = line_totals(lines, group_by)
+        results = [{name[len(ALIAS):]: value for name, value in row.items()} for row in rows]
+        totals = {
+            name: sum(row[name] or 0 for row in results)
+            for name in ('no_of_days', 'no_of_weekend', 'no_of_ph', 'amount')
+        }
+        report = {'group_by': list(group_by), 'results': results, 'totals': totals}
+        cache.set(key, report, getattr(settings, 'ALLOWANCE_REPORT_CACHE_TIMEOUT', 300))
+    return report
+
+
+def invalidate_reports():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
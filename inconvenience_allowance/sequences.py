@@ -0,0 +1,41 @@
+"""Per-year numbering for inconvenience request IDs (IAR/<year>/NNNN).
+
+Numbers come from a counter row per year in RequestSequence. Reserving locks
+that single row with SELECT ... FOR UPDATE, so concurrent creates queue on
+the row instead of racing for the same number, and the cost does not grow
+with the number of requests. Numbering starts again at 1 each year.
+"""
+from datetime import datetime
+from django.apps import apps
+from django.db import transaction
+
+
+REQUEST_ID_FORMAT = "IAR/{year}/{number:04d}"
+
+
+def reserve_request_numbers(count=1, year=None):
+    """Reserve `count` consecutive numbers for `year` and return them as a range."""
+    if count < 1:
+        raise ValueError("count must be at least 1")
+    if year is None:
+        year = datetime.now().year
+    RequestSequence = apps.get_model('inconvenience_allowance', 'RequestSequence')
+
+    with transaction.atomic():
+        # Make sure the year's row exists without racing other creators
+        RequestSequence.objects.bulk_create([RequestSequence(year=year)], ignore_conflicts=True)
+        sequence = RequestSequence.objects.select_for_update().get(year=year)
+        first = sequence.last_value + 1
+        sequence.last_value += count
+        sequence.save(update_fields=['last_value'])
+    return range(first, sequence.last_value + 1)
+
+
+def reserve_request_ids(count=1, year=None):
+    """Reserve a block of formatted request IDs, e.g. for bulk imports."""
+    if year is None:
+        year = datetime.now().year
+    return [
+        REQUEST_ID_FORMAT.format(year=year, number=number)
+        for number in reserve_request_numbers(count, year)
+    ]
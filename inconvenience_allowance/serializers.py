@@ -1,7 +1,15 @@
 from rest_framework import serializers
-from .models import InconvenienceRequest, InconvenienceRequestLine, Day
+from .models import InconvenienceRequest, InconvenienceRequestLine, InconvenienceRequestLineDay, Day
+from .allowance import calculate_allowances
+from .day_calendar import day_calendar
+from .reports import GROUPS, invalidate_reports
+from .totals import TotalsChange
+from .workflow import MAX_BULK_TRANSITIONS
 from egbin_ssp.exceptions import SerializerValidationException
 from django.shortcuts import get_object_or_404
+from datetime import date
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from user.models import User
 from rest_framework.exceptions import PermissionDenied
 
@@ -13,82 +21,177 @@ class DaySerializer(serializers.ModelSerializer):
 
 
 
+def get_preloaded_employee(field, employee_id):
+    """Look up an employee among those preloaded by the bulk serializer.
+
+    Returns None when nothing was preloaded or the id is not in the map.
+    """
+    employees = getattr(field.root, '_employees', None)
+    if employees is None:
+        return None
+    try:
+        return employees.get(int(employee_id))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmployeeField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        employee = get_preloaded_employee(self, data)
+        if employee is not None:
+            return employee
+        return super().to_internal_value(data)
+
+
+
 class BulkInconvenienceRequestLineSerializer(serializers.ListSerializer):
     
-    def create_or_update_instance(self, validated_data, inconvenience_request):
-        if 'job_description' in validated_data:
-            inconvenience_request.description = validated_data['job_description']
-        day_instances = validated_data.get('dates')
-
-        # Use `update_or_create` for single instance
-        instance, created = InconvenienceRequestLine.objects.update_or_create(
-            id=validated_data.get('id'),
-            defaults={
-                'inconvenience_request': inconvenience_request,
-                'employee': validated_data.get('employee'),
-                'job_description':inconvenience_request.description,
-            }
-        )
-        instance.days.set(day_instances)  # Set the Many-to-Many field
-        instance.save()
-        return instance
+    def create_or_update_instances(self, lines, inconvenience_request):
+        """Persist validated lines with a fixed number of statements.
 
+        New lines are inserted with bulk_create, existing ones are updated with
+        bulk_update, and every days through row is written in one bulk_create.
+        """
+        # Only lines of this request can be updated; any other id would move
+        # a line over from another request
+        line_ids = {data['id'] for data in lines if data.get('id')}
+        existing = InconvenienceRequestLine.objects.filter(inconvenience_request=inconvenience_request).in_bulk(line_ids)
+        unknown = line_ids - set(existing)
+        if unknown:
+            ids = ",".join(str(line_id) for line_id in sorted(unknown))
+            raise SerializerValidationException(detail=[f"Lines: {ids} do not belong to this request"], code=400)
 
+        new_instances = []
+        updated_instances = []
+        instances = []
+        # Totals come from the Day objects resolved during validation
+        allowances = calculate_allowances([data.get('dates', []) for data in lines])
+        for data, allowance in zip(lines, allowances):
+            instance = existing.get(data['id']) if data.get('id') else None
+            if instance is None:
+                instance = InconvenienceRequestLine()
+                new_instances.append(instance)
+            else:
+                updated_instances.append(instance)
+            instance.inconvenience_request = inconvenience_request
+            instance.employee = data.get('employee')
+            instance.job_description = inconvenience_request.description
+            instance.apply_allowance(allowance)
+            instances.append(instance)
 
-    def validate_data(self, data,creator,invalid_days:set, invalid_employees:list, booked_dates:list):
-        #check if line exists
-        line = InconvenienceRequestLine.objects.filter(id=data.get('id',None)).first()
+        try:
+            with transaction.atomic():
+                self._write_lines(instances, new_instances, updated_instances, lines)
+        except IntegrityError:
+            # Another submission booked one of these employees since validation;
+            # the unique (employee, day) constraint caught it
+            raise SerializerValidationException(
+                detail=["One or more employees have already been booked for some of these days."], code=400
+            )
 
-        
-        #validate employee
-        employee = User.objects.get(id=data["employee"].id)
-        if employee and creator.department != employee.department:
-            invalid_employees.append(employee)
-            # raise PermissionDenied(f"{employee.first_name} does not belong to your department")
+        # Load the days for the response in a single query
+        prefetch_related_objects(instances, 'days')
+        return instances
 
-        #validate dates
-        days = data.get('dates', [])
-        day_instances = []
-        for date in days:
-            try:
-                day_instance = Day.objects.get(date=date)
-                day_instances.append(day_instance)
-            except:
-                invalid_days.add(str(date))
-        
-            # Check each date in the list to ensure none have been booked with a non-draft status
-        for date in day_instances:
-            # Filter for existing bookings
-            
-            #check if line exists and has that date
-            if line and InconvenienceRequestLine.objects.filter(id=data['id'],employee=data['employee'],days=date).first():
-                pass
-            else:
-                bookings = InconvenienceRequestLine.objects.filter(
-                employee=data['employee'],
-                days=date  # Assumes days__date is the correct field to filter on
+    def _write_lines(self, instances, new_instances, updated_instances, lines):
+        if new_instances:
+            InconvenienceRequestLine.objects.bulk_create(new_instances)
+        if updated_instances:
+            InconvenienceRequestLine.objects.bulk_update(
+                updated_instances,
+                ['inconvenience_request', 'employee', 'job_description', 'no_of_weekend', 'no_of_ph', 'no_of_days', 'amount']
             )
-            
-                if bookings.exists():  # Check if any bookings are found
-                    #first of all check if it is update or create
-                    message = f"{data['employee'].first_name} cannot be booked for {date.date} as they have already been booked for that day."
+            # Replace the days of updated lines, like days.set() would
+            InconvenienceRequestLineDay.objects.filter(line__in=updated_instances).delete()
+        InconvenienceRequestLineDay.objects.bulk_create([
+            InconvenienceRequestLineDay(line_id=instance.id, day_id=day.id, employee_id=instance.employee_id)
+            for instance, data in zip(instances, lines)
+            for day in data.get('dates', [])
+        ])
+        # Bulk writes send no post_save, so update the requests' totals and
+        # drop cached reports here
+        change = TotalsChange()
+        for instance in new_instances:
+            change.saved(instance, created=True)
+        for instance in updated_instances:
+            change.saved(instance)
+        change.apply()
+        transaction.on_commit(invalidate_reports)
+
+    def to_internal_value(self, data):
+        # Resolve every employee in the payload with a single query so the
+        # child serializers don't hit the database once per line
+        if isinstance(data, list):
+            employee_ids = set()
+            for item in data:
+                if isinstance(item, dict) and item.get('employee'):
+                    try:
+                        employee_ids.add(int(item['employee']))
+                    except (TypeError, ValueError):
+                        pass
+            self._employees = User.objects.in_bulk(employee_ids)
+        return super().to_internal_value(data)
+
+    def validate_data(self, lines, creator, invalid_days:set, invalid_employees:list, booked_dates:list):
+        #collect every employee and date in the payload up front
+        employee_ids = {data['employee'].id for data in lines}
+        # Lines updated by this payload have their days replaced, so the
+        # bookings they hold now are released; a date may move between them
+        updated_line_ids = {data['id'] for data in lines if data.get('id')}
+        dates = {date for data in lines for date in data.get('dates', [])}
+
+        #resolve all dates from the in-memory calendar
+        days_by_date = day_calendar.resolve(dates)
+
+        #load every existing booking for these employees on these days with one query
+        booked_lines = dict(
+            ((employee_id, day_id), line_id)
+            for employee_id, day_id, line_id in InconvenienceRequestLineDay.objects.filter(
+                employee_id__in=employee_ids,
+                day_id__in=[day.id for day in days_by_date.values()]
+            ).values_list('employee_id', 'day_id', 'line_id')
+        )
+        requested = set()
+
+        for data in lines:
+            employee = data['employee']
+
+            #validate employee
+            if creator.department_id != employee.department_id:
+                invalid_employees.append(f"{employee.first_name} does not belong to your department")
+
+            #validate dates
+            day_instances = []
+            for date in data.get('dates', []):
+                day_instance = days_by_date.get(date)
+                if day_instance is None:
+                    invalid_days.add(str(date))
+                else:
+                    day_instances.append(day_instance)
+
+            # Check each date in the list to ensure none have been booked already,
+            # ignoring bookings held by lines this payload updates, and that the
+            # payload doesn't book the same employee twice for one day
+            for date in day_instances:
+                booked_line = booked_lines.get((employee.id, date.id))
+                if (booked_line is not None and booked_line not in updated_line_ids) or (employee.id, date.id) in requested:
+                    message = f"{employee.first_name} cannot be booked for {date.date} as they have already been booked for that day."
                     booked_dates.append(message)
+                requested.add((employee.id, date.id))
             data['dates'] = day_instances
-        return data
+        return lines
 
     def create(self, validated_data):
         inconvenience_request_id = self.context.get('inconvenience_request_id')
         inconvenience_request = InconvenienceRequest.objects.get(id=inconvenience_request_id)
         invalid_days = set()
-        invalid_employees = set()
+        invalid_employees = []
         booked_dates = []
         error_list = []
         if isinstance(validated_data, list):
             # Bulk create list of instances
-            inconvenience_request_lines = []
-            for data in validated_data:
-                #validate data
-                self.validate_data(data,self.context.get('user'),invalid_days,invalid_employees,booked_dates)
+            #validate all lines together
+            self.validate_data(validated_data,self.context.get('user'),invalid_days,invalid_employees,booked_dates)
            
             if invalid_days:
                 dates = ",".join(invalid_days)
@@ -101,12 +204,9 @@ class BulkInconvenienceRequestLineSerializer(serializers.ListSerializer):
             
             if error_list:
                 raise SerializerValidationException(detail=error_list,code=400)
-            for data in validated_data:
-                instance = self.create_or_update_instance(data, inconvenience_request)
-                inconvenience_request_lines.append(instance)
-            return inconvenience_request_lines
+            return self.create_or_update_instances(validated_data, inconvenience_request)
         else:
-            self.validate_data(validated_data,self.context.get('user'),invalid_days,invalid_employees,booked_dates)
+            self.validate_data([validated_data],self.context.get('user'),invalid_days,invalid_employees,booked_dates)
             if invalid_days:
                 error_list.extend(invalid_days)
             if invalid_employees:
@@ -117,7 +217,7 @@ class BulkInconvenienceRequestLineSerializer(serializers.ListSerializer):
             if error_list:
                 raise SerializerValidationException(detail=error_list,code=400)
 
-            return self.create_or_update_instance(validated_data, inconvenience_request)
+            return self.create_or_update_instances([validated_data], inconvenience_request)[0]
 
 
 
@@ -128,6 +228,7 @@ class InconvenienceRequestLineSerializer(serializers.ModelSerializer):
             child=serializers.DateField(),
             required=False, write_only=True
         )
+    employee = EmployeeField(queryset=User.objects.all())
     days = DaySerializer(many=True, read_only=True)
     status = serializers.SerializerMethodField(read_only=True)
     employee_name = serializers.SerializerMethodField(read_only=True)
@@ -147,6 +248,11 @@ class InconvenienceRequestLineSerializer(serializers.ModelSerializer):
             'attendance_status': {'read_only': True},
             'created_at': {'read_only': True}
         }
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # Everything the serializer reads per line, loaded up front
+        return queryset.select_related('employee', 'inconvenience_request').prefetch_related('days')
+
     def get_status(self, obj):
         return obj.inconvenience_request.status if obj.inconvenience_request else None
 
@@ -156,18 +262,21 @@ class InconvenienceRequestLineSerializer(serializers.ModelSerializer):
         return None
     def to_internal_value(self, data):
         # Validate the employee field
-        employee_id = data.get('employee')
-        line_id = data.get('id')
-        if employee_id:
+        employee_id = data.get('employee') if isinstance(data, dict) else None
+        line_id = data.get('id') if isinstance(data, dict) else None
+        if employee_id and get_preloaded_employee(self, employee_id) is None:
             try:
                 pos = User.objects.get(pk=employee_id)
-            except User.DoesNotExist:
+            except (User.DoesNotExist, TypeError, ValueError):
                 # Customize the error message here
                 raise SerializerValidationException(f"Employee with id {employee_id} does not exist. Contact Support")
     
         validated_data = super().to_internal_value(data)
         if line_id:
-            validated_data['id'] = line_id
+            try:
+                validated_data['id'] = serializers.IntegerField(min_value=1).run_validation(line_id)
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({'id': exc.detail})
         return validated_data
 
 
@@ -177,7 +286,8 @@ class InconvenienceRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = InconvenienceRequest
-        fields = ['id', 'request_id', 'title', 'description', 'department', 'department_rep', 'created_at', 'updated_at', 'status','lines']
+        fields = ['id', 'request_id', 'title', 'description', 'department', 'department_rep', 'created_at', 'updated_at', 'status',
+                  'total_amount', 'line_count', 'total_weekend_days', 'total_ph_days', 'employee_count', 'lines']
         extra_kwargs = {
             'request_id':{'read_only':True},
             'department': {'read_only': True},
@@ -186,20 +296,116 @@ class InconvenienceRequestSerializer(serializers.ModelSerializer):
             'updated_at': {'read_only': True},
             'status': {'read_only': True}
         }
-        
-    
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related('department', 'department_rep').prefetch_related(cls.lines_prefetch())
+
+    @classmethod
+    def lines_prefetch(cls):
+        # Lines are prefetched with their employee and days; Django fills in
+        # line.inconvenience_request from the parent request
+        lines = InconvenienceRequestLine.objects.select_related('employee').prefetch_related('days')
+        return Prefetch('lines', queryset=lines)
+
     def create(self, validated_data):
         request = self.context.get('request')
         validated_data['department_rep'] = request.user
-        validated_data['department'] = request.user.department
+        validated_data['department_id'] = request.user.department_id
 
         # Call super to handle the actual creation
         return super().create(validated_data)
+
+
+class InconvenienceRequestSummarySerializer(serializers.ModelSerializer):
+    # A request with the totals stored on it instead of its lines
+    class Meta:
+        model = InconvenienceRequest
+        fields = ['id', 'request_id', 'title', 'description', 'department', 'department_rep', 'created_at', 'updated_at', 'status',
+                  'total_amount', 'line_count', 'total_weekend_days', 'total_ph_days', 'employee_count']
+        read_only_fields = fields
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset
     
 
+class DayBulkGenerateSerializer(serializers.Serializer):
+    year = serializers.IntegerField(required=False, min_value=1900, max_value=2999)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    public_holidays = serializers.ListField(child=serializers.DateField(), required=False, default=list)
+
+    def validate(self, data):
+        if 'year' in data:
+            if 'start' in data or 'end' in data:
+                raise serializers.ValidationError("Provide either a year or a start and end date, not both.")
+            data['start'] = date(data['year'], 1, 1)
+            data['end'] = date(data['year'], 12, 31)
+        elif 'start' not in data or 'end' not in data:
+            raise serializers.ValidationError("Provide a year or both a start and end date.")
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("start must be on or before end.")
+        return data
+
+
+class DayBulkGenerateResultSerializer(serializers.Serializer):
+    inserted = serializers.IntegerField()
+    skipped = serializers.IntegerField()
+
+
+class AllowanceReportQuerySerializer(serializers.Serializer):
+    group_by = serializers.CharField(required=False, default='')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate_group_by(self, value):
+        groups = []
+        for group in value.split(','):
+            group = group.strip()
+            if not group or group in groups:
+                continue
+            if group not in GROUPS:
+                raise serializers.ValidationError(f"Unknown group '{group}'. Choose from: {', '.join(GROUPS)}.")
+            groups.append(group)
+        return groups
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError("start must be on or before end.")
+        return data
+
+
+class PayrollExportQuerySerializer(serializers.Serializer):
+    file_type = serializers.ChoiceField(choices=['csv', 'xlsx'], default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError("start must be on or before end.")
+        return data
+
+
+class AllowanceReportSerializer(serializers.Serializer):
+    group_by = serializers.ListField(child=serializers.CharField())
+    results = serializers.ListField(child=serializers.DictField())
+    totals = serializers.DictField()
+
+
 class TransitionSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=InconvenienceRequest.STATUS_CHOICES)
 
+class BulkTransitionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_TRANSITIONS)
+    status = serializers.ChoiceField(choices=InconvenienceRequest.STATUS_CHOICES)
+
+class BulkTransitionResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    success = serializers.BooleanField()
+    status = serializers.CharField(allow_null=True)
+    error = serializers.CharField(allow_null=True)
+
 class ErrorResponseSerializer(serializers.Serializer):
     status_code = serializers.IntegerField()
     errors = serializers.ListField()
\ No newline at end of file
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from user.signals import users_renamed
+from .day_calendar import day_calendar
+from .models import Day, InconvenienceRequest, InconvenienceRequestLine
+from .reports import invalidate_reports
+from .totals import TotalsChange
+
+
+@receiver(m2m_changed, sender=InconvenienceRequestLine.days.through)
+def reprice_line(sender, instance, action, reverse, pk_set, **kwargs):
+    # Keep totals in step when days are changed through the relation
+    # (admin, days.set()); the bulk serializer path prices lines itself
+    if reverse:
+        reprice_day_lines(sender, instance, action, pk_set)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    instance.update_calculations()
+    InconvenienceRequestLine.objects.filter(pk=instance.pk).update(
+        no_of_weekend=instance.no_of_weekend,
+        no_of_ph=instance.no_of_ph,
+        no_of_days=instance.no_of_days,
+        amount=instance.amount,
+    )
+    change = TotalsChange()
+    change.saved(instance)
+    change.apply()
+    transaction.on_commit(invalidate_reports)
+
+
+def reprice_day_lines(through, day, action, line_ids):
+    # day.inconvenience_request_lines.add()/remove()/clear() changes the days
+    # of the lines in `line_ids`, or of every line booked on the day
+    if action == 'pre_clear':
+        # The bookings are gone by post_clear, so note whose they were
+        day._cleared_line_ids = list(through.objects.filter(day=day).values_list('line_id', flat=True))
+        return
+    if action == 'post_clear':
+        line_ids = day.__dict__.pop('_cleared_line_ids', None)
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if line_ids:
+        lines = InconvenienceRequestLine.objects.filter(pk__in=line_ids).prefetch_related('days')
+        InconvenienceRequestLine.reprice(list(lines))
+        transaction.on_commit(invalidate_reports)
+
+
+@receiver(post_save, sender=Day)
+@receiver(post_delete, sender=Day)
+def day_changed(sender, **kwargs):
+    # Wait for the commit so other workers don't reload the old rows
+    transaction.on_commit(day_calendar.invalidate)
+    # A day's category decides how its bookings are reported
+    transaction.on_commit(invalidate_reports)
+
+
+@receiver(post_save, sender=InconvenienceRequestLine)
+def line_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata; run repair_request_totals afterwards
+        return
+    change = TotalsChange()
+    change.saved(instance, created)
+    change.apply()
+
+
+@receiver(post_delete, sender=InconvenienceRequestLine)
+def line_deleted(sender, instance, origin=None, **kwargs):
+    # Lines deleted along with their request have no totals left to keep
+    deleted_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(deleted_model, InconvenienceRequest):
+        return
+    change = TotalsChange()
+    change.deleted(instance)
+    change.apply()
+
+
+@receiver(users_renamed)
+def employees_renamed(sender, user_ids, **kwargs):
+    # Lines are serialized and reported with their employee's name, so a
+    # rename changes every request the employee is on
+    InconvenienceRequest.touch(
+        InconvenienceRequestLine.objects.filter(employee_id__in=user_ids).values('inconvenience_request')
+    )
+    transaction.on_commit(invalidate_reports)
+
+
+@receiver(post_save, sender=InconvenienceRequestLine)
+@receiver(post_delete, sender=InconvenienceRequestLine)
+@receiver(post_save, sender=InconvenienceRequest)
+@receiver(post_delete, sender=InconvenienceRequest)
+def report_data_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_reports)
@@ -0,0 +1,52 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+async def iterate_in_batches(iterator, batch_size=100):
+    """Async iterator over the sync `iterator`, `batch_size` chunks per thread hop.
+
+    The chunks are produced with thread_sensitive sync_to_async, so on the
+    thread the view ran on, which holds its database connection and cursor.
+    """
+    iterator = iter(iterator)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch_size)), thread_sensitive=True)
+    try:
+        while batch := await next_batch():
+            yield ''.join(batch)
+    finally:
+        # Release the cursor when the client goes away mid-stream
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def streaming_response(request, chunks, **kwargs):
+    """StreamingHttpResponse over the sync iterator `chunks`, streamed under WSGI and ASGI alike.
+
+    Under ASGI, Django would otherwise read a sync iterator to the end before
+    sending anything, so it is handed an async iterator instead.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = iterate_in_batches(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
+
+
+def stream_json_list(request, queryset, serializer_class, chunk_size=500, context=None):
+    """Stream `queryset` as a JSON array, serializing one row at a time.
+
+    Rows are read with iterator(chunk_size=...), so memory stays flat no matter
+    how many rows match. Prefetches on the queryset are applied per chunk.
+    """
+    encoder = JSONEncoder()
+
+    def rows():
+        yield '['
+        for index, obj in enumerate(queryset.iterator(chunk_size=chunk_size)):
+            data = serializer_class(obj, context=context or {}).data
+            yield (',' if index else '') + encoder.encode(data)
+        yield ']'
+
+    return streaming_response(request, rows(), content_type='application/json')
@@ -1,3 +1,1131 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group
+from django.db import IntegrityError, connection, transaction
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+
+from egbin_ssp.pagination import IdCursorPagination
+from user.models import Department, User
+from user.imports import import_users
+from user.tokens import issue_refresh_token
+from user.roles import DEPARTMENT_REP, HR, LINE_MANAGER, primary_role
+from .models import (
+    Day, InconvenienceRequest, InconvenienceRequestLine, InconvenienceRequestLineDay, Notification, RequestSequence,
+)
+from .day_calendar import day_calendar
+from .allowance import RateTable, calculate_allowance, calculate_allowances
+from .access import check_request_access, lines_visible_to, requests_visible_to
+from .notifications import FileBackend, claim_batch, enqueue, send_batch
+from .workflow import bulk_transition, permitted_transitions
+from .reports import allowance_report
+from .sequences import REQUEST_ID_FORMAT, reserve_request_ids
+from .streaming import streaming_response
+
+
+class RequestIdReservationTests(TransactionTestCase):
+    threads = 8
+    creates = 30
+
+    def test_concurrent_creates_are_numbered_without_gaps(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Run with egbin_ssp.settings.sqlite, whose test database is a file
+            self.skipTest("in-memory SQLite can't serve writers from several threads")
+        department = Department.objects.create(name='Operations')
+        rep = User.objects.create_user(email='rep@example.com', first_name='Rep', last_name='One', department=department)
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def create():
+            try:
+                barrier.wait()
+                for index in range(self.creates):
+                    InconvenienceRequest.objects.create(
+                        title=f'Request {index}', description='Shutdown', department=department, department_rep=rep,
+                    )
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=create) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        expected = self.threads * self.creates
+        request_ids = list(InconvenienceRequest.objects.values_list('request_id', flat=True))
+        self.assertEqual(len(request_ids), expected)
+        # Unique, and this year's numbers run from 1 with no gaps
+        year = datetime.now().year
+        self.assertEqual(sorted(request_ids), [
+            REQUEST_ID_FORMAT.format(year=year, number=number) for number in range(1, expected + 1)
+        ])
+
+    def test_numbering_is_per_year(self):
+        self.assertEqual(reserve_request_ids(2, year=2030), ['IAR/2030/0001', 'IAR/2030/0002'])
+        self.assertEqual(reserve_request_ids(1, year=2031), ['IAR/2031/0001'])
+        self.assertEqual(reserve_request_ids(1, year=2030), ['IAR/2030/0003'])
+
+
+def create_fixture(requests=3, lines_per_request=4, status='submitted'):
+    """A department with a rep, an HR user and `requests` requests of booked lines."""
+    department = Department.objects.create(name='Operations')
+    rep = User.objects.create_user(email='rep@example.com', first_name='Rep', last_name='One', department=department)
+    rep.groups.add(Group.objects.get_or_create(name=DEPARTMENT_REP)[0])
+    hr = User.objects.create_user(email='hr@example.com', first_name='Human', last_name='Resources', department=department)
+    hr.groups.add(Group.objects.get_or_create(name=HR)[0])
+    employees = [
+        User.objects.create_user(email=f'employee{index}@example.com', first_name='Employee', last_name=str(index), department=department)
+        for index in range(lines_per_request)
+    ]
+    days = [
+        Day.objects.create(date=date(2024, 1, 6) + timedelta(weeks=week), category='weekend')
+        for week in range(requests * 2)
+    ]
+    inconvenience_requests = []
+    for index in range(requests):
+        inconvenience_request = InconvenienceRequest.objects.create(
+            title=f'Request {index}', description='Shutdown', department=department, department_rep=rep, status=status,
+        )
+        for employee in employees:
+            line = InconvenienceRequestLine.objects.create(
+                inconvenience_request=inconvenience_request, employee=employee, job_description='Shutdown',
+            )
+            line.days.set(days[index * 2:index * 2 + 2])
+        inconvenience_requests.append(inconvenience_request)
+    return rep, hr, inconvenience_requests
+
+
+class QueryCountTests(TestCase):
+    """List and detail endpoints make a fixed number of queries however many rows they return."""
+
+    def setUp(self):
+        self.rep, self.hr, self.requests = create_fixture()
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        # A fresh user object, so roles are loaded once per test like once per request
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+
+    def test_request_list(self):
+        self.authenticate(self.hr)
+        # roles, list version, requests, lines, days
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('inconvenience-request-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_request_detail(self):
+        self.authenticate(self.hr)
+        # roles, request, lines, days
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('inconvenience-request-detail', args=[self.requests[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['lines']), 4)
+
+    def test_line_list(self):
+        self.authenticate(self.hr)
+        # roles, list version, lines with request and employee, days
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('inconvenience-request-line-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 12)
+
+    def test_line_detail(self):
+        self.authenticate(self.hr)
+        line = self.requests[0].lines.first()
+        # roles, line with request and employee, days
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('inconvenience-request-line-detail', args=[line.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_transition_loads_lines_only_for_the_response(self):
+        self.authenticate(self.hr)
+        InconvenienceRequest.objects.filter(pk=self.requests[0].pk).update(status='work_done')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('inconvenience-request-transition-status', args=[self.requests[0].pk]), {'status': 'hr_approval'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'completed')
+        line_queries = [query['sql'] for query in queries.captured_queries if 'inconveniencerequestline' in query['sql']]
+        # One for the lines and one for their days, after the transition
+        self.assertEqual(len(line_queries), 2)
+
+
+class AllowanceTests(SimpleTestCase):
+
+    RATES = {
+        'weekend': [('2024-01-01', 4000), ('2020-01-01', 3000)],
+        'public_holiday': [(date(2020, 1, 1), 15000)],
+    }
+
+    def day(self, on, category='weekend'):
+        return Day(date=on, category=category)
+
+    def test_rates_apply_from_their_effective_date(self):
+        rates = RateTable(self.RATES)
+        self.assertEqual(rates.rate('weekend', date(2019, 6, 1)), 3000)
+        self.assertEqual(rates.rate('weekend', date(2023, 12, 31)), 3000)
+        self.assertEqual(rates.rate('weekend', date(2024, 1, 1)), 4000)
+        self.assertEqual(rates.rate('public_holiday', date(2030, 1, 1)), 15000)
+        self.assertEqual(rates.rate('unknown', date(2024, 1, 1)), 0)
+        self.assertEqual(sorted(rates.periods(), key=lambda period: (period[0], period[1] or date.min)), [
+            ('public_holiday', None, None, 15000),
+            ('weekend', None, date(2024, 1, 1), 3000),
+            ('weekend', date(2024, 1, 1), None, 4000),
+        ])
+
+    def test_line_is_priced_per_day(self):
+        allowance = calculate_allowance([
+            self.day(date(2023, 12, 30)), self.day(date(2024, 1, 6)), self.day(date(2024, 1, 1), 'public_holiday'),
+        ], RateTable(self.RATES))
+        self.assertEqual(allowance, (2, 1, 3, 3000 + 4000 + 15000))
+        self.assertEqual(calculate_allowance([], RateTable(self.RATES)), (0, 0, 0, 0))
+
+    def test_lines_are_priced_together(self):
+        rates = RateTable(self.RATES)
+        lines = [[self.day(date(2024, 1, 6))], [self.day(date(2024, 1, 6)), self.day(date(2019, 1, 5))], []]
+        with mock.patch.object(rates, 'rate', wraps=rates.rate) as rate:
+            allowances = calculate_allowances(lines, rates)
+        self.assertEqual([allowance.amount for allowance in allowances], [4000, 7000, 0])
+        # Each distinct (category, date) is looked up once
+        self.assertEqual(rate.call_count, 2)
+
+    @override_settings(INCONVENIENCE_ALLOWANCE_RATES={'weekend': [('2000-01-01', 5000)]})
+    def test_rates_come_from_settings(self):
+        allowance = calculate_allowance([self.day(date(2024, 1, 6)), self.day(date(2024, 1, 1), 'public_holiday')])
+        self.assertEqual(allowance, (1, 1, 2, 5000))
+
+
+class RecalculateAllowancesTests(TestCase):
+
+    def setUp(self):
+        _, _, self.requests = create_fixture(requests=2, lines_per_request=2)
+
+    def amounts(self):
+        return dict(InconvenienceRequest.objects.values_list('pk', 'total_amount'))
+
+    def test_lines_and_totals_follow_new_rates(self):
+        self.assertEqual(set(self.amounts().values()), {4 * 3500})
+        with override_settings(INCONVENIENCE_ALLOWANCE_RATES={'weekend': [('2000-01-01', 3500), ('2024-01-10', 5000)]}):
+            call_command('recalculate_allowances', '--request', str(self.requests[1].pk), '--batch-size', '1', stdout=StringIO())
+        # Only the second request, whose days are all after the new rate
+        self.assertEqual(self.amounts(), {self.requests[0].pk: 4 * 3500, self.requests[1].pk: 4 * 5000})
+        self.assertEqual(
+            set(InconvenienceRequestLine.objects.filter(inconvenience_request=self.requests[1]).values_list('amount', flat=True)),
+            {2 * 5000},
+        )
+
+        with override_settings(INCONVENIENCE_ALLOWANCE_RATES={'weekend': [('2000-01-01', 1000)]}):
+            call_command('recalculate_allowances', stdout=StringIO())
+        self.assertEqual(set(self.amounts().values()), {4 * 1000})
+
+
+class DayCalendarTests(TestCase):
+
+    def setUp(self):
+        self.saturday = Day.objects.create(date=date(2024, 6, 1), category='weekend')
+        self.sunday = Day.objects.create(date=date(2024, 6, 2), category='weekend')
+        day_calendar.invalidate()
+        self.addCleanup(day_calendar.invalidate)
+        user = User.objects.create_user(email='hr@example.com', first_name='Human', last_name='Resources')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def list_days(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('day-list'), **headers)
+
+    def test_changing_a_category_reloads_the_calendar(self):
+        etag = self.list_days()['ETag']
+        self.assertEqual(self.list_days(etag).status_code, 304)
+        self.assertEqual(day_calendar.get(self.sunday.date).category, 'weekend')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sunday.category = 'public_holiday'
+            self.sunday.save()
+
+        self.assertEqual(day_calendar.get(self.sunday.date).category, 'public_holiday')
+        response = self.list_days(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            [(day['date'], day['category']) for day in response.json()],
+            [('2024-06-01', 'weekend'), ('2024-06-02', 'public_holiday')],
+        )
+
+    def test_deleting_a_day_reloads_the_calendar(self):
+        etag = self.list_days()['ETag']
+        self.assertIsNotNone(day_calendar.get(self.saturday.date))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.saturday.delete()
+
+        self.assertIsNone(day_calendar.get(date(2024, 6, 1)))
+        self.assertEqual(day_calendar.resolve([date(2024, 6, 1), date(2024, 6, 2)]), {date(2024, 6, 2): self.sunday})
+        response = self.list_days(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['date'] for day in response.json()], ['2024-06-02'])
+
+    def test_calendar_is_kept_until_the_change_commits(self):
+        self.assertEqual(day_calendar.get(self.sunday.date).category, 'weekend')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.sunday.category = 'public_holiday'
+            self.sunday.save()
+            # Other workers must not reload a change that may still roll back
+            self.assertEqual(day_calendar.get(self.sunday.date).category, 'weekend')
+        self.assertTrue(callbacks)
+
+
+class CalendarGenerationTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(day_calendar.invalidate)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(email='hr@example.com', first_name='Human', last_name='Resources')
+        )
+
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_calendar', *args, stdout=out)
+        return out.getvalue()
+
+    def test_command_creates_weekends_and_holidays_once(self):
+        args = ['--year', '2024', '--public-holiday', '2024-12-25', '--public-holiday', '2024-06-01']
+        self.assertIn('105 days inserted, 0 skipped', self.generate(*args))
+        days = dict(Day.objects.values_list('date', 'category'))
+        # 2024 has 52 Saturdays and 52 Sundays; a holiday on a Saturday counts once
+        self.assertEqual(len(days), 105)
+        self.assertEqual(days[date(2024, 6, 1)], 'public_holiday')
+        self.assertEqual(days[date(2024, 12, 25)], 'public_holiday')
+        self.assertTrue(all(
+            day.weekday() >= 5 for day, category in days.items() if category == 'weekend'
+        ))
+
+        self.assertIn('0 days inserted, 105 skipped', self.generate(*args))
+        self.assertEqual(Day.objects.count(), 105)
+
+    def test_command_rejects_bad_arguments(self):
+        for args in (
+            ['--year', '2024', '--start', '2024-01-01', '--end', '2024-01-31'],
+            ['--year', '2024', '--year', '2026'],
+            ['--start', '2024-01-01'],
+            ['--start', '2024-02-30', '--end', '2024-03-31'],
+            ['--start', '2024-03-31', '--end', '2024-03-01'],
+        ):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                self.generate(*args)
+        self.assertFalse(Day.objects.exists())
+
+    def test_endpoint_skips_existing_and_duplicate_dates(self):
+        # An existing day keeps its category even when listed as a holiday
+        Day.objects.create(date=date(2024, 6, 8), category='weekend')
+        payload = {'start': '2024-06-01', 'end': '2024-06-09', 'public_holidays': ['2024-06-03', '2024-06-03', '2024-06-08']}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('day-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'inserted': 4, 'skipped': 1})
+        self.assertEqual(
+            [(day['date'], day['category']) for day in self.client.get(reverse('day-list')).json()],
+            [('2024-06-01', 'weekend'), ('2024-06-02', 'weekend'), ('2024-06-03', 'public_holiday'),
+             ('2024-06-08', 'weekend'), ('2024-06-09', 'weekend')],
+        )
+
+        response = self.client.post(reverse('day-bulk'), payload, format='json')
+        self.assertEqual(response.json(), {'inserted': 0, 'skipped': 5})
+        self.assertEqual(Day.objects.count(), 5)
+
+    def test_endpoint_rejects_invalid_dates(self):
+        for payload in (
+            {},
+            {'year': 2024, 'start': '2024-01-01'},
+            {'start': '2024-06-09', 'end': '2024-06-01'},
+            {'start': '2024-02-30', 'end': '2024-03-31'},
+            {'year': 2024, 'public_holidays': ['2024-02-30']},
+            {'year': 1066},
+        ):
+            with self.subTest(payload=payload):
+                response = self.client.post(reverse('day-bulk'), payload, format='json')
+                self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(Day.objects.exists())
+
+
+class BulkLineTests(TestCase):
+    """Bulk line POSTs, which make the same number of queries for one line as for many."""
+
+    def setUp(self):
+        self.rep, _, (self.request, self.other) = create_fixture(requests=2, lines_per_request=1, status='draft')
+        self.employees = [
+            User.objects.create_user(
+                email=f'new{index}@example.com', first_name='New', last_name=str(index), department=self.rep.department,
+            )
+            for index in range(6)
+        ]
+        Day.objects.create(date=date(2024, 6, 1), category='weekend')
+        Day.objects.create(date=date(2024, 6, 2), category='weekend')
+        # Load the calendar up front, and drop it with the rolled back days
+        day_calendar.invalidate()
+        day_calendar.all()
+        self.addCleanup(day_calendar.invalidate)
+        self.client = APIClient()
+
+    def post(self, payload, queries):
+        # A fresh user, so roles are loaded once per post like once per request
+        self.client.force_authenticate(User.objects.get(pk=self.rep.pk))
+        with self.assertNumQueries(queries):
+            response = self.client.post(
+                reverse('inconvenience-request-line-detail', args=[self.request.pk]), payload, format='json',
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()), len(payload))
+
+    def test_creating_one_line_and_many_lines_cost_the_same(self):
+        # request, roles, employees, request, bookings, savepoint, lines,
+        # days, totals, release, days for the response
+        for employees in (self.employees[:1], self.employees[1:]):
+            self.post([{'employee': employee.pk, 'dates': ['2024-06-01', '2024-06-02']} for employee in employees], 11)
+
+    def test_updating_one_line_and_many_lines_cost_the_same(self):
+        self.post([{'employee': employee.pk, 'dates': ['2024-06-01', '2024-06-02']} for employee in self.employees], 11)
+        lines = dict(self.request.lines.values_list('employee_id', 'pk'))
+        # As above, plus loading the lines and releasing their days
+        for employees in (self.employees[:1], self.employees[1:]):
+            self.post([
+                {'id': lines[employee.pk], 'employee': employee.pk, 'dates': ['2024-06-01']} for employee in employees
+            ], 13)
+
+    def test_non_numeric_employee_is_a_bad_request(self):
+        self.client.force_authenticate(User.objects.get(pk=self.rep.pk))
+        for payload in ([{'employee': 'abc', 'dates': ['2024-06-01']}], {'employee': 'abc', 'dates': ['2024-06-01']}):
+            response = self.client.post(
+                reverse('inconvenience-request-line-detail', args=[self.request.pk]), payload, format='json',
+            )
+            self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(self.request.lines.count(), 1)
+
+    def send(self, payload):
+        self.client.force_authenticate(User.objects.get(pk=self.rep.pk))
+        return self.client.post(
+            reverse('inconvenience-request-line-detail', args=[self.request.pk]), payload, format='json',
+        )
+
+    def test_lines_are_created_and_updated_in_bulk(self):
+        first, second = self.employees[:2]
+        response = self.send([
+            {'employee': first.pk, 'dates': ['2024-06-01', '2024-06-02']},
+            {'employee': second.pk, 'dates': ['2024-06-01']},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        lines = dict(self.request.lines.values_list('employee_id', 'pk'))
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.line_count, self.request.total_weekend_days, self.request.employee_count), (3, 5, 3))
+
+        response = self.send([
+            {'id': lines[first.pk], 'employee': first.pk, 'dates': ['2024-06-02']},
+            {'id': lines[second.pk], 'employee': second.pk, 'dates': ['2024-06-01', '2024-06-02']},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([line['id'] for line in response.json()], [lines[first.pk], lines[second.pk]])
+        # The days of updated lines are replaced, not added to
+        bookings = InconvenienceRequestLineDay.objects.filter(line_id__in=[lines[first.pk], lines[second.pk]])
+        self.assertEqual(
+            sorted(bookings.values_list('employee_id', 'day__date')),
+            sorted([(first.pk, date(2024, 6, 2)), (second.pk, date(2024, 6, 1)), (second.pk, date(2024, 6, 2))]),
+        )
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.line_count, self.request.total_weekend_days), (3, 5))
+
+    def test_line_of_another_request_is_not_moved(self):
+        line = self.other.lines.get()
+        employee_id = line.employee_id
+        response = self.send([{'id': line.pk, 'employee': self.employees[0].pk, 'dates': ['2024-06-01']}])
+        self.assertEqual(response.status_code, 400, response.content)
+        line.refresh_from_db()
+        self.assertEqual((line.inconvenience_request_id, line.employee_id), (self.other.pk, employee_id))
+        self.assertEqual(self.request.lines.count(), 1)
+
+    def test_unknown_line_is_rejected(self):
+        response = self.send([{'id': 999999, 'employee': self.employees[0].pk, 'dates': ['2024-06-01']}])
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(self.request.lines.count(), 1)
+
+    def test_non_numeric_line_id_is_a_bad_request(self):
+        for line_id in ('abc', [1], -3):
+            response = self.send([{'id': line_id, 'employee': self.employees[0].pk, 'dates': ['2024-06-01']}])
+            self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(self.request.lines.count(), 1)
+
+
+class RequestVersionTests(TestCase):
+    """A request's updated_at changes whenever anything in its serialized body does."""
+
+    def setUp(self):
+        _, _, self.requests = create_fixture()
+        InconvenienceRequest.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def versions(self):
+        return dict(InconvenienceRequest.objects.values_list('pk', 'updated_at'))
+
+    def test_moving_a_line_versions_both_requests(self):
+        before = self.versions()
+        line = InconvenienceRequestLine.objects.filter(inconvenience_request=self.requests[0]).first()
+        line.inconvenience_request = self.requests[1]
+        line.save()
+        after = self.versions()
+        self.assertGreater(after[self.requests[0].pk], before[self.requests[0].pk])
+        self.assertGreater(after[self.requests[1].pk], before[self.requests[1].pk])
+        self.assertEqual(after[self.requests[2].pk], before[self.requests[2].pk])
+
+    def test_renaming_an_employee_versions_their_requests(self):
+        employee = User.objects.get(email='employee0@example.com')
+        before = self.versions()
+        employee.save()
+        self.assertEqual(self.versions(), before)
+
+        employee.last_name = 'Renamed'
+        employee.save()
+        after = self.versions()
+        self.assertTrue(all(after[pk] > before[pk] for pk in before))
+
+    def test_import_renames_version_requests(self):
+        before = self.versions()
+        import_users([
+            {'email': 'employee1@example.com', 'first_name': 'Employee', 'last_name': '1'},
+        ], workers=1)
+        self.assertEqual(self.versions(), before)
+
+        import_users([
+            {'email': 'employee1@example.com', 'first_name': 'Employee', 'last_name': 'One'},
+        ], workers=1)
+        after = self.versions()
+        self.assertTrue(all(after[pk] > before[pk] for pk in before))
+
+
+class RequestDeletionTests(TestCase):
+
+    def setUp(self):
+        _, _, self.requests = create_fixture()
+
+    def request_updates(self, queries):
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE') and 'inconvenience_allowance_inconveniencerequest"' in query['sql']
+        ]
+
+    def test_deleting_a_request_leaves_the_totals_alone(self):
+        request_id = self.requests[0].pk
+        with CaptureQueriesContext(connection) as queries:
+            self.requests[0].delete()
+        self.assertEqual(self.request_updates(queries), [])
+        self.assertFalse(InconvenienceRequestLine.objects.filter(inconvenience_request_id=request_id).exists())
+
+    def test_deleting_requests_in_bulk_leaves_the_totals_alone(self):
+        with CaptureQueriesContext(connection) as queries:
+            InconvenienceRequest.objects.filter(pk__in=[request.pk for request in self.requests[:2]]).delete()
+        self.assertEqual(self.request_updates(queries), [])
+        self.assertEqual(InconvenienceRequestLine.objects.count(), 4)
+
+    def test_deleting_a_line_updates_its_request(self):
+        line = InconvenienceRequestLine.objects.filter(inconvenience_request=self.requests[0]).first()
+        line.delete()
+        inconvenience_request = InconvenienceRequest.objects.get(pk=self.requests[0].pk)
+        self.assertEqual(inconvenience_request.line_count, 3)
+        self.assertEqual(inconvenience_request.employee_count, 3)
+
+
+class RolePrecedenceTests(TestCase):
+    """A user with several roles transitions under their primary role but keeps the views' read rules."""
+
+    def setUp(self):
+        self.rep, self.hr, self.requests = create_fixture(requests=2, status='work_done')
+        other = Department.objects.create(name='Finance')
+        InconvenienceRequest.objects.filter(pk=self.requests[1].pk).update(department=other)
+        InconvenienceRequest.objects.filter(pk=self.requests[0].pk).update(status='draft')
+        self.rep.groups.add(Group.objects.get(name=HR), Group.objects.get_or_create(name=LINE_MANAGER)[0])
+        # A fresh object, so its roles are loaded with the new groups
+        self.user = User.objects.get(pk=self.rep.pk)
+
+    def test_transitions_use_the_rep_role_and_reads_keep_hr_access(self):
+        self.assertEqual(primary_role(self.user), DEPARTMENT_REP)
+        draft = InconvenienceRequest.objects.get(pk=self.requests[0].pk)
+        elsewhere = InconvenienceRequest.objects.get(pk=self.requests[1].pk)
+        self.assertEqual(permitted_transitions(self.user), {('draft', 'submitted')})
+
+        # The request list checks for a rep first; requests and lines check for HR first
+        self.assertEqual(list(requests_visible_to(self.user)), [draft])
+        check_request_access(self.user, elsewhere)
+        with self.assertRaises(PermissionDenied):
+            check_request_access(self.user, draft)
+        self.assertEqual({line.inconvenience_request_id for line in lines_visible_to(self.user)}, {elsewhere.pk})
+
+        # Bulk moves pick from the request list, so the rep can submit the draft
+        results = bulk_transition(self.user, [draft.pk, elsewhere.pk], 'submitted')
+        self.assertEqual([(result['id'], result['success']) for result in results], [(draft.pk, True), (elsewhere.pk, False)])
+
+    def test_hr_alone(self):
+        hr = User.objects.get(pk=self.hr.pk)
+        self.assertEqual(primary_role(hr), HR)
+        self.assertEqual(list(requests_visible_to(hr)), [InconvenienceRequest.objects.get(pk=self.requests[1].pk)])
+        self.assertEqual(permitted_transitions(hr), {('work_done', 'hr_approval')})
+
+
+class BulkTransitionTests(TestCase):
+    """POST /inconvenience-requests/transition-status/bulk/ moves what it may in one UPDATE and reports every ID."""
+
+    def setUp(self):
+        self.rep, self.hr, self.requests = create_fixture(requests=5, lines_per_request=1)
+        self.ids = [inconvenience_request.pk for inconvenience_request in self.requests]
+        InconvenienceRequest.objects.filter(pk=self.ids[2]).update(status='work_done')
+        InconvenienceRequest.objects.filter(pk=self.ids[3]).update(department=Department.objects.create(name='Finance'))
+        self.manager = User.objects.create_user(
+            email='manager@example.com', first_name='Line', last_name='Manager', department=self.rep.department,
+        )
+        self.manager.groups.add(Group.objects.get_or_create(name=LINE_MANAGER)[0])
+        self.client = APIClient()
+
+    def post(self, user, payload):
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+        return self.client.post(reverse('inconvenience-request-bulk-transition-status'), payload, format='json')
+
+    def statuses(self):
+        return dict(InconvenienceRequest.objects.filter(pk__in=self.ids).values_list('pk', 'status'))
+
+    def test_mixed_batch(self):
+        allowed, also_allowed, wrong_state, elsewhere, untouched = self.ids
+        payload = {'ids': [allowed, also_allowed, wrong_state, elsewhere, 999999, allowed], 'status': 'manager_approved'}
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.post(self.manager, payload)
+        self.assertEqual(response.status_code, 200)
+        not_found = 'InconvenienceRequest not found'
+        self.assertEqual(response.json(), [
+            {'id': allowed, 'success': True, 'status': 'manager_approved', 'error': None},
+            {'id': also_allowed, 'success': True, 'status': 'manager_approved', 'error': None},
+            {'id': wrong_state, 'success': False, 'status': 'work_done',
+             'error': 'Not permitted to transition from work_done to manager_approved'},
+            {'id': elsewhere, 'success': False, 'status': None, 'error': not_found},
+            {'id': 999999, 'success': False, 'status': None, 'error': not_found},
+        ])
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "inconvenience_allowance_inconveniencerequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.statuses(), {
+            allowed: 'manager_approved', also_allowed: 'manager_approved', wrong_state: 'work_done',
+            elsewhere: 'submitted', untouched: 'submitted',
+        })
+        self.assertEqual(
+            set(Notification.objects.filter(event='manager_approved').values_list('inconvenience_request_id', flat=True)),
+            {allowed, also_allowed},
+        )
+
+    def test_hr_approval_completes_the_requests(self):
+        response = self.post(self.hr, {'ids': self.ids, 'status': 'hr_approval'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['success'] for result in response.json()], [False, False, True, False, False])
+        self.assertEqual(response.json()[2]['status'], 'completed')
+        self.assertEqual(self.statuses()[self.ids[2]], 'completed')
+
+    def test_nothing_to_move_runs_no_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(self.manager, {'ids': [self.ids[2], 999999], 'status': 'manager_approved'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(query['sql'].startswith('UPDATE') for query in queries))
+
+    def test_invalid_payloads(self):
+        for payload in ({'ids': [], 'status': 'submitted'}, {'ids': ['x'], 'status': 'submitted'}, {'ids': [1], 'status': 'nope'}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(self.manager, payload).status_code, 400)
+
+    def test_users_without_transitions_are_refused(self):
+        employee = User.objects.create_user(
+            email='someone@example.com', first_name='Some', last_name='One', department=self.rep.department,
+        )
+        response = self.post(employee, {'ids': self.ids[:1], 'status': 'manager_approved'})
+        self.assertEqual(response.json(), {'status_code': 400, 'errors': ['Not authorized to update status']})
+        self.assertEqual(self.statuses()[self.ids[0]], 'submitted')
+
+
+class ListPagingTests(TestCase):
+    """Cursor pages and streaming on the request, line and own line lists."""
+
+    def setUp(self):
+        _, self.hr, _ = create_fixture()
+        self.employee = User.objects.get(email='employee0@example.com')
+        self.client = APIClient()
+
+    def lists(self):
+        # (url, user, number of rows they see)
+        return [
+            (reverse('inconvenience-request-list'), self.hr, 3),
+            (reverse('inconvenience-request-line-list'), self.hr, 12),
+            (reverse('inconvenience-request-line-own'), self.employee, 3),
+        ]
+
+    def get(self, url, user, **params):
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        for url, user, count in self.lists():
+            with self.subTest(url=url):
+                everything = self.get(url, user).json()
+                self.assertEqual(len(everything), count)
+                # The plain list keeps the table's order; pages are newest first
+                ids = sorted((row['id'] for row in everything), reverse=True)
+
+                pages = [self.get(url, user, page_size=2).json()]
+                while pages[-1]['next']:
+                    pages.append(self.get(pages[-1]['next'], user).json())
+                self.assertTrue(all(len(page['results']) <= 2 for page in pages))
+                self.assertEqual([row['id'] for page in pages for row in page['results']], ids)
+
+                # And back again from the last page
+                previous = self.get(pages[-1]['previous'], user).json()
+                self.assertEqual(previous['results'], pages[-2]['results'])
+
+    def test_stream_matches_the_plain_list(self):
+        for url, user, count in self.lists():
+            with self.subTest(url=url):
+                response = self.get(url, user, stream='true')
+                self.assertTrue(response.streaming)
+                streamed = json.loads(b''.join(response.streaming_content))
+                self.assertEqual(len(streamed), count)
+                plain = sorted(self.get(url, user).json(), key=lambda row: row['id'], reverse=True)
+                self.assertEqual(streamed, plain)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.client.force_authenticate(User.objects.get(pk=self.hr.pk))
+        response = self.client.get(reverse('inconvenience-request-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(IdCursorPagination, 'max_page_size', 5):
+            page = self.get(reverse('inconvenience-request-line-list'), self.hr, page_size=1000).json()
+        self.assertEqual(len(page['results']), 5)
+
+
+class AsyncEndpointTests(TestCase):
+    """The /api/async/ read endpoints answer like their /api/ equivalents."""
+
+    def setUp(self):
+        self.rep, self.hr, self.requests = create_fixture()
+        department = self.rep.department
+        self.draft = InconvenienceRequest.objects.create(
+            title='Draft', description='Shutdown', department=department, department_rep=self.rep, status='draft',
+        )
+        self.manager = User.objects.create_user(email='manager@example.com', first_name='Line', last_name='Manager', department=department)
+        self.manager.groups.add(Group.objects.get_or_create(name=LINE_MANAGER)[0])
+        self.employee = User.objects.get(email='employee0@example.com')
+        self.outsider = User.objects.create_user(
+            email='outsider@example.com', first_name='Out', last_name='Sider',
+            department=Department.objects.create(name='Finance'),
+        )
+        self.outsider.groups.add(Group.objects.get_or_create(name=DEPARTMENT_REP)[0])
+        self.addCleanup(day_calendar.invalidate)
+
+    def users(self):
+        return [self.hr, self.rep, self.manager, self.employee, self.outsider]
+
+    def headers(self, user):
+        return {'Authorization': f'Bearer {issue_refresh_token(user).access_token}'}
+
+    def sync_get(self, url, user, **params):
+        return APIClient().get(url, params, headers=self.headers(user))
+
+    async def async_get(self, url, user, **params):
+        return await AsyncClient().get(url, params, headers=await sync_to_async(self.headers)(user))
+
+    def by_id(self, rows):
+        return sorted(rows, key=lambda row: row['id'])
+
+    async def test_lists_match_the_sync_endpoints(self):
+        for trusted in (False, True):
+            for name in ('inconvenience-request-list', 'inconvenience-request-line-list', 'inconvenience-request-line-own'):
+                for user in self.users():
+                    with self.subTest(name=name, user=user.email, trusted=trusted), self.settings(TOKEN_CLAIMS_TRUSTED=trusted):
+                        sync_response = await sync_to_async(self.sync_get)(reverse(name), user)
+                        async_response = await self.async_get(reverse(f'async-{name}'), user)
+                        self.assertEqual((sync_response.status_code, async_response.status_code), (200, 200))
+                        self.assertEqual(self.by_id(async_response.json()), self.by_id(sync_response.json()))
+
+    async def test_summary_matches_the_sync_endpoint(self):
+        sync_response = await sync_to_async(self.sync_get)(reverse('inconvenience-request-list'), self.hr, summary='true')
+        async_response = await self.async_get(reverse('async-inconvenience-request-list'), self.hr, summary='true')
+        self.assertNotIn('lines', async_response.json()[0])
+        self.assertEqual(self.by_id(async_response.json()), self.by_id(sync_response.json()))
+
+    async def test_pages_follow_the_cursor(self):
+        everything = (await self.async_get(reverse('async-inconvenience-request-line-list'), self.hr)).json()
+        page = (await self.async_get(reverse('async-inconvenience-request-line-list'), self.hr, page_size=5)).json()
+        ids = [row['id'] for row in page['results']]
+        while page['next']:
+            page = (await self.async_get(page['next'], self.hr)).json()
+            self.assertLessEqual(len(page['results']), 5)
+            ids.extend(row['id'] for row in page['results'])
+        self.assertEqual(ids, sorted((row['id'] for row in everything), reverse=True))
+
+        response = await self.async_get(reverse('async-inconvenience-request-line-list'), self.hr, cursor='abc')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail_matches_the_sync_endpoint(self):
+        for inconvenience_request in (self.requests[0], self.draft):
+            for user in self.users():
+                with self.subTest(request=inconvenience_request.title, user=user.email):
+                    args = [inconvenience_request.pk]
+                    sync_response = await sync_to_async(self.sync_get)(reverse('inconvenience-request-detail', args=args), user)
+                    async_response = await self.async_get(reverse('async-inconvenience-request-detail', args=args), user)
+                    self.assertEqual(async_response.status_code, sync_response.status_code)
+                    if sync_response.status_code == 200:
+                        self.assertEqual(async_response.json(), sync_response.json())
+        response = await self.async_get(reverse('async-inconvenience-request-detail', args=[999999]), self.hr)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_days_match_the_sync_endpoint(self):
+        sync_response = await sync_to_async(self.sync_get)(reverse('day-list'), self.hr, category='weekend')
+        async_response = await self.async_get(reverse('async-day-list'), self.hr, category='weekend')
+        self.assertEqual(len(async_response.json()), 6)
+        self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_requests_without_a_valid_token_are_refused(self):
+        response = await AsyncClient().get(reverse('async-inconvenience-request-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['status_code'], 401)
+        response = await AsyncClient().get(
+            reverse('async-inconvenience-request-list'), headers={'Authorization': 'Bearer not-a-token'},
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class PaginationSettingTests(TestCase):
+
+    def setUp(self):
+        _, self.hr, _ = create_fixture()
+        self.client = APIClient()
+        self.client.force_authenticate(self.hr)
+
+    @override_settings(API_PAGE_SIZE=None, INCONVENIENCE_ALLOWANCE_PAGE_SIZE=2)
+    def test_old_page_size_setting_is_still_read(self):
+        response = self.client.get(reverse('inconvenience-request-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+    @override_settings(API_PAGE_SIZE=1, INCONVENIENCE_ALLOWANCE_PAGE_SIZE=2)
+    def test_new_page_size_setting_wins(self):
+        response = self.client.get(reverse('inconvenience-request-list'))
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class AllowanceReportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # 3 requests of 4 lines, each line two weekends at 3500
+        create_fixture()
+        self.lines = InconvenienceRequestLine.objects.all()
+
+    def test_category_amounts_add_up_to_the_stored_amounts(self):
+        rates = {'weekend': [('2000-01-01', 5000)], 'public_holiday': [('2000-01-01', 15000)]}
+        with override_settings(INCONVENIENCE_ALLOWANCE_RATES=rates):
+            by_category = allowance_report(self.lines, ['category'])
+            by_department = allowance_report(self.lines, ['department'])
+        self.assertEqual(by_department['totals']['amount'], 84000)
+        self.assertEqual(by_category['totals']['amount'], 84000)
+        self.assertEqual(by_category['results'][0]['amount'], 84000)
+
+    def test_date_range_selects_lines_by_their_days(self):
+        # The second request's lines are booked on 2024-01-20 and 2024-01-27
+        report = allowance_report(self.lines, ['status'], start=date(2024, 1, 20), end=date(2024, 1, 27))
+        self.assertEqual(report['results'][0]['lines'], 4)
+        self.assertEqual(report['totals']['amount'], 28000)
+
+        report = allowance_report(self.lines, ['category'], start=date(2024, 1, 27), end=date(2024, 1, 27))
+        self.assertEqual(report['results'][0]['lines'], 4)
+        self.assertEqual(report['totals']['no_of_days'], 8)
+
+    def test_months_are_those_of_the_booked_days(self):
+        # Requests are raised today but booked on the weekends of January and February 2024
+        report = allowance_report(self.lines, ['month'])
+        self.assertEqual(
+            [(row['month'], row['lines'], row['no_of_days'], row['amount']) for row in report['results']],
+            [(date(2024, 1, 1), 8, 16, 56000), (date(2024, 2, 1), 4, 8, 28000)],
+        )
+        self.assertEqual(report['totals']['amount'], 84000)
+
+        # A line split across months counts its days (and amount) in each
+        line = self.lines.filter(inconvenience_request=self.lines[0].inconvenience_request)[0]
+        day_calendar.invalidate()
+        self.addCleanup(day_calendar.invalidate)
+        line.days.add(Day.objects.create(date=date(2024, 2, 24), category='weekend'))
+        line.refresh_from_db()
+        report = allowance_report(self.lines.filter(pk=line.pk), ['month'])
+        self.assertEqual([row['no_of_days'] for row in report['results']], [2, 1])
+        self.assertEqual(sum(row['amount'] for row in report['results']), line.amount)
+
+        # Filtering and grouping look at the same dates
+        report = allowance_report(self.lines, ['month', 'status'], start=date(2024, 2, 1), end=date(2024, 2, 29))
+        self.assertEqual(
+            [(row['month'], row['lines']) for row in report['results']], [(date(2024, 1, 1), 1), (date(2024, 2, 1), 5)],
+        )
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        _, self.hr, _ = create_fixture()
+        self.client = APIClient()
+
+    def test_serialization_is_timed_without_patching_serializers(self):
+        self.client.force_authenticate(self.hr)
+        response = self.client.get(reverse('inconvenience-request-list'))
+        serializer_ms = re.search(r'serializer;dur=([\d.]+)', response['Server-Timing']).group(1)
+        self.assertGreater(float(serializer_ms), 0)
+        self.assertIs(serializers.BaseSerializer.data, serializers.BaseSerializer.__dict__['data'])
+        self.assertFalse(hasattr(serializers.BaseSerializer.data.fget, '_metrics_wrapped'))
+
+    def test_request_lines_are_not_logged_by_default(self):
+        self.assertFalse(logging.getLogger('egbin_ssp.requests').isEnabledFor(logging.INFO))
+
+    def logged_queries(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())['db_queries']
+
+    def test_sql_run_while_streaming_is_counted(self):
+        self.client.force_authenticate(self.hr)
+        with self.assertLogs('egbin_ssp.requests', 'INFO') as logs:
+            response = self.client.get(reverse('inconvenience-request-list'), {'stream': 'true'})
+            before_stream = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+            self.assertEqual(logs.records, [])
+            with CaptureQueriesContext(connection) as streamed:
+                self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 3)
+        self.assertGreater(len(streamed), 0)
+        self.assertEqual(self.logged_queries(logs), before_stream + len(streamed))
+
+    async def test_sql_run_while_streaming_is_counted_under_asgi(self):
+        token = str((await sync_to_async(issue_refresh_token)(self.hr)).access_token)
+        with self.assertLogs('egbin_ssp.requests', 'INFO') as logs:
+            response = await AsyncClient().get(
+                reverse('inconvenience-request-list'), {'stream': 'true'}, headers={'Authorization': f'Bearer {token}'},
+            )
+            before_stream = int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+            self.assertEqual(logs.records, [])
+            content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(content)), 3)
+        self.assertGreater(self.logged_queries(logs), before_stream)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN=None)
+    def test_metrics_are_denied_without_a_token_in_production(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN=None)
+    def test_metrics_are_open_under_debug_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='secret')
+    def test_metrics_require_the_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds', response.content.decode())
+
+
+class RecordingBackend:
+    """Notification backend that keeps digests, and whether a transaction was open while sending."""
+
+    def __init__(self, fail_for=()):
+        self.fail_for = set(fail_for)
+        self.digests = []
+        self.in_transaction = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send(self, digest):
+        self.in_transaction.append(connection.in_atomic_block)
+        if digest.recipient in self.fail_for:
+            raise OSError('mailbox unavailable')
+        self.digests.append(digest)
+
+
+class UnreachableBackend(RecordingBackend):
+    def __enter__(self):
+        raise ConnectionRefusedError('SMTP server unreachable')
+
+
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        self.rep, self.hr, self.requests = create_fixture()
+        enqueue(self.requests, 'completed')
+        enqueue(self.requests[:1], 'manager_approved')
+
+    def test_one_digest_per_recipient_through_django_mail(self):
+        self.assertEqual(send_batch(), (4, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['hr@example.com', 'rep@example.com'])
+        digest = next(message for message in mail.outbox if message.to == ['rep@example.com'])
+        self.assertEqual(digest.subject, '3 updates on inconvenience requests')
+        self.assertEqual(set(Notification.objects.values_list('status', flat=True)), {'sent'})
+        self.assertEqual(send_batch(), (0, 0))
+
+    def test_file_backend_writes_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'notifications.jsonl')
+            with override_settings(NOTIFICATION_BACKEND='inconvenience_allowance.notifications.FileBackend', NOTIFICATION_FILE_PATH=path):
+                self.assertEqual(send_batch(), (4, 0))
+            with open(path, encoding='utf-8') as file:
+                digests = [json.loads(line) for line in file]
+        self.assertEqual(sorted(digest['recipient'] for digest in digests), ['hr@example.com', 'rep@example.com'])
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_failed_digests_are_retried_then_marked_failed(self):
+        backend = RecordingBackend(fail_for={'rep@example.com'})
+        self.assertEqual(send_batch(backend=backend), (1, 3))
+        failed = Notification.objects.filter(recipient=self.rep)
+        self.assertEqual({(row.status, row.attempts) for row in failed}, {('pending', 1)})
+        self.assertIn('mailbox unavailable', failed[0].last_error)
+
+        failed.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_batch(backend=backend), (0, 3))
+        self.assertEqual({(row.status, row.attempts) for row in failed}, {('failed', 2)})
+
+    def test_unreachable_backend_releases_the_batch(self):
+        with self.assertRaises(ConnectionRefusedError):
+            send_batch(backend=UnreachableBackend())
+        self.assertEqual(set(Notification.objects.values_list('status', 'attempts')), {('pending', 0)})
+        self.assertEqual(send_batch(backend=RecordingBackend()), (4, 0))
+
+    def test_claimed_notifications_are_not_claimed_again(self):
+        claimed = claim_batch()
+        self.assertEqual(len(claimed), 4)
+        self.assertEqual(claim_batch(), [])
+        # Once the claim expires, e.g. because the worker died, the rows are due again
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(claim_batch()), 4)
+
+
+class NotificationTransactionTests(TransactionTestCase):
+
+    def test_delivery_runs_outside_any_transaction(self):
+        _, _, requests = create_fixture()
+        enqueue(requests, 'completed')
+        backend = RecordingBackend()
+        self.assertEqual(send_batch(backend=backend), (3, 0))
+        self.assertEqual(backend.in_transaction, [False])
+
+
+class StreamingResponseTests(SimpleTestCase):
+
+    def chunks(self):
+        for index in range(250):
+            yield f'{index},'
+
+    def test_streams_a_sync_iterator_under_wsgi(self):
+        response = streaming_response(RequestFactory().get('/'), self.chunks())
+        self.assertFalse(response.is_async)
+        self.assertEqual(b''.join(response), ''.join(self.chunks()).encode())
+
+    async def test_streams_an_async_iterator_under_asgi(self):
+        response = streaming_response(AsyncRequestFactory().get('/'), self.chunks())
+        # Django would otherwise read the whole sync iterator before sending
+        self.assertTrue(response.is_async)
+        parts = [part async for part in response]
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(b''.join(parts), ''.join(self.chunks()).encode())
+
+
+class LineDayTests(TestCase):
+    def setUp(self):
+        self.rep, self.hr, (self.request,) = create_fixture(requests=1, lines_per_request=2, status='draft')
+        self.first, self.second = self.request.lines.order_by('pk')
+        self.saturday = Day.objects.create(date=date(2024, 6, 1), category='weekend')
+        self.holiday = Day.objects.create(date=date(2024, 12, 25), category='public_holiday')
+
+    def test_days_add_copies_the_line_employee(self):
+        self.first.days.add(self.saturday, self.holiday)
+        bookings = InconvenienceRequestLineDay.objects.filter(line=self.first)
+        self.assertEqual(set(bookings.values_list('employee_id', flat=True)), {self.first.employee_id})
+        # Repriced by the m2m_changed handler
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.no_of_weekend, self.first.no_of_ph, self.first.no_of_days), (3, 1, 4))
+
+    def test_reverse_add_copies_the_line_employee(self):
+        self.saturday.inconvenience_request_lines.add(self.first, self.second)
+        self.assertEqual(
+            set(self.saturday.bookings.values_list('line_id', 'employee_id')),
+            {(self.first.pk, self.first.employee_id), (self.second.pk, self.second.employee_id)},
+        )
+
+    def test_reverse_changes_reprice_the_lines(self):
+        self.saturday.inconvenience_request_lines.add(self.first, self.second)
+        self.holiday.inconvenience_request_lines.add(self.first)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.no_of_weekend, self.first.no_of_ph, self.first.amount), (3, 1, 3 * 3500 + 15000))
+        self.assertEqual((self.second.no_of_weekend, self.second.amount), (3, 3 * 3500))
+        self.request.refresh_from_db()
+        self.assertEqual((self.request.total_weekend_days, self.request.total_ph_days), (6, 1))
+
+        self.holiday.inconvenience_request_lines.remove(self.first)
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.no_of_ph, self.first.amount), (0, 3 * 3500))
+
+        self.saturday.inconvenience_request_lines.clear()
+        self.request.refresh_from_db()
+        self.assertEqual(
+            (self.request.total_weekend_days, self.request.total_ph_days, self.request.total_amount), (4, 0, 4 * 3500),
+        )
+        self.assertEqual(
+            list(self.request.lines.order_by('pk').values_list('no_of_weekend', flat=True)), [2, 2],
+        )
+
+    def test_days_add_refuses_a_double_booking(self):
+        self.first.days.add(self.saturday)
+        other = InconvenienceRequestLine.objects.create(
+            inconvenience_request=self.request, employee=self.first.employee, job_description='Shutdown',
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            other.days.add(self.saturday)
+
+    def test_date_moves_between_lines_of_one_employee(self):
+        employee = self.first.employee
+        other = InconvenienceRequestLine.objects.create(
+            inconvenience_request=self.request, employee=employee, job_description='Shutdown',
+        )
+        self.first.days.add(self.saturday)
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.rep.pk))
+        response = client.post(
+            reverse('inconvenience-request-line-detail', args=[self.request.pk]),
+            [{'id': self.first.pk, 'employee': employee.pk, 'dates': []},
+             {'id': other.pk, 'employee': employee.pk, 'dates': ['2024-06-01']}],
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(list(self.saturday.bookings.values_list('line_id', flat=True)), [other.pk])
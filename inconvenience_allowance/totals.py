@@ -0,0 +1,124 @@
+"""Totals over a request's lines, stored on the request itself.
+
+InconvenienceRequest carries total_amount, line_count, total_weekend_days,
+total_ph_days and employee_count, so lists and summaries never read the
+lines. Every path that writes lines records what each line added to its
+request before and after the write in a TotalsChange. apply() then adds the
+difference with one UPDATE of F() expressions per request, so concurrent
+writers to the same request don't overwrite each other. The UPDATE also
+bumps updated_at, which versions the request for conditional GETs.
+
+employee_count counts distinct employees, which a difference cannot keep,
+so it is recounted with a subquery in the same UPDATE whenever a line is
+added or removed or changes employee or request.
+
+The paths are InconvenienceRequestLine save, delete and reprice(), the days
+m2m_changed handler (signals.py), the bulk line serializer and
+`manage.py recalculate_allowances`. Anything else that writes lines with
+update() or raw SQL must call recompute(). `manage.py repair_request_totals`
+recomputes every request.
+"""
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def line_totals(line):
+    """(request id, employee id, amount, weekend days, public holidays) that `line` adds."""
+    return (
+        line.inconvenience_request_id, line.employee_id, line.amount or 0, line.no_of_weekend or 0, line.no_of_ph or 0,
+    )
+
+
+def _aggregate(expression, output_field):
+    from .models import InconvenienceRequestLine
+    lines = (
+        InconvenienceRequestLine.objects.filter(inconvenience_request=OuterRef('pk'))
+        .order_by().values('inconvenience_request').annotate(value=expression).values('value')
+    )
+    return Coalesce(Subquery(lines, output_field=output_field), Value(0), output_field=output_field)
+
+
+def employee_count():
+    return _aggregate(Count('employee', distinct=True), IntegerField())
+
+
+def computed_totals():
+    """The totals of each request as subqueries over its lines."""
+    return {
+        'total_amount': _aggregate(Sum('amount'), FloatField()),
+        'line_count': _aggregate(Count('pk'), IntegerField()),
+        'total_weekend_days': _aggregate(Sum('no_of_weekend'), IntegerField()),
+        'total_ph_days': _aggregate(Sum('no_of_ph'), IntegerField()),
+        'employee_count': employee_count(),
+    }
+
+
+def recompute(request_ids=None):
+    """Recompute the totals of `request_ids` (every request if None) from their lines in one UPDATE."""
+    from .models import InconvenienceRequest
+    requests = InconvenienceRequest.objects.all()
+    if request_ids is not None:
+        requests = requests.filter(pk__in=request_ids)
+    return requests.update(updated_at=timezone.now(), **computed_totals())
+
+
+class TotalsChange:
+    """Differences to the totals of the requests whose lines are being written."""
+
+    FIELDS = ('total_amount', 'line_count', 'total_weekend_days', 'total_ph_days')
+
+    def __init__(self):
+        self.deltas = {}
+        self.recount = set()
+        self.unknown = set()
+
+    def _add(self, totals, sign):
+        request_id, _, amount, weekend, ph = totals
+        delta = self.deltas.setdefault(request_id, [0, 0, 0, 0])
+        for index, value in enumerate((amount, 1, weekend, ph)):
+            delta[index] += sign * value
+
+    def saved(self, line, created=False):
+        """Count `line` as written; its previous totals are the ones it was loaded or last saved with."""
+        before = None if created else getattr(line, 'stored_totals', None)
+        after = line_totals(line)
+        if before is None and not created:
+            # Loaded without the fields it adds (only()/defer()), so what it
+            # added before is unknown
+            self.unknown.add(after[0])
+        else:
+            if before is not None:
+                self._add(before, -1)
+            self._add(after, 1)
+            if before is None or before[:2] != after[:2]:
+                self.recount.update({after[0], before[0]} if before else {after[0]})
+        line.stored_totals = after
+
+    def deleted(self, line):
+        before = getattr(line, 'stored_totals', None)
+        if before is None:
+            self.unknown.add(line.inconvenience_request_id)
+            return
+        self._add(before, -1)
+        self.recount.add(before[0])
+
+    def apply(self):
+        from .models import InconvenienceRequest
+        now = timezone.now()
+        unchanged = []
+        for request_id, delta in self.deltas.items():
+            if request_id in self.unknown:
+                continue
+            values = {field: F(field) + value for field, value in zip(self.FIELDS, delta) if value}
+            if request_id in self.recount:
+                values['employee_count'] = employee_count()
+            if values:
+                InconvenienceRequest.objects.filter(pk=request_id).update(updated_at=now, **values)
+            else:
+                unchanged.append(request_id)
+        # Lines rewritten without changing any total still change the request
+        if unchanged:
+            InconvenienceRequest.touch(unchanged)
+        if self.unknown:
+            recompute(self.unknown)
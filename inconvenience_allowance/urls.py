@@ -6,7 +6,10 @@ from .views import (
     InconvenienceRequestLineDetailView,
     InconvenienceRequestLineOwnView,
     TransitionStatusView,
-    DayViewSet
+    BulkTransitionStatusView,
+    DayViewSet,
+    AllowanceReportView,
+    PayrollExportView,
 )
 from rest_framework.routers import DefaultRouter
 
@@ -18,9 +21,12 @@ router.register(r'days', DayViewSet)
 urlpatterns = [
     path('inconvenience-requests/', InconvenienceRequestView.as_view(), name='inconvenience-request-list'),
     path('inconvenience-requests/<int:pk>/', InconvenienceRequestDetailView.as_view(), name='inconvenience-request-detail'),
+    path('inconvenience-requests/transition-status/bulk/', BulkTransitionStatusView.as_view(), name='inconvenience-request-bulk-transition-status'),
     path('inconvenience-requests/<int:pk>/transition-status/', TransitionStatusView.as_view(), name='inconvenience-request-transition-status'),    path('inconvenience-request-lines/', InconvenienceRequestLineView.as_view(), name='inconvenience-request-line-list'),
     path('inconvenience-request-lines/', InconvenienceRequestLineView.as_view(), name='inconvenience-request-line-list'),
     path('inconvenience-request-lines/<int:pk>/', InconvenienceRequestLineDetailView.as_view(), name='inconvenience-request-line-detail'),
     path('inconvenience-request-lines/own/', InconvenienceRequestLineOwnView.as_view(), name='inconvenience-request-line-own'),
+    path('reports/allowances/', AllowanceReportView.as_view(), name='allowance-report'),
+    path('exports/payroll/', PayrollExportView.as_view(), name='payroll-export'),
 
 ]
\ No newline at end of file
@@ -1,13 +1,84 @@
 from rest_framework import status, viewsets, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from .models import InconvenienceRequest, InconvenienceRequestLine, Day
-from .serializers import InconvenienceRequestSerializer,InconvenienceRequestLineSerializer, DaySerializer, TransitionSerializer, ErrorResponseSerializer, BulkInconvenienceRequestLineSerializer
+from .serializers import InconvenienceRequestSerializer,InconvenienceRequestLineSerializer, DaySerializer, TransitionSerializer, ErrorResponseSerializer, BulkInconvenienceRequestLineSerializer, DayBulkGenerateSerializer, DayBulkGenerateResultSerializer, BulkTransitionSerializer, BulkTransitionResultSerializer, AllowanceReportQuerySerializer, AllowanceReportSerializer, PayrollExportQuerySerializer, InconvenienceRequestSummarySerializer
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema
+from django.db.models import prefetch_related_objects
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from django.http import Http404
+from datetime import date
 from rest_framework.exceptions import PermissionDenied
 from egbin_ssp.exceptions import SerializerValidationException
+from egbin_ssp.metrics import serialized
+from egbin_ssp.pagination import IdCursorPagination
+from egbin_ssp.conditional import conditional_response, list_version, make_etag
+from .streaming import stream_json_list
+from .day_calendar import day_calendar, generate_days
+from .access import check_request_access, lines_visible_to, own_lines, requests_visible_to
+from .reports import allowance_report
+from .exports import csv_response, payroll_lines, payroll_rows, xlsx_response
+from .workflow import FOLLOW_ON, bulk_transition, permitted_transitions
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
+
+
+LIST_PARAMETERS = [
+    OpenApiParameter('cursor', str, description="Cursor from the previous page's `next`/`previous` link."),
+    OpenApiParameter('page_size', int, description="Number of results per page (max 500)."),
+    OpenApiParameter('stream', bool, description="Stream every result as one JSON array instead of paginating."),
+]
+
+SUMMARY_PARAMETER = OpenApiParameter(
+    'summary', bool, description="Return each request with its stored totals instead of its lines."
+)
+
+
+def request_list_serializer(params):
+    # Summaries read only the request rows; the totals are stored on them
+    if params.get('summary') in ('1', 'true'):
+        return InconvenienceRequestSummarySerializer
+    return InconvenienceRequestSerializer
+
+
+def day_range_filters(params):
+    """(start, end, categories) for day_calendar.range() from the start/end/category parameters."""
+    try:
+        start = params.get('start')
+        end = params.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise SerializerValidationException("start and end must be dates in YYYY-MM-DD format")
+    category = params.get('category')
+    return start, end, [category] if category else None
+
+
+class PaginatedListMixin:
+    pagination_class = IdCursorPagination
+    stream_chunk_size = 500
+    # Versions the list for conditional GETs (see egbin_ssp/conditional.py)
+    version_field = 'updated_at'
+
+    def list_response(self, request, queryset, serializer_class):
+        etag = make_etag(request, *list_version(queryset, self.version_field))
+        return conditional_response(request, lambda: self.build_list_response(request, queryset, serializer_class), etag)
+
+    def build_list_response(self, request, queryset, serializer_class):
+        queryset = serializer_class.setup_eager_loading(queryset)
+        if request.query_params.get('stream') in ('1', 'true'):
+            return stream_json_list(request, queryset.order_by('-id'), serializer_class, self.stream_chunk_size)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        if page is None:
+            serializer = serializer_class(queryset, many=True)
+            return Response(serialized(serializer))
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serialized(serializer))
+
 
 @extend_schema(tags=['Days'])
 class DayViewSet(viewsets.ModelViewSet):
@@ -17,11 +88,21 @@ class DayViewSet(viewsets.ModelViewSet):
     @extend_schema(
         operation_id="list_days",
         summary="Retrieve a list of days",
-        description="Fetch all day records in the system.",
+        description="Fetch all day records in the system, optionally limited to a date range and category.",
+        parameters=[
+            OpenApiParameter('start', OpenApiTypes.DATE, description="Only days on or after this date."),
+            OpenApiParameter('end', OpenApiTypes.DATE, description="Only days on or before this date."),
+            OpenApiParameter('category', str, enum=[choice for choice, _ in Day.CATEGORIES], description="Only days of this category."),
+        ],
         responses={200: DaySerializer(many=True), 400:ErrorResponseSerializer},
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        # Served from the in-memory calendar instead of the database
+        days = day_calendar.range(*day_range_filters(request.query_params))
+        return conditional_response(
+            request, lambda: Response(serialized(self.get_serializer(days, many=True))),
+            make_etag(request, day_calendar.fingerprint()),
+        )
 
     @extend_schema(
         operation_id="create_day",
@@ -40,7 +121,16 @@ class DayViewSet(viewsets.ModelViewSet):
         responses={200: DaySerializer,400:ErrorResponseSerializer},
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        try:
+            day = day_calendar.get_by_id(int(kwargs['pk']))
+        except ValueError:
+            day = None
+        if day is None:
+            raise Http404
+        return conditional_response(
+            request, lambda: Response(serialized(self.get_serializer(day))),
+            make_etag(request, day_calendar.fingerprint()),
+        )
 
 
     @extend_schema(
@@ -51,11 +141,27 @@ class DayViewSet(viewsets.ModelViewSet):
     )
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
-    
+
+    @extend_schema(
+        operation_id="bulk_generate_days",
+        summary="Generate weekends and public holidays",
+        description="Create every weekend in a year or date range, plus the given public holidays, in one call. Dates that already exist are skipped.",
+        request=DayBulkGenerateSerializer,
+        responses={201: DayBulkGenerateResultSerializer, 400:ErrorResponseSerializer},
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        serializer = DayBulkGenerateSerializer(data=request.data)
+        if not serializer.is_valid():
+            raise SerializerValidationException(serializer.errors,code=400)
+        data = serializer.validated_data
+        inserted, skipped = generate_days(data['start'], data['end'], data['public_holidays'])
+        return Response({'inserted': inserted, 'skipped': skipped}, status=status.HTTP_201_CREATED)
+
 
 
 @extend_schema(tags=['Inconvenience Request'])
-class InconvenienceRequestView(APIView):
+class InconvenienceRequestView(PaginatedListMixin, APIView):
     permission_classes = [IsAuthenticated]
     @extend_schema(
         operation_id="create_request",
@@ -65,14 +171,14 @@ class InconvenienceRequestView(APIView):
         responses={201: InconvenienceRequestSerializer,400:ErrorResponseSerializer},
     )
     def post(self, request):
-        if not request.user.groups.filter(name='Department Representatives').exists():
+        if not request.user.has_role(DEPARTMENT_REP):
             raise SerializerValidationException("Not Permitted",code=403)
         
         data = request.data
         serializer = InconvenienceRequestSerializer(data=data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serialized(serializer), status=status.HTTP_201_CREATED)
         else:
             raise SerializerValidationException(serializer.errors,code=400)
     
@@ -81,26 +187,15 @@ class InconvenienceRequestView(APIView):
         operation_id="List Inconvenience Request",
         summary="List Inconvenience Request",
         description="List all Inconvenience Requests",
+        parameters=LIST_PARAMETERS + [SUMMARY_PARAMETER],
         responses={
             200: InconvenienceRequestSerializer(many=True),
             400: ErrorResponseSerializer,
         }
     )
     def get(self, request):
-        if request.user.groups.filter(name='Department Representatives').exists():
-            inconvenience_requests = InconvenienceRequest.objects.filter(department=request.user.department)
-        elif request.user.groups.filter(name='HR').exists():
-            # HR can view all records
-            inconvenience_requests = InconvenienceRequest.objects.all().exclude(status='draft')
-        elif request.user.groups.filter(name='Line Managers').exists() or \
-             request.user.groups.filter(name='Employees').exists():
-            # Other roles can view only their department records
-            inconvenience_requests = InconvenienceRequest.objects.filter(department=request.user.department).exclude(status='draft')
-        else:
-            raise SerializerValidationException("Not Permitted",code=403)
-        
-        serializer = InconvenienceRequestSerializer(inconvenience_requests, many=True)
-        return Response(serializer.data)
+        inconvenience_requests = requests_visible_to(request.user)
+        return self.list_response(request, inconvenience_requests, request_list_serializer(request.query_params))
 
 
 
@@ -117,31 +212,17 @@ class InconvenienceRequestDetailView(APIView):
         }
     )
     def get(self, request, pk):
-        inconvenience_request = get_object_or_404(InconvenienceRequest, pk=pk)
-        if request.user.groups.filter(name='HR').exists():
-            # HR can view all requests
-            if inconvenience_request.status == 'draft':
-                raise PermissionDenied("Not permitted to access this request.")
-            serializer = InconvenienceRequestSerializer(inconvenience_request)
-
-        elif request.user.groups.filter(name='Line Managers').exists():
-            # Department Reps and Line Managers can view requests for their department
-            if inconvenience_request.department != request.user.department or inconvenience_request.status == 'draft':
-                raise PermissionDenied("Not permitted to access this request.")
-            serializer = InconvenienceRequestSerializer(inconvenience_request)
-
-        elif request.user.groups.filter(name='Department Representatives').exists():
-            # Department Reps and Line Managers can view requests for their department
-            if inconvenience_request.department != request.user.department:
-                raise PermissionDenied("Not permitted to access this request.")
-            serializer = InconvenienceRequestSerializer(inconvenience_request)
-            
-        else:
-            # Employees can view their own requests if they belong to the same department
-            if inconvenience_request.department != request.user.department or inconvenience_request.status=="draft":
-                raise PermissionDenied("Not permitted to access this request.")
-            serializer = InconvenienceRequestSerializer(inconvenience_request)
-        return Response(serializer.data)
+        inconvenience_request = get_object_or_404(
+            InconvenienceRequest.objects.select_related('department', 'department_rep'), pk=pk
+        )
+        check_request_access(request.user, inconvenience_request)
+
+        def build():
+            # Lines are only loaded when the client's copy is out of date
+            prefetch_related_objects([inconvenience_request], InconvenienceRequestSerializer.lines_prefetch())
+            return Response(serialized(InconvenienceRequestSerializer(inconvenience_request)))
+        updated_at = inconvenience_request.updated_at
+        return conditional_response(request, build, make_etag(request, updated_at), updated_at)
 
 
     @extend_schema(
@@ -157,24 +238,26 @@ class InconvenienceRequestDetailView(APIView):
     def put(self, request, pk=None):
         if not pk:
             raise SerializerValidationException("ID is required for updating")
-        inconvenience_request = get_object_or_404(InconvenienceRequest, pk=pk)
+        inconvenience_request = get_object_or_404(
+            InconvenienceRequestSerializer.setup_eager_loading(InconvenienceRequest.objects.all()), pk=pk
+        )
         # Check permissions
         user = request.user
-        if not (user.groups.filter(name='Department Representatives').exists() or 
-                user.groups.filter(name='Line Managers').exists() or 
-                user.groups.filter(name='HR').exists()):
+        if not (user.has_role(DEPARTMENT_REP) or 
+                user.has_role(LINE_MANAGER) or 
+                user.has_role(HR)):
             raise PermissionDenied("Not permitted to update records.")
         
         # Check if user is authorized to update this record
-        if not (user.groups.filter(name='HR').exists() or 
-                (user.groups.filter(name='Department Representatives').exists() and 
-                inconvenience_request.department == user.department) or 
-                (user.groups.filter(name='Line Managers').exists() and 
-                inconvenience_request.department == user.department)):
+        if not (user.has_role(HR) or 
+                (user.has_role(DEPARTMENT_REP) and 
+                inconvenience_request.department_id == user.department_id) or 
+                (user.has_role(LINE_MANAGER) and 
+                inconvenience_request.department_id == user.department_id)):
             raise PermissionDenied("Not permitted to update this request.")
         
         #ensure only department rep can edit request when in draft state
-        if not user.groups.filter(name='Department Representatives') and inconvenience_request.status == 'draft':
+        if not user.has_role(DEPARTMENT_REP) and inconvenience_request.status == 'draft':
             raise PermissionDenied("Not permitted to update this request.")
         
         # Serialize the data
@@ -182,7 +265,7 @@ class InconvenienceRequestDetailView(APIView):
         
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serialized(serializer))
         raise SerializerValidationException(serializer.errors,code=400)
 
 
@@ -201,20 +284,20 @@ class InconvenienceRequestDetailView(APIView):
         
         inconvenience_request = get_object_or_404(InconvenienceRequest, pk=pk)
         user = request.user
-        if not (user.groups.filter(name='Department Representatives').exists() or 
-                user.groups.filter(name='Line Managers').exists() or 
-                user.groups.filter(name='HR').exists()):
+        if not (user.has_role(DEPARTMENT_REP) or 
+                user.has_role(LINE_MANAGER) or 
+                user.has_role(HR)):
             raise PermissionDenied("Not permitted to delete records.")
         
-        if not (user.groups.filter(name='HR').exists() or 
-                (user.groups.filter(name='Department Representatives').exists() and 
-                inconvenience_request.department == user.department) or 
-                (user.groups.filter(name='Line Managers').exists() and 
-                inconvenience_request.department == user.department)):
+        if not (user.has_role(HR) or 
+                (user.has_role(DEPARTMENT_REP) and 
+                inconvenience_request.department_id == user.department_id) or 
+                (user.has_role(LINE_MANAGER) and 
+                inconvenience_request.department_id == user.department_id)):
             raise PermissionDenied("Not permitted to delete this request.")
 
         #ensure only department rep can delete request when in draft state
-        if not user.groups.filter(name='Department Representatives') and inconvenience_request.status == 'draft':
+        if not user.has_role(DEPARTMENT_REP) and inconvenience_request.status == 'draft':
             raise PermissionDenied("Not permitted to delete this request.")
 
         inconvenience_request.delete()
@@ -224,42 +307,22 @@ class InconvenienceRequestDetailView(APIView):
 
 
 @extend_schema(tags=['Inconvenience Request Lines'])
-class InconvenienceRequestLineView(APIView):
+class InconvenienceRequestLineView(PaginatedListMixin, APIView):
     permission_classes = [IsAuthenticated]
+    version_field = 'inconvenience_request__updated_at'
     @extend_schema(
         operation_id="List_Inconvenience_Request_Line",
         summary="List Inconvenience Request Line",
         description="List all Inconvenience Request Lines",
+        parameters=LIST_PARAMETERS,
         responses={
             200: InconvenienceRequestLineSerializer(many=True),
             400: ErrorResponseSerializer
         }
     )
     def get(self, request):
-        user = request.user
-        # Check for HR role
-        if user.groups.filter(name='HR').exists():
-            # HR can view all request lines
-            inconvenience_request_lines = InconvenienceRequestLine.objects.all().exclude(inconvenience_request__status='draft')
-        # Check for Line Managers roles
-        elif user.groups.filter(name='Line Managers').exists():
-            # Filter request lines by department
-            inconvenience_request_lines = InconvenienceRequestLine.objects.filter(inconvenience_request__department=user.department).exclude(inconvenience_request__status="draft")
-        # Check for Department Manager roles
-        elif user.groups.filter(name='Department Representatives').exists():
-            # Filter request lines by department
-            inconvenience_request_lines = InconvenienceRequestLine.objects.filter(inconvenience_request__department=user.department)
-        # Check for Employee role
-        elif user.groups.filter(name='Employees').exists():
-            # Filter request lines by department
-            inconvenience_request_lines = InconvenienceRequestLine.objects.filter(inconvenience_request__department=user.department).exclude(inconvenience_request__status="draft")
-        
-        else:
-            # If user role is not valid, return Forbidden response
-            raise SerializerValidationException("Not permitted to view request lines.",code=403)
-        
-        serializer = InconvenienceRequestLineSerializer(inconvenience_request_lines, many=True)
-        return Response(serializer.data)
+        inconvenience_request_lines = lines_visible_to(request.user)
+        return self.list_response(request, inconvenience_request_lines, InconvenienceRequestLineSerializer)
 
 
 
@@ -291,22 +354,22 @@ class InconvenienceRequestLineDetailView(APIView):
 
         # Permission check
         user = request.user
-        if not (user.groups.filter(name='Department Representatives').exists() or 
-                user.groups.filter(name='Line Managers').exists() or 
-                user.groups.filter(name='HR').exists()):
+        if not (user.has_role(DEPARTMENT_REP) or 
+                user.has_role(LINE_MANAGER) or 
+                user.has_role(HR)):
             raise SerializerValidationException("Not permitted to create request lines.",code=403)
         
         # Ensure the user is authorized to create a request line for this inconvenience request
-        if not (user.groups.filter(name='HR').exists() or 
-                (user.groups.filter(name='Department Representatives').exists() and 
-                inconvenience_request.department == user.department) or 
-                (user.groups.filter(name='Line Managers').exists() and 
-                inconvenience_request.department == user.department)):
+        if not (user.has_role(HR) or 
+                (user.has_role(DEPARTMENT_REP) and 
+                inconvenience_request.department_id == user.department_id) or 
+                (user.has_role(LINE_MANAGER) and 
+                inconvenience_request.department_id == user.department_id)):
             raise SerializerValidationException("Not permitted to create a request line for this request.",code=403)
         
         
         #ensure that only department rep can create inconvenience line when the request is in draft stage
-        if not user.groups.filter(name="Department Representatives").exists() and inconvenience_request.status == "draft":
+        if not user.has_role(DEPARTMENT_REP) and inconvenience_request.status == "draft":
             raise SerializerValidationException("Not permitted to create a request line for this request.",code=403)
         
         data = request.data
@@ -316,7 +379,7 @@ class InconvenienceRequestLineDetailView(APIView):
             serializer = InconvenienceRequestLineSerializer(data=data, context={'inconvenience_request_id': inconvenience_request.id, 'user':request.user})
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serialized(serializer), status=status.HTTP_201_CREATED)
         raise SerializerValidationException(serializer.errors,code=400)
 
 
@@ -331,32 +394,35 @@ class InconvenienceRequestLineDetailView(APIView):
     )
     def get(self, request, pk):
         # Retrieve the specific Inconvenience Request Line
-        inconvenience_request_line = get_object_or_404(InconvenienceRequestLine, pk=pk)
+        inconvenience_request_line = get_object_or_404(
+            InconvenienceRequestLine.objects.select_related('employee', 'inconvenience_request'), pk=pk
+        )
         
         # Permission check
         user = request.user
 
-        if inconvenience_request_line.inconvenience_request.status == 'draft' and not user.groups.filter(name="Department Representatives"):
+        if inconvenience_request_line.inconvenience_request.status == 'draft' and not user.has_role(DEPARTMENT_REP):
             raise SerializerValidationException("Not permitted to view this request line.",code=403)
         
         # Check if the user is HR or is related to the department of the request line
-        if user.groups.filter(name='HR').exists():
-            # HR can view all request lines
-            serializer = InconvenienceRequestLineSerializer(inconvenience_request_line)
-            return Response(serializer.data)
-        
-        if user.groups.filter(name='Department Representatives').exists() or \
-        user.groups.filter(name='Line Managers').exists() or \
-        user.groups.filter(name='Employees').exists():
-            # Check if the request line belongs to the user's department
-            if inconvenience_request_line.department == user.department:
-                serializer = InconvenienceRequestLineSerializer(inconvenience_request_line)
-                return Response(serializer.data)
+        # (HR can view all request lines)
+        if not user.has_role(HR):
+            if user.has_role(DEPARTMENT_REP) or \
+            user.has_role(LINE_MANAGER) or \
+            user.has_role(EMPLOYEE):
+                # Check if the request line belongs to the user's department
+                if inconvenience_request_line.inconvenience_request.department_id != user.department_id:
+                    return Response({"detail": "Not permitted to view this request line."}, status=status.HTTP_403_FORBIDDEN)
             else:
-                return Response({"detail": "Not permitted to view this request line."}, status=status.HTTP_403_FORBIDDEN)
-        
-        # If user role is not valid, return Forbidden response
-        raise SerializerValidationException("Not permitted to view request lines.",code=403)
+                # If user role is not valid, return Forbidden response
+                raise SerializerValidationException("Not permitted to view request lines.",code=403)
+
+        # Lines are versioned by their request (see InconvenienceRequest.touch)
+        def build():
+            prefetch_related_objects([inconvenience_request_line], 'days')
+            return Response(serialized(InconvenienceRequestLineSerializer(inconvenience_request_line)))
+        updated_at = inconvenience_request_line.inconvenience_request.updated_at
+        return conditional_response(request, build, make_etag(request, updated_at), updated_at)
 
 
     @extend_schema(
@@ -377,16 +443,16 @@ class InconvenienceRequestLineDetailView(APIView):
     # Permission check
         user = request.user
         
-        if inconvenience_request_line.inconvenience_request.status == 'draft' and not user.groups.filter(name="Department Representatives"):
+        if inconvenience_request_line.inconvenience_request.status == 'draft' and not user.has_role(DEPARTMENT_REP):
             return Response({"detail": "Not permitted to view this request line."}, status=status.HTTP_403_FORBIDDEN)
         
-        if user.groups.filter(name='HR').exists():
+        if user.has_role(HR):
             # HR can delete any request line
             inconvenience_request_line.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         
-        if user.groups.filter(name='Department Representatives').exists() or \
-        user.groups.filter(name='Line Managers').exists():
+        if user.has_role(DEPARTMENT_REP) or \
+        user.has_role(LINE_MANAGER):
             inconvenience_request_line.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         
@@ -397,13 +463,15 @@ class InconvenienceRequestLineDetailView(APIView):
 
 
 @extend_schema(tags=['Inconvenience Request Lines'])
-class InconvenienceRequestLineOwnView(APIView):
+class InconvenienceRequestLineOwnView(PaginatedListMixin, APIView):
     permission_classes = [IsAuthenticated]
+    version_field = 'inconvenience_request__updated_at'
 
     @extend_schema(
         operation_id="List Current User's Inconvenience Requests",
         summary="List Current User's Inconvenience Requests",
         description="List Current User's Inconvenience Requests",
+        parameters=LIST_PARAMETERS,
         responses={
             200: InconvenienceRequestLineSerializer(many=True),
             400: ErrorResponseSerializer
@@ -411,9 +479,8 @@ class InconvenienceRequestLineOwnView(APIView):
         }
     )
     def get(self, request):
-        inconvenience_request_lines = InconvenienceRequestLine.objects.filter(employee=request.user.id).exclude(inconvenience_request__status="draft")
-        serializer = InconvenienceRequestLineSerializer(inconvenience_request_lines, many=True)
-        return Response(serializer.data)
+        inconvenience_request_lines = own_lines(request.user)
+        return self.list_response(request, inconvenience_request_lines, InconvenienceRequestLineSerializer)
 
 
 
@@ -488,32 +555,99 @@ class TransitionStatusView(APIView):
             raise SerializerValidationException('Invalid status')
 
         current_status = request_obj.status
-        
-        if user.groups.filter(name='Department Representatives').exists():
-            if current_status == 'draft' and new_status == 'submitted':
-                request_obj.transition_status(new_status)
-            else:
-                raise SerializerValidationException("Not permitted to transition to this status",code=403)
-        
-        elif user.groups.filter(name='Line Managers').exists():
-            if current_status == 'submitted' and new_status == 'manager_approved':
-                request_obj.transition_status(new_status)
-            elif current_status == 'submitted' and new_status == 'draft':
-                request_obj.transition_status(new_status)
-            elif current_status == 'manager_approved' and new_status == 'work_done':
-                request_obj.transition_status(new_status)
-            else:
-                raise SerializerValidationException("Not permitted to transition to this status",code=403)
+        if (current_status, new_status) not in permitted_transitions(user):
+            raise SerializerValidationException("Not permitted to transition to this status",code=403)
 
-        elif user.groups.filter(name='HR').exists():
-            if current_status == 'work_done' and new_status == 'hr_approval':
-                request_obj.transition_status(new_status)
-                request_obj.transition_status('completed')
-            else:
-                raise SerializerValidationException("Not permitted to transition to this status",code=403)
-        
-        else:
-            raise SerializerValidationException('Not authorized to update status', code=403)
+        request_obj.transition_status(new_status)
+        if new_status in FOLLOW_ON:
+            request_obj.transition_status(FOLLOW_ON[new_status])
 
+        # Only the response needs the lines
+        prefetch_related_objects([request_obj], InconvenienceRequestSerializer.lines_prefetch())
         serializer = InconvenienceRequestSerializer(request_obj)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serialized(serializer), status=status.HTTP_200_OK)
+
+
+
+@extend_schema(tags=['Inconvenience Request'])
+class BulkTransitionStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        operation_id="Move many inconvenience requests to a stage",
+        summary="Move many inconvenience requests to a stage",
+        description=(
+            "Moves every listed request to `status` under the same rules as the single transition. "
+            "Only requests in the user's request list are moved; others are reported as not found. "
+            "Requests that may not be moved are left as they are and reported with an error; "
+            "the rest are moved together. Returns one result per ID."
+        ),
+        request=BulkTransitionSerializer,
+        responses={
+            200: BulkTransitionResultSerializer(many=True),
+            400: ErrorResponseSerializer,
+        }
+    )
+    def post(self, request):
+        serializer = BulkTransitionSerializer(data=request.data)
+        if not serializer.is_valid():
+            raise SerializerValidationException(serializer.errors,code=400)
+        data = serializer.validated_data
+        results = bulk_transition(request.user, data['ids'], data['status'])
+        return Response(serialized(BulkTransitionResultSerializer(results, many=True)), status=status.HTTP_200_OK)
+
+
+
+@extend_schema(tags=['Reports'])
+class AllowanceReportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        operation_id="allowance_report",
+        summary="Allowance totals",
+        description="Day counts and amounts of the request lines visible to the user, summed per group. "
+                    "Months are those of the booked days; the date range selects lines with a day booked in it. "
+                    "Category and month amounts split each line's stored amount across its days by their rates, so every grouping adds up to the same total.",
+        parameters=[
+            OpenApiParameter('group_by', str, description="Comma-separated groups: department, employee, month, status, category."),
+            OpenApiParameter('start', OpenApiTypes.DATE, description="Only lines with a day booked on or after this date."),
+            OpenApiParameter('end', OpenApiTypes.DATE, description="Only lines with a day booked on or before this date."),
+        ],
+        responses={200: AllowanceReportSerializer, 400: ErrorResponseSerializer},
+    )
+    def get(self, request):
+        serializer = AllowanceReportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            raise SerializerValidationException(serializer.errors, code=400)
+        report = allowance_report(lines_visible_to(request.user), **serializer.validated_data)
+        return Response(report)
+
+
+
+@extend_schema(tags=['Reports'])
+class PayrollExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        operation_id="payroll_export",
+        summary="Export completed lines for payroll",
+        description="Every line of a completed request with employee, staff ID, department, dates and amount. "
+                    "CSV is streamed as it is read; XLSX is built first and then downloaded.",
+        parameters=[
+            OpenApiParameter('file_type', str, enum=['csv', 'xlsx'], description="Spreadsheet format (default csv)."),
+            OpenApiParameter('start', OpenApiTypes.DATE, description="Only lines with a day booked on or after this date."),
+            OpenApiParameter('end', OpenApiTypes.DATE, description="Only lines with a day booked on or before this date."),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.BINARY, 400: ErrorResponseSerializer},
+    )
+    def get(self, request):
+        if not request.user.has_role(HR):
+            raise SerializerValidationException("Not Permitted", code=403)
+        serializer = PayrollExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            raise SerializerValidationException(serializer.errors, code=400)
+        data = serializer.validated_data
+        rows = payroll_rows(payroll_lines(data.get('start'), data.get('end')))
+        if data['file_type'] == 'xlsx':
+            return xlsx_response(rows, 'payroll.xlsx')
+        return csv_response(request, rows, 'payroll.csv')
@@ -0,0 +1,80 @@
+"""Which status transitions each role may make, for single and bulk moves.
+
+A user acts under their primary_role() (user/roles.py). Which requests they
+may see still follows the read rules in access.py. HR approval completes
+the request straight away (FOLLOW_ON).
+
+bulk_transition only moves requests in the user's request list
+(requests_visible_to), the list they pick them from. It locks every
+requested row with one SELECT ... FOR UPDATE,
+checks each transition in memory and moves all the valid ones with a single
+UPDATE. Their notifications go to the outbox in the same transaction.
+"""
+from django.db import transaction
+from django.utils import timezone
+from egbin_ssp.exceptions import SerializerValidationException
+from user.roles import DEPARTMENT_REP, HR, LINE_MANAGER, primary_role
+from .access import requests_visible_to
+from .models import InconvenienceRequest
+from .notifications import enqueue
+from .reports import invalidate_reports
+
+
+ROLE_TRANSITIONS = {
+    DEPARTMENT_REP: {('draft', 'submitted')},
+    LINE_MANAGER: {('submitted', 'manager_approved'), ('submitted', 'draft'), ('manager_approved', 'work_done')},
+    HR: {('work_done', 'hr_approval')},
+}
+
+FOLLOW_ON = {'hr_approval': 'completed'}
+
+# Outbox event sent when a request is moved to a status
+EVENTS = {'submitted': 'submitted', 'manager_approved': 'manager_approved', 'hr_approval': 'completed'}
+
+MAX_BULK_TRANSITIONS = 500
+
+
+def permitted_transitions(user):
+    """The (current, new) status pairs `user` may make; raises if they may make none."""
+    transitions = ROLE_TRANSITIONS.get(primary_role(user))
+    if transitions is None:
+        raise SerializerValidationException('Not authorized to update status', code=403)
+    return transitions
+
+
+def bulk_transition(user, request_ids, new_status):
+    """Move each of `request_ids` to `new_status` where `user` may; one result per ID."""
+    transitions = permitted_transitions(user)
+    request_ids = list(dict.fromkeys(request_ids))
+    final_status = FOLLOW_ON.get(new_status, new_status)
+
+    results = []
+    with transaction.atomic():
+        requests = requests_visible_to(user).select_for_update().in_bulk(request_ids)
+        moved = []
+        for request_id in request_ids:
+            inconvenience_request = requests.get(request_id)
+            # Requests outside the user's list are reported like missing ones
+            if inconvenience_request is None:
+                results.append({'id': request_id, 'success': False, 'status': None, 'error': 'InconvenienceRequest not found'})
+            elif (inconvenience_request.status, new_status) not in transitions:
+                results.append({
+                    'id': request_id, 'success': False, 'status': inconvenience_request.status,
+                    'error': f'Not permitted to transition from {inconvenience_request.status} to {new_status}',
+                })
+            else:
+                moved.append(inconvenience_request)
+                results.append({'id': request_id, 'success': True, 'status': final_status, 'error': None})
+
+        if moved:
+            # update() sends no post_save, so bump updated_at (which versions
+            # the request for conditional GETs) and drop reports by hand
+            InconvenienceRequest.objects.filter(pk__in=[inconvenience_request.pk for inconvenience_request in moved]).update(
+                status=final_status, updated_at=timezone.now()
+            )
+            for inconvenience_request in moved:
+                inconvenience_request.status = final_status
+            if new_status in EVENTS:
+                enqueue(moved, EVENTS[new_status])
+            transaction.on_commit(invalidate_reports)
+    return results
@@ -0,0 +1,8 @@
+from django.urls import path
+from .async_views import AsyncUserView, AsyncUserOwnView
+
+
+urlpatterns = [
+    path('', AsyncUserView.as_view(), name='async_user_list'),
+    path('own/', AsyncUserOwnView.as_view(), name='async_user_own_view'),
+]
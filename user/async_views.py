@@ -0,0 +1,36 @@
+from asgiref.sync import sync_to_async
+from django.db.models import prefetch_related_objects
+
+from egbin_ssp.async_views import AsyncAPIView, json_response
+from egbin_ssp.metrics import serialized
+from .models import Department, User
+from .serializers import UserSerializer
+from .views import filter_users
+
+
+class AsyncUserView(AsyncAPIView):
+    # Open like UserView
+    authentication_required = False
+
+    async def get(self, request):
+        users = User.objects.all()
+
+        department_id = request.GET.get('department')
+        if department_id:
+            if not await Department.objects.filter(id=department_id).aexists():
+                return json_response({'error': 'Department not found'}, status=404)
+            users = users.filter(department_id=department_id)
+
+        try:
+            users = filter_users(users, request.GET)
+        except ValueError:
+            return json_response({'error': 'ids must be a comma-separated list of integers'}, status=400)
+        return await self.list_response(request, users, UserSerializer)
+
+
+class AsyncUserOwnView(AsyncAPIView):
+    async def get(self, request):
+        # request.user may be built from token claims, so load the full record
+        user = await User.objects.select_related('department').aget(pk=request.user.pk)
+        await sync_to_async(prefetch_related_objects)([user], 'groups')
+        return json_response(serialized(UserSerializer(user)))
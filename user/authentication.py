@@ -0,0 +1,86 @@
+"""JWT authentication that takes the user from the token's claims.
+
+ClaimsJWTAuthentication checks the signature, then compares the token's
+``ver`` claim with the user's token version in the cache (tokens.py). If they
+match, request.user is built from the claims with no database query. If not,
+because the user changed or the version left the cache, the user is loaded
+from the database and cached for TOKEN_USER_CACHE_TIMEOUT seconds under the
+current version. Tokens issued before the claims existed, and every token
+while claims_trusted() is False (a per-process cache, which would not see
+changes made by other workers), are authenticated as simplejwt always has.
+
+The user built from claims is an in-memory User with the right primary key,
+email, department_id, staff_id and roles. It works anywhere a user is
+compared, assigned to a foreign key or checked with has_role(). Names and
+other fields are blank, so views that show the user's own record load it
+from the database. It must never be saved.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import VERSION_CLAIM, acurrent_token_version, claims_trusted, current_token_version, token_version
+
+
+def build_user(user_id, email, department_id, staff_id, roles, is_active=True):
+    user = User(
+        pk=user_id, email=email, department_id=department_id, staff_id=staff_id, is_active=is_active,
+    )
+    # Behave like a row loaded from the database
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    user.__dict__['role_names'] = frozenset(roles)
+    return user
+
+
+def user_from_claims(token):
+    return build_user(
+        token[api_settings.USER_ID_CLAIM], token['email'], token['department_id'], token['staff_id'], token['roles'],
+    )
+
+
+def load_token_user(user_id):
+    """The user as stored, from a short-lived cache entry keyed by their token version."""
+    key = f'token-user:{token_version(user_id)}:{user_id}'
+    data = cache.get(key)
+    if data is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        data = (user.email, user.department_id, user.staff_id, sorted(user.role_names), user.is_active)
+        cache.set(key, data, getattr(settings, 'TOKEN_USER_CACHE_TIMEOUT', 60))
+    email, department_id, staff_id, roles, is_active = data
+    if not is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return build_user(user_id, email, department_id, staff_id, roles)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token or not claims_trusted():
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        if validated_token[VERSION_CLAIM] == current_token_version(user_id):
+            return user_from_claims(validated_token)
+        return load_token_user(user_id)
+
+    async def aget_user(self, validated_token):
+        """Async get_user() for the async views; the fallback load runs on a thread."""
+        if VERSION_CLAIM in validated_token and claims_trusted():
+            try:
+                user_id = validated_token[api_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken('Token contained no recognizable user identification')
+            if validated_token[VERSION_CLAIM] == await acurrent_token_version(user_id):
+                return user_from_claims(validated_token)
+            return await sync_to_async(load_token_user)(user_id)
+        return await sync_to_async(super().get_user)(validated_token)
@@ -0,0 +1,121 @@
+"""Fast token blacklist checks, and pruning of expired tokens.
+
+simplejwt looks every refresh token up in the BlacklistedToken table, and the
+outstanding and blacklisted token tables only ever grow. Instead, the JTIs of
+blacklisted tokens that have not expired yet are kept in memory. A refresh
+only queries the blacklist when its JTI is in the set; the query then
+confirms it, in case the token was taken off the blacklist since.
+
+The set is kept current like the Day calendar (day_calendar.py):
+- blacklisting a token increments a version number in Django's cache and
+  stores the JTI under that number. A worker that is behind fetches the JTIs
+  it missed with one get_many, and reloads from the database if any of them
+  has left the cache or it missed more than MAX_CATCH_UP.
+- the set is reloaded after TOKEN_BLACKLIST_TIMEOUT seconds, as a safety net
+  for the default per-process cache. Until then, another worker may accept a
+  token blacklisted elsewhere.
+
+Expired tokens are left out of the set; they fail verification anyway.
+prune_expired_tokens() deletes them from both tables in bounded batches, for
+`manage.py prune_tokens`.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+VERSION_KEY = 'token-blacklist-version'
+
+MAX_CATCH_UP = 1000
+
+
+def _entry_key(version):
+    return f'token-blacklist:{version}'
+
+
+def _new_version():
+    # Start from a random number, so a version evicted and started again
+    # never matches what a worker already has
+    return random.randrange(1 << 48)
+
+
+class TokenBlacklist:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = None
+        self._version = None
+        self._loaded_at = 0
+
+    def _timeout(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_TIMEOUT', 60)
+
+    def _current_version(self):
+        return cache.get_or_set(VERSION_KEY, _new_version, None)
+
+    def _load(self, version):
+        self._jtis = set(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).values_list('token__jti', flat=True)
+        )
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _catch_up(self, version):
+        """Add the JTIs blacklisted since our version; False if they are not all in the cache."""
+        if not self._version < version <= self._version + MAX_CATCH_UP:
+            return False
+        keys = [_entry_key(number) for number in range(self._version + 1, version + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            return False
+        self._jtis.update(entries.values())
+        self._version = version
+        return True
+
+    def _snapshot(self):
+        version = self._current_version()
+        with self._lock:
+            if self._jtis is None or time.monotonic() - self._loaded_at > self._timeout():
+                self._load(version)
+            elif version != self._version and not self._catch_up(version):
+                self._load(version)
+            return self._jtis
+
+    def might_contain(self, jti):
+        """False if `jti` is certainly not blacklisted."""
+        return jti in self._snapshot()
+
+    def add(self, jti):
+        """Tell every worker that `jti` is blacklisted; call once the row is committed."""
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # The version left the cache; a new one makes every worker reload
+            cache.set(VERSION_KEY, _new_version(), None)
+            return
+        # A worker that has not looked for longer than this reloads anyway
+        cache.set(_entry_key(version), jti, self._timeout() * 2)
+
+
+token_blacklist = TokenBlacklist()
+
+
+def prune_expired_tokens(batch_size=1000):
+    """Delete up to `batch_size` expired outstanding tokens and their blacklist entries.
+
+    Returns how many outstanding tokens were deleted; fewer than `batch_size`
+    means none are left.
+    """
+    token_ids = list(
+        OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if token_ids:
+        # The blacklist entries go with them (on_delete=CASCADE)
+        OutstandingToken.objects.filter(pk__in=token_ids).only('pk').delete()
+    return len(token_ids)
@@ -0,0 +1,16 @@
+"""Password hashing for the import process pool (see imports.py).
+
+Kept apart from imports.py, which imports the models: a spawned worker
+imports this module to find its functions before Django is set up.
+"""
+import django
+from django.contrib.auth.hashers import make_password
+
+
+def setup_worker():
+    # Spawned workers start without Django configured
+    django.setup()
+
+
+def hash_password(password):
+    return make_password(password)
@@ -0,0 +1,230 @@
+"""Bulk import of users and their departments from CSV or JSON.
+
+Rows have the columns email, first_name, last_name, department (a name),
+staff_id and password. They are read lazily and handled in batches, so a
+large CSV never sits in memory at once. For each batch:
+
+- departments named in it are created in one bulk insert if missing;
+- existing users are matched by email, then by staff_id, in one query;
+- passwords are hashed across a process pool (hashing.py), or in process
+  with one worker. PBKDF2 is deliberately slow, and this is where imports
+  spend their time. A row without a password gets an unusable one, for
+  users who only sign in with Microsoft;
+- new users, their Employees membership and the changes to existing users
+  are written with bulk_create/bulk_update in one transaction.
+
+Each row is reported as created, updated or failed.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .hashing import hash_password, setup_worker
+from .models import Department, User
+from .roles import EMPLOYEE
+from .signals import users_renamed
+from .tokens import bump_token_versions
+
+
+FIELDS = ['email', 'first_name', 'last_name', 'department', 'staff_id', 'password']
+
+UPDATE_FIELDS = ['email', 'first_name', 'last_name', 'department', 'staff_id', 'password']
+
+
+def read_rows(file, file_format):
+    """Row dicts from a text file of `file_format` ('csv' or 'json')."""
+    if file_format == 'csv':
+        return csv.DictReader(file)
+    if file_format == 'json':
+        rows = json.load(file)
+        if not isinstance(rows, list):
+            raise ValueError('JSON imports must be a list of objects.')
+        return rows
+    raise ValueError(f'Unknown import format: {file_format}')
+
+
+def read_upload(upload):
+    """Row dicts from an uploaded .csv or .json file."""
+    file_format = os.path.splitext(upload.name)[1].lstrip('.').lower()
+    return read_rows(io.TextIOWrapper(upload, encoding='utf-8-sig'), file_format)
+
+
+class UserImporter:
+    """Imports rows in batches; use as a context manager so the pool is shut down.
+
+    `start_method` is the multiprocessing start method for the hashing pool
+    ('fork', 'spawn', ...); None uses the platform default.
+    """
+
+    def __init__(self, batch_size=500, workers=None, start_method=None):
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.start_method = start_method
+        self.pool = None
+        self.departments = {}
+        self.seen = set()
+        self.results = []
+        self.counts = {'created': 0, 'updated': 0, 'failed': 0}
+
+    def __enter__(self):
+        if self.workers > 1:
+            mp_context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=mp_context, initializer=setup_worker)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        # Failures are reported as they are found, ahead of their batch
+        self.results.sort(key=lambda result: result['row'])
+        return {**self.counts, 'rows': self.results}
+
+    def report(self, number, email, result, errors=()):
+        self.counts[result] += 1
+        self.results.append({'row': number, 'email': email, 'result': result, 'errors': list(errors)})
+
+    def clean(self, row):
+        """The row's values, stripped and checked; raises ValidationError."""
+        if not isinstance(row, dict):
+            raise ValidationError('Each row must be an object.')
+        values = {field: str(row.get(field) or '').strip() for field in FIELDS}
+        errors = []
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            errors.append('Enter a valid email address.')
+        values['email'] = User.objects.normalize_email(values['email'])
+        for field, max_length in (('first_name', 30), ('last_name', 30), ('department', 100)):
+            if field != 'department' and not values[field]:
+                errors.append(f'{field} is required.')
+            elif len(values[field]) > max_length:
+                errors.append(f'{field} must be at most {max_length} characters.')
+        if values['email'].lower() in self.seen:
+            errors.append('This email appears earlier in the import.')
+        if values['staff_id'] and ('staff_id', values['staff_id']) in self.seen:
+            errors.append('This staff_id appears earlier in the import.')
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def resolve_departments(self, names):
+        missing = [name for name in names if name not in self.departments]
+        if missing:
+            Department.objects.bulk_create([Department(name=name) for name in missing], ignore_conflicts=True)
+            self.departments.update(Department.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def hash_passwords(self, passwords):
+        if self.pool is None:
+            return [hash_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(hash_password, passwords, chunksize=chunksize))
+
+    def import_batch(self, batch):
+        cleaned = []
+        for number, row in batch:
+            try:
+                values = self.clean(row)
+            except ValidationError as error:
+                email = row.get('email') if isinstance(row, dict) else None
+                self.report(number, email, 'failed', error.messages)
+                continue
+            self.seen.add(values['email'].lower())
+            if values['staff_id']:
+                self.seen.add(('staff_id', values['staff_id']))
+            cleaned.append((number, values))
+        if not cleaned:
+            return
+
+        emails = [values['email'] for _, values in cleaned]
+        staff_ids = [values['staff_id'] for _, values in cleaned if values['staff_id']]
+        existing = list(User.objects.filter(Q(email__in=emails) | Q(staff_id__in=staff_ids)))
+        by_email = {user.email: user for user in existing}
+        by_staff_id = {user.staff_id: user for user in existing if user.staff_id}
+
+        # Hash only the passwords that were given, across the pool
+        given = [values['password'] for _, values in cleaned if values['password']]
+        hashes = iter(self.hash_passwords(given))
+
+        self.resolve_departments({values['department'] for _, values in cleaned if values['department']})
+
+        new_users, updated_users, renamed, outcomes = [], [], [], []
+        matched = set()
+        for number, values in cleaned:
+            user = by_email.get(values['email'])
+            other = by_staff_id.get(values['staff_id']) if values['staff_id'] else None
+            password = next(hashes) if values['password'] else None
+            if user is not None and other is not None and other.pk != user.pk:
+                self.report(number, values['email'], 'failed', ['email and staff_id belong to different users.'])
+                continue
+            user = user or other
+            if user is not None and user.pk in matched:
+                self.report(number, values['email'], 'failed', ['Matches the same user as an earlier row.'])
+                continue
+            if user is None:
+                user = User(email=values['email'], password=password or make_password(None))
+                new_users.append(user)
+                result = 'created'
+            else:
+                matched.add(user.pk)
+                if password:
+                    user.password = password
+                user.email = values['email']
+                if (user.first_name, user.last_name) != (values['first_name'], values['last_name']):
+                    renamed.append(user.pk)
+                updated_users.append(user)
+                result = 'updated'
+            user.first_name = values['first_name']
+            user.last_name = values['last_name']
+            if values['department']:
+                user.department_id = self.departments[values['department']]
+            if values['staff_id']:
+                user.staff_id = values['staff_id']
+            outcomes.append((number, values['email'], result))
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(new_users)
+                if updated_users:
+                    User.objects.bulk_update(updated_users, UPDATE_FIELDS)
+                employees, _ = Group.objects.get_or_create(name=EMPLOYEE)
+                User.groups.through.objects.bulk_create([
+                    User.groups.through(user_id=user.pk, group_id=employees.pk) for user in new_users
+                ])
+        except IntegrityError as error:
+            # Most likely another import or sign-up took one of these emails
+            # meanwhile; nothing in the batch was written
+            for number, email, _ in outcomes:
+                self.report(number, email, 'failed', [f'Batch not saved: {error}'])
+            return
+        # bulk_update sends no post_save; refresh the updated users' tokens
+        bump_token_versions(*[user.pk for user in updated_users])
+        if renamed:
+            users_renamed.send(sender=User, user_ids=renamed)
+        for number, email, result in outcomes:
+            self.report(number, email, result)
+
+
+def import_users(rows, batch_size=500, workers=None, start_method=None):
+    """Import `rows` (dicts) and return the created/updated/failed counts and per-row results."""
+    with UserImporter(batch_size, workers, start_method) as importer:
+        return importer.run(rows)
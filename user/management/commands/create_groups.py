@@ -2,16 +2,17 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from inconvenience_allowance.models import InconvenienceRequest  # Import your model
+from user.roles import DEPARTMENT_REP, EMPLOYEE, HR, LINE_MANAGER
 
 class Command(BaseCommand):
     help = 'Create user groups and assign permissions'
 
     def handle(self, *args, **kwargs):
         # Create Groups
-        dept_rep_group, _ = Group.objects.get_or_create(name='Department Representatives')
-        dept_member_group, _ = Group.objects.get_or_create(name='Employees')
-        line_manager_group, _ = Group.objects.get_or_create(name='Line Managers')
-        hr_group, _ = Group.objects.get_or_create(name='HR')
+        dept_rep_group, _ = Group.objects.get_or_create(name=DEPARTMENT_REP)
+        dept_member_group, _ = Group.objects.get_or_create(name=EMPLOYEE)
+        line_manager_group, _ = Group.objects.get_or_create(name=LINE_MANAGER)
+        hr_group, _ = Group.objects.get_or_create(name=HR)
 
         # Define permissions
         content_type = ContentType.objects.get_for_model(InconvenienceRequest)
@@ -0,0 +1,29 @@
+import csv
+import os
+from django.core.management.base import BaseCommand, CommandError
+from user.imports import import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update users and their departments from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with email, first_name, last_name, department, staff_id and password columns')
+        parser.add_argument('--format', choices=['csv', 'json'], help='File format; taken from the extension by default')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per batch')
+        parser.add_argument('--workers', type=int, help='Processes hashing passwords (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                summary = import_users(read_rows(file, file_format), options['batch_size'], options['workers'])
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(str(error))
+
+        for row in summary['rows']:
+            if row['result'] == 'failed':
+                self.stderr.write(f"Row {row['row']} ({row['email']}): {' '.join(row['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported users: {summary['created']} created, {summary['updated']} updated, {summary['failed']} failed."
+        ))
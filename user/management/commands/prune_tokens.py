@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from user.blacklist import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWTs in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens to delete per transaction')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds to wait between sweeps')
+        parser.add_argument('--once', action='store_true', help='Delete what has expired now, then exit')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                deleted = 0
+                while True:
+                    pruned = prune_expired_tokens(options['batch_size'])
+                    deleted += pruned
+                    if pruned < options['batch_size']:
+                        break
+                if deleted:
+                    self.stdout.write(f'Deleted {deleted} expired tokens.')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,204 @@
+"""Verification of Microsoft sign-in tokens.
+
+MicrosoftTokenValidationView tries each verifier in MICROSOFT_TOKEN_VERIFIERS
+in turn:
+
+- JWKSTokenVerifier checks the token signature locally against Microsoft's
+  published signing keys. The keys are fetched once and refreshed every
+  MICROSOFT_JWKS_REFRESH seconds, so a normal login makes no outbound call.
+  It needs MICROSOFT_TENANT_ID and MICROSOFT_CLIENT_ID, and only works for
+  tokens issued to this app (ID tokens, or access tokens for our API).
+- GraphTokenVerifier asks Microsoft Graph who the token belongs to. It works
+  for Graph access tokens too, over a pooled session with timeouts.
+
+A verifier returns a MicrosoftIdentity. It raises InvalidMicrosoftToken when
+the token is bad, or VerifierUnavailable to hand over to the next verifier.
+MicrosoftUnreachable, a VerifierUnavailable, means Microsoft could not be
+asked (network errors, 5xx, 429). If no verifier reaches a verdict and one
+of them was unreachable, verify_token raises it, so an outage is reported
+as such rather than as a rejected login.
+
+Tokens that have already been verified are remembered (by SHA-256
+fingerprint) for MICROSOFT_VERIFIED_TOKEN_TTL seconds, but never past their
+expiry. Graph does not say when a token expires, so for Graph-verified tokens
+that is read from the token's unverified ``exp`` claim. Opaque tokens without
+one are remembered for MICROSOFT_OPAQUE_TOKEN_TTL seconds instead.
+"""
+import hashlib
+import time
+from collections import namedtuple
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+MicrosoftIdentity = namedtuple('MicrosoftIdentity', ['email', 'first_name', 'last_name', 'expires_at'])
+
+
+class InvalidMicrosoftToken(Exception):
+    pass
+
+
+class VerifierUnavailable(Exception):
+    pass
+
+
+class MicrosoftUnreachable(VerifierUnavailable):
+    pass
+
+
+class JWKSTokenVerifier:
+    _jwks_clients = {}
+
+    def __init__(self):
+        self.tenant_id = getattr(settings, 'MICROSOFT_TENANT_ID', None)
+        self.client_id = getattr(settings, 'MICROSOFT_CLIENT_ID', None)
+        self.jwks_url = getattr(settings, 'MICROSOFT_JWKS_URL', None) or (
+            f'https://login.microsoftonline.com/{self.tenant_id}/discovery/v2.0/keys'
+        )
+        self.issuer = getattr(settings, 'MICROSOFT_ISSUER', None) or (
+            f'https://login.microsoftonline.com/{self.tenant_id}/v2.0'
+        )
+
+    def get_jwks_client(self):
+        # One client per key set URL and process; it caches the key set itself
+        client = self._jwks_clients.get(self.jwks_url)
+        if client is None:
+            client = self._jwks_clients[self.jwks_url] = jwt.PyJWKClient(
+                self.jwks_url,
+                cache_keys=True,
+                lifespan=getattr(settings, 'MICROSOFT_JWKS_REFRESH', 3600),
+                timeout=getattr(settings, 'MICROSOFT_HTTP_TIMEOUT', 5),
+            )
+        return client
+
+    def verify(self, token):
+        if not (self.tenant_id and self.client_id):
+            raise VerifierUnavailable('MICROSOFT_TENANT_ID and MICROSOFT_CLIENT_ID are not configured')
+        audiences = [self.client_id, f'api://{self.client_id}']
+        try:
+            unverified = jwt.decode(token, options={'verify_signature': False})
+        except jwt.DecodeError as exc:
+            # Not a JWT at all, e.g. an opaque Graph token
+            raise VerifierUnavailable(str(exc))
+        if unverified.get('aud') not in audiences:
+            # Issued to another resource (e.g. a Graph access token), which
+            # only that resource can verify
+            raise VerifierUnavailable('Token was not issued to this application')
+
+        try:
+            signing_key = self.get_jwks_client().get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientConnectionError as exc:
+            raise MicrosoftUnreachable(str(exc))
+        except (jwt.PyJWKClientError, jwt.DecodeError) as exc:
+            raise InvalidMicrosoftToken(str(exc))
+
+        try:
+            claims = jwt.decode(
+                token,
+                signing_key.key,
+                algorithms=['RS256'],
+                audience=audiences,
+                issuer=self.issuer,
+                options={'require': ['exp', 'iss', 'aud']},
+            )
+        except jwt.InvalidTokenError as exc:
+            raise InvalidMicrosoftToken(str(exc))
+
+        email = claims.get('email') or claims.get('preferred_username') or claims.get('upn')
+        if not email:
+            raise InvalidMicrosoftToken('Token has no email claim')
+        return MicrosoftIdentity(email, claims.get('given_name'), claims.get('family_name'), claims['exp'])
+
+
+class GraphTokenVerifier:
+    _session = None
+
+    @classmethod
+    def get_session(cls):
+        # Reuse connections to Graph across logins
+        if cls._session is None:
+            cls._session = requests.Session()
+        return cls._session
+
+    def verify(self, token):
+        try:
+            response = self.get_session().get(
+                getattr(settings, 'MICROSOFT_GRAPH_ME_URL', 'https://graph.microsoft.com/v1.0/me'),
+                headers={'Authorization': f'Bearer {token}'},
+                timeout=getattr(settings, 'MICROSOFT_HTTP_TIMEOUT', 5),
+            )
+        except requests.RequestException as exc:
+            raise MicrosoftUnreachable(str(exc))
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise MicrosoftUnreachable(f'Graph answered {response.status_code}')
+        if response.status_code != 200:
+            raise InvalidMicrosoftToken('Graph rejected the token')
+
+        data = response.json()
+        email = data.get('mail') or data.get('userPrincipalName')
+        if not email:
+            raise InvalidMicrosoftToken('Graph returned no email for the token')
+        return MicrosoftIdentity(email, data.get('givenName'), data.get('surname'), unverified_expiry(token))
+
+
+def unverified_expiry(token):
+    """The `exp` claim of a token whose signature can't be checked here, or None."""
+    try:
+        expires_at = jwt.decode(token, options={'verify_signature': False}).get('exp')
+    except jwt.DecodeError:
+        return None
+    # Graph has accepted the token, so this can only shorten how long it is remembered
+    return expires_at if isinstance(expires_at, (int, float)) else None
+
+
+def get_verifiers():
+    return [
+        import_string(path)()
+        for path in getattr(settings, 'MICROSOFT_TOKEN_VERIFIERS', [
+            'user.microsoft.JWKSTokenVerifier',
+            'user.microsoft.GraphTokenVerifier',
+        ])
+    ]
+
+
+def verify_token(token):
+    """Return the MicrosoftIdentity for `token` from the first verifier that can check it."""
+    if not token:
+        raise InvalidMicrosoftToken('No token provided')
+    if not isinstance(token, str):
+        raise InvalidMicrosoftToken('Token must be a string')
+    reasons = []
+    unreachable = False
+    for verifier in get_verifiers():
+        try:
+            return verifier.verify(token)
+        except VerifierUnavailable as exc:
+            reasons.append(str(exc))
+            unreachable = unreachable or isinstance(exc, MicrosoftUnreachable)
+    if unreachable:
+        raise MicrosoftUnreachable('; '.join(reasons))
+    raise InvalidMicrosoftToken('; '.join(reasons) or 'No token verifier configured')
+
+
+def token_cache_key(token):
+    return 'microsoft-token:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_verified_user_id(token):
+    return cache.get(token_cache_key(token))
+
+
+def remember_verified_token(token, identity, user_id):
+    timeout = getattr(settings, 'MICROSOFT_VERIFIED_TOKEN_TTL', 300)
+    if identity.expires_at:
+        # Never remember a token past its own expiry
+        timeout = min(timeout, int(identity.expires_at - time.time()))
+    else:
+        timeout = min(timeout, getattr(settings, 'MICROSOFT_OPAQUE_TOKEN_TTL', 60))
+    if timeout > 0:
+        cache.set(token_cache_key(token), user_id, timeout)
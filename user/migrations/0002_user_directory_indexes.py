@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:11
+
+from django.db import migrations
+
+
+# Prefix indexes for the user directory search (istartswith), which Django
+# compiles to UPPER(column) LIKE UPPER('term%') on PostgreSQL
+SEARCH_COLUMNS = ['first_name', 'last_name', 'email', 'staff_id']
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS user_user_{column}_prefix_idx '
+            f'ON user_user (UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS user_user_{column}_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_user_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
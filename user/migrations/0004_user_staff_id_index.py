@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_department_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='staff_id',
+            field=models.CharField(blank=True, db_index=True, null=True),
+        ),
+    ]
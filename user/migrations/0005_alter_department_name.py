@@ -0,0 +1,20 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_user_staff_id_index'),
+    ]
+
+    operations = [
+        # The model declares Department.name unique, but 0001 created the
+        # column without the constraint
+        migrations.AlterField(
+            model_name='department',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group
-from django.db import models
+from django.utils.functional import cached_property
+from .roles import EMPLOYEE, aload_role_names, load_role_names
 
 
 # Create your models here.
 
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # Versions the department list for conditional GETs
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -20,7 +23,7 @@ class CustomUserManager(BaseUserManager):
         user.set_password(password)
         user.save(using=self._db)
 
-        employee_group, _ = Group.objects.get_or_create(name='Employees')
+        employee_group, _ = Group.objects.get_or_create(name=EMPLOYEE)
         user.groups.add(employee_group)
         return user
 
@@ -35,7 +38,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     first_name = models.CharField(max_length=30)
     last_name = models.CharField(max_length=30)
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True)
-    staff_id = models.CharField(null=True,blank=True)
+    # Indexed for exact matches when importing users (see imports.py)
+    staff_id = models.CharField(null=True,blank=True,db_index=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=True)
 
@@ -47,4 +51,17 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    @cached_property
+    def role_names(self):
+        # Group names, loaded once per user object
+        return load_role_names(self)
+
+    async def aload_roles(self):
+        # Fills role_names without blocking, so has_role() can be called from
+        # async code afterwards
+        self.__dict__['role_names'] = await aload_role_names(self)
+
+    def has_role(self, *names):
+        return not self.role_names.isdisjoint(names)
+
 
@@ -0,0 +1,86 @@
+"""Role resolution for users.
+
+A user's roles are the names of their groups. They are loaded once per user
+object (so once per request) through ``User.role_names`` and, when
+``USER_ROLES_CACHE_TIMEOUT`` is set, shared between requests and workers via
+Django's cache. Cached entries are dropped by the signals in signals.py when
+group memberships change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+DEPARTMENT_REP = 'Department Representatives'
+HR = 'HR'
+LINE_MANAGER = 'Line Managers'
+EMPLOYEE = 'Employees'
+
+# A user with several roles makes status transitions under the first of these
+# they hold. Read access keeps its own per-view rules. Everyone is an
+# Employee, so it comes last.
+ROLE_PRECEDENCE = [DEPARTMENT_REP, LINE_MANAGER, HR, EMPLOYEE]
+
+ROLES_VERSION_KEY = 'user-roles-version'
+
+
+def _roles_version():
+    # Bumped whenever a change can affect many users at once (e.g. a group
+    # is renamed or deleted), which orphans every cached entry
+    return cache.get_or_set(ROLES_VERSION_KEY, 1, None)
+
+
+def roles_cache_key(user_id, version=None):
+    if version is None:
+        version = _roles_version()
+    return f'user-roles:{version}:{user_id}'
+
+
+def load_role_names(user):
+    """Return the user's group names, from the shared cache when enabled."""
+    if not user.pk:
+        return frozenset()
+    timeout = getattr(settings, 'USER_ROLES_CACHE_TIMEOUT', None)
+    if not timeout:
+        return frozenset(user.groups.values_list('name', flat=True))
+
+    key = roles_cache_key(user.pk)
+    role_names = cache.get(key)
+    if role_names is None:
+        role_names = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, role_names, timeout)
+    return role_names
+
+
+async def aload_role_names(user):
+    """Async version of load_role_names(), for the async views."""
+    if not user.pk:
+        return frozenset()
+    timeout = getattr(settings, 'USER_ROLES_CACHE_TIMEOUT', None)
+    if not timeout:
+        return frozenset([name async for name in user.groups.values_list('name', flat=True)])
+
+    version = await cache.aget_or_set(ROLES_VERSION_KEY, 1, None)
+    key = roles_cache_key(user.pk, version)
+    role_names = await cache.aget(key)
+    if role_names is None:
+        role_names = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+        await cache.aset(key, role_names, timeout)
+    return role_names
+
+
+def invalidate_user_roles(*user_ids):
+    if getattr(settings, 'USER_ROLES_CACHE_TIMEOUT', None):
+        cache.delete_many([roles_cache_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all_roles():
+    if getattr(settings, 'USER_ROLES_CACHE_TIMEOUT', None):
+        try:
+            cache.incr(ROLES_VERSION_KEY)
+        except ValueError:
+            cache.set(ROLES_VERSION_KEY, 1, None)
+
+
+def primary_role(user):
+    """The role `user` acts under (see ROLE_PRECEDENCE), or None if they have none."""
+    return next((role for role in ROLE_PRECEDENCE if user.has_role(role)), None)
@@ -15,8 +15,13 @@ class UserSerializer(serializers.ModelSerializer):
             'department_name':{'read_only':True},
         }
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        return queryset.select_related('department').prefetch_related('groups')
+
     def get_groups(self, obj):
-        return obj.groups.values_list('name', flat=True)
+        # Reads prefetched groups when the queryset was eager-loaded
+        return [group.name for group in obj.groups.all()]
     def get_department_name(self, obj):
         return obj.department.name if obj.department else None
 
@@ -66,4 +71,18 @@ class RegisterUserSerializer(serializers.ModelSerializer):
 class DepartmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Department
-        fields = ['id', 'name']    
\ No newline at end of file
+        fields = ['id', 'name']    
+
+
+class UserImportRowSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    email = serializers.CharField(allow_null=True)
+    result = serializers.ChoiceField(choices=['created', 'updated', 'failed'])
+    errors = serializers.ListField(child=serializers.CharField())
+
+
+class UserImportResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    updated = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    rows = UserImportRowSerializer(many=True)
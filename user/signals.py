@@ -0,0 +1,76 @@
+from functools import partial
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .blacklist import token_blacklist
+from .models import User
+from .roles import invalidate_all_roles, invalidate_user_roles
+from .tokens import bump_all_token_versions, bump_token_versions
+
+
+# Sent with the `user_ids` of users whose first or last name changed, by
+# save() and by the bulk import. Apps that show names in versioned or cached
+# responses re-version them.
+users_renamed = Signal()
+
+NAME_FIELDS = {'first_name', 'last_name'}
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        # Drop roles memoized on this very user object as well
+        instance.__dict__.pop('role_names', None)
+        invalidate_user_roles(instance.pk)
+        bump_token_versions(instance.pk)
+    elif pk_set:
+        invalidate_user_roles(*pk_set)
+        bump_token_versions(*pk_set)
+    else:
+        # group.user_set.clear() doesn't tell us which users were affected
+        invalidate_all_roles()
+        bump_all_token_versions()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, created=False, **kwargs):
+    if not created:
+        invalidate_all_roles()
+        bump_all_token_versions()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Tokens carry the user's email, department and staff ID; a saved or
+    # deleted user (e.g. deactivated) must not be trusted from old claims
+    bump_token_versions(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._renamed = False
+    if raw or instance._state.adding or (update_fields is not None and NAME_FIELDS.isdisjoint(update_fields)):
+        return
+    stored = User.objects.filter(pk=instance.pk).values_list('first_name', 'last_name').first()
+    instance._renamed = stored is not None and stored != (instance.first_name, instance.last_name)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    if getattr(instance, '_renamed', False):
+        users_renamed.send(sender=User, user_ids=[instance.pk])
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        # Announce it once committed; a worker reloading before then would
+        # miss the row yet take the new version
+        transaction.on_commit(partial(token_blacklist.add, instance.token.jti))
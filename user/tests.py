@@ -1,3 +1,475 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import ClaimsJWTAuthentication
+from .blacklist import MAX_CATCH_UP, VERSION_KEY, TokenBlacklist, _entry_key, prune_expired_tokens
+from .microsoft import (
+    GraphTokenVerifier, InvalidMicrosoftToken, JWKSTokenVerifier, MicrosoftUnreachable, verify_token,
+)
+from .models import Department, User
+from .roles import HR, LINE_MANAGER
+from .tokens import GLOBAL_VERSION_KEY, _version_key, issue_refresh_token
+
+
+TENANT_ID = 'tenant'
+CLIENT_ID = 'client'
+ISSUER = f'https://login.microsoftonline.com/{TENANT_ID}/v2.0'
+
+
+class MicrosoftStandIn(ThreadingHTTPServer):
+    """A local stand-in for Microsoft's signing keys (/keys) and Graph (/me)."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MicrosoftStandInHandler)
+        self.keys = {'keys': []}
+        self.graph_status = 200
+        self.graph_body = {}
+        self.requests = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class MicrosoftStandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == '/keys':
+            self._send(200, self.server.keys)
+        elif self.path == '/me':
+            self._send(self.server.graph_status, self.server.graph_body)
+        else:
+            self._send(404, {})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MicrosoftTokenTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = MicrosoftStandIn()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(cls.signing_key.public_key()))
+        cls.server.keys = {'keys': [dict(jwk, kid='key-1', use='sig', alg='RS256')]}
+        cls.settings_override = override_settings(
+            MICROSOFT_TENANT_ID=TENANT_ID,
+            MICROSOFT_CLIENT_ID=CLIENT_ID,
+            MICROSOFT_JWKS_URL=f'{cls.server.url}/keys',
+            MICROSOFT_GRAPH_ME_URL=f'{cls.server.url}/me',
+            MICROSOFT_HTTP_TIMEOUT=2,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        JWKSTokenVerifier._jwks_clients.clear()
+        self.server.graph_status = 200
+        self.server.graph_body = {'mail': 'graph.user@example.com', 'givenName': 'Graph', 'surname': 'User'}
+        self.server.requests = []
+
+    def id_token(self, key=None, **claims):
+        claims = {
+            'aud': CLIENT_ID,
+            'iss': ISSUER,
+            'exp': int(time.time()) + 600,
+            'email': 'jwks.user@example.com',
+            'given_name': 'Jwks',
+            'family_name': 'User',
+            **claims,
+        }
+        return jwt.encode(claims, key or self.signing_key, algorithm='RS256', headers={'kid': 'key-1'})
+
+    def test_id_token_is_verified_against_the_signing_keys(self):
+        identity = verify_token(self.id_token())
+
+        self.assertEqual(identity.email, 'jwks.user@example.com')
+        self.assertEqual((identity.first_name, identity.last_name), ('Jwks', 'User'))
+        self.assertEqual(self.server.requests, ['/keys'])
+
+        # The keys are fetched once, not per login
+        verify_token(self.id_token(email='other@example.com'))
+        self.assertEqual(self.server.requests, ['/keys'])
+
+    def test_id_token_with_a_bad_signature_is_rejected(self):
+        with self.assertRaises(InvalidMicrosoftToken):
+            verify_token(self.id_token(key=self.other_key))
+
+    def test_expired_id_token_is_rejected(self):
+        with self.assertRaises(InvalidMicrosoftToken):
+            verify_token(self.id_token(exp=int(time.time()) - 60))
+
+    def test_id_token_from_another_issuer_is_rejected(self):
+        with self.assertRaises(InvalidMicrosoftToken):
+            verify_token(self.id_token(iss='https://login.example.com/v2.0'))
+
+    def test_token_for_another_resource_is_verified_by_graph(self):
+        identity = verify_token(self.id_token(aud='https://graph.microsoft.com'))
+
+        self.assertEqual(identity.email, 'graph.user@example.com')
+        self.assertEqual(self.server.requests, ['/me'])
+
+    def test_graph_rejection_is_an_invalid_token(self):
+        for graph_status in (401, 403):
+            with self.subTest(graph_status=graph_status):
+                self.server.graph_status = graph_status
+                with self.assertRaises(InvalidMicrosoftToken):
+                    GraphTokenVerifier().verify('opaque-token')
+
+    def test_graph_outage_is_unreachable(self):
+        for graph_status in (429, 500, 503):
+            with self.subTest(graph_status=graph_status):
+                self.server.graph_status = graph_status
+                with self.assertRaises(MicrosoftUnreachable):
+                    verify_token('opaque-token')
+
+    def test_unreachable_signing_keys_are_not_a_rejection(self):
+        with override_settings(MICROSOFT_JWKS_URL='http://127.0.0.1:9/keys'):
+            self.server.graph_status = 503
+            with self.assertRaises(MicrosoftUnreachable):
+                verify_token(self.id_token())
+
+    def test_view_signs_the_user_in(self):
+        response = APIClient().post(reverse('validate_token'), {'token': self.id_token()}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        user = User.objects.get(email='jwks.user@example.com')
+        self.assertEqual((user.first_name, user.last_name), ('Jwks', 'User'))
+
+    def test_view_answers_401_for_a_rejected_token(self):
+        self.server.graph_status = 401
+
+        response = APIClient().post(reverse('validate_token'), {'token': 'opaque-token'}, format='json')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_view_answers_503_when_microsoft_is_unavailable(self):
+        self.server.graph_status = 503
+
+        response = APIClient().post(reverse('validate_token'), {'token': 'opaque-token'}, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.exists())
+
+
+    def test_non_string_token_is_rejected(self):
+        for token in (12345, ['opaque-token'], {'token': 'opaque-token'}):
+            with self.subTest(token=token):
+                with self.assertRaises(InvalidMicrosoftToken):
+                    verify_token(token)
+                response = APIClient().post(reverse('validate_token'), {'token': token}, format='json')
+                self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.server.requests, [])
+
+    def remembered_for(self, token):
+        """Sign in with `token` and return how many seconds it is remembered for."""
+        with mock.patch('user.microsoft.cache', mock.Mock(wraps=cache)) as microsoft_cache:
+            response = APIClient().post(reverse('validate_token'), {'token': token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        (key, _, timeout), _ = microsoft_cache.set.call_args
+        self.assertTrue(key.startswith('microsoft-token:'))
+        return timeout
+
+    def test_verified_tokens_are_remembered_until_they_expire(self):
+        self.assertEqual(self.remembered_for(self.id_token()), 300)
+        # Verified by Graph, which doesn't say when the token expires
+        graph_token = self.id_token(aud='https://graph.microsoft.com', exp=int(time.time()) + 30)
+        self.assertTrue(25 <= self.remembered_for(graph_token) <= 30)
+        self.assertEqual(self.remembered_for('opaque-token'), 60)
+
+
+class UserImportViewTests(TestCase):
+
+    def setUp(self):
+        hr = User.objects.create_user(email='hr@example.com', first_name='Human', last_name='Resources')
+        hr.groups.add(Group.objects.get_or_create(name=HR)[0])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=hr.pk))
+
+    def upload(self, name, content):
+        return self.client.post(reverse('user_import'), {'file': SimpleUploadedFile(name, content)}, format='multipart')
+
+    def test_csv_upload_is_imported_in_process(self):
+        content = b'email,first_name,last_name,department,staff_id,password\nada@example.com,Ada,Lovelace,Ops,S1,secret\n'
+        # The endpoint hashes in the web worker by default, without a pool
+        with mock.patch('user.imports.ProcessPoolExecutor', side_effect=AssertionError('no pool expected')):
+            response = self.upload('staff.csv', content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(User.objects.get(email='ada@example.com').check_password('secret'))
+
+    def test_undecodable_file_is_a_bad_request(self):
+        content = b'email,first_name,last_name\nada@example.com,Ad\xe9,Lovelace\n'
+        response = self.upload('staff.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Could not read the file', response.data['error'])
+        self.assertFalse(User.objects.filter(email='ada@example.com').exists())
+
+    def test_malformed_csv_is_a_bad_request(self):
+        # One row is fine, the next has a field over the csv module's limit
+        content = b'email,first_name,last_name\nada@example.com,Ada,Lovelace\nbob@example.com,"' + b'x' * 200000 + b'",B\n'
+        response = self.upload('staff.csv', content)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(email='ada@example.com').exists())
+
+    def test_invalid_json_is_a_bad_request(self):
+        response = self.upload('staff.json', b'{"email": ')
+        self.assertEqual(response.status_code, 400)
+
+
+class ClaimsAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='ada@example.com', first_name='Ada', last_name='Lovelace')
+        self.user.groups.add(Group.objects.get_or_create(name=LINE_MANAGER)[0])
+        self.authentication = ClaimsJWTAuthentication()
+        self.token = self.authentication.get_validated_token(str(issue_refresh_token(self.user).access_token))
+
+    def change_elsewhere(self, change):
+        """Apply `change` as another worker would, leaving this process's token versions as they were."""
+        keys = [GLOBAL_VERSION_KEY, _version_key(self.user.pk)]
+        versions = cache.get_many(keys)
+        change()
+        cache.set_many(versions, None)
+
+    def deactivate(self):
+        self.user.is_active = False
+        self.user.save()
+
+    def make_hr(self):
+        self.user.groups.set([Group.objects.get_or_create(name=HR)[0]])
+
+    def test_per_process_cache_loads_the_user_from_the_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authentication.get_user(self.token).pk, self.user.pk)
+
+    def test_per_process_cache_rejects_a_user_deactivated_elsewhere(self):
+        self.change_elsewhere(self.deactivate)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.token)
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(self.authentication.aget_user)(self.token)
+
+    def test_per_process_cache_sees_roles_changed_elsewhere(self):
+        self.change_elsewhere(self.make_hr)
+        role_names = self.authentication.get_user(self.token).role_names
+        self.assertIn(HR, role_names)
+        self.assertNotIn(LINE_MANAGER, role_names)
+
+    def test_shared_cache_trusts_the_claims(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with override_settings(CACHES=shared):
+                token = self.authentication.get_validated_token(str(issue_refresh_token(self.user).access_token))
+                with self.assertNumQueries(0):
+                    user = self.authentication.get_user(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertIn(LINE_MANAGER, user.role_names)
+
+    @override_settings(TOKEN_CLAIMS_TRUSTED=True)
+    def test_trusted_claims_reject_a_deactivated_user(self):
+        self.deactivate()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.get_user(self.token)
+        with self.assertRaises(AuthenticationFailed):
+            async_to_sync(self.authentication.aget_user)(self.token)
+
+    @override_settings(TOKEN_CLAIMS_TRUSTED=True)
+    def test_trusted_claims_follow_a_role_change(self):
+        self.assertIn(LINE_MANAGER, self.authentication.get_user(self.token).role_names)
+        self.make_hr()
+        role_names = self.authentication.get_user(self.token).role_names
+        self.assertIn(HR, role_names)
+        self.assertNotIn(LINE_MANAGER, role_names)
+
+
+class AsyncUserEndpointTests(TestCase):
+    """/api/async/users/ answers like /api/users/."""
+
+    def setUp(self):
+        self.operations = Department.objects.create(name='Operations')
+        finance = Department.objects.create(name='Finance')
+        self.hr = User.objects.create_user(
+            email='hr@example.com', first_name='Human', last_name='Resources', department=self.operations,
+        )
+        self.hr.groups.add(Group.objects.get_or_create(name=HR)[0])
+        for index in range(4):
+            User.objects.create_user(
+                email=f'user{index}@example.com', first_name='Ada' if index % 2 else 'Bob', last_name=str(index),
+                department=finance if index % 2 else self.operations,
+            )
+
+    def by_id(self, rows):
+        return sorted(rows, key=lambda row: row['id'])
+
+    async def test_list_matches_the_sync_endpoint(self):
+        for params in ({}, {'department': self.operations.pk}, {'search': 'ad'}, {'ids': '1,3'}):
+            with self.subTest(params=params):
+                sync_response = await sync_to_async(APIClient().get)(reverse('user_list'), params)
+                async_response = await AsyncClient().get(reverse('async_user_list'), params)
+                self.assertEqual((sync_response.status_code, async_response.status_code), (200, 200))
+                self.assertEqual(self.by_id(async_response.json()), self.by_id(sync_response.json()))
+
+        page = (await AsyncClient().get(reverse('async_user_list'), {'page_size': 2})).json()
+        self.assertEqual(len(page['results']), 2)
+        page = (await AsyncClient().get(page['next'])).json()
+        self.assertEqual(len(page['results']), 2)
+
+    async def test_list_errors_match_the_sync_endpoint(self):
+        for params in ({'department': 999999}, {'ids': '1,x'}):
+            with self.subTest(params=params):
+                sync_response = await sync_to_async(APIClient().get)(reverse('user_list'), params)
+                async_response = await AsyncClient().get(reverse('async_user_list'), params)
+                self.assertEqual(async_response.status_code, sync_response.status_code)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_own_record_matches_the_sync_endpoint(self):
+        token = str((await sync_to_async(issue_refresh_token)(self.hr)).access_token)
+        headers = {'Authorization': f'Bearer {token}'}
+        sync_response = await sync_to_async(APIClient().get)(reverse('user_own_view'), headers=headers)
+        async_response = await AsyncClient().get(reverse('async_user_own_view'), headers=headers)
+        self.assertEqual((sync_response.status_code, async_response.status_code), (200, 200))
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response.json()['email'], 'hr@example.com')
+
+        response = await AsyncClient().get(reverse('async_user_own_view'))
+        self.assertEqual(response.status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    """Each TokenBlacklist stands for one worker; they share the cache like workers share Redis."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email='user@example.com', first_name='Some', last_name='One')
+        self.worker = TokenBlacklist()
+
+    def blacklist(self, **kwargs):
+        """Blacklist a new refresh token in another worker; returns its JTI."""
+        token = issue_refresh_token(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        return token['jti']
+
+    def test_catches_up_from_the_cache(self):
+        self.assertFalse(self.worker.might_contain('unknown'))
+        jtis = [self.blacklist(), self.blacklist()]
+        with self.assertNumQueries(0):
+            self.assertTrue(all(self.worker.might_contain(jti) for jti in jtis))
+            self.assertFalse(self.worker.might_contain('unknown'))
+
+    def test_reloads_when_an_entry_left_the_cache(self):
+        self.worker.might_contain('unknown')
+        jti = self.blacklist()
+        cache.delete(_entry_key(cache.get(VERSION_KEY)))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker.might_contain(jti))
+
+    def test_reloads_when_too_far_behind(self):
+        self.worker.might_contain('unknown')
+        jti = self.blacklist()
+        cache.incr(VERSION_KEY, MAX_CATCH_UP)
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker.might_contain(jti))
+
+    def test_reloads_when_the_version_left_the_cache(self):
+        self.worker.might_contain('unknown')
+        cache.delete(VERSION_KEY)
+        jti = self.blacklist()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.worker.might_contain(jti))
+
+    def test_reloads_after_the_timeout(self):
+        self.worker.might_contain('unknown')
+        # Blacklisted without the announcement, as if the cache were per process
+        token = issue_refresh_token(self.user)
+        token.blacklist()
+        self.assertFalse(self.worker.might_contain(token['jti']))
+        later = time.monotonic() + 61
+        with mock.patch('user.blacklist.time.monotonic', return_value=later), self.assertNumQueries(1):
+            self.assertTrue(self.worker.might_contain(token['jti']))
+
+    def test_expired_tokens_are_left_out(self):
+        jti = self.blacklist()
+        OutstandingToken.objects.filter(jti=jti).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(self.worker.might_contain(jti))
+
+    def test_refresh_rejects_a_blacklisted_token(self):
+        client = APIClient()
+        token = issue_refresh_token(self.user)
+        self.assertEqual(client.post(reverse('token_refresh'), {'refresh': str(token)}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        self.assertEqual(client.post(reverse('token_refresh'), {'refresh': str(token)}).status_code, 401)
+
+
+class PruneTokensTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(email='user@example.com', first_name='Some', last_name='One')
+        now = timezone.now()
+        for index in range(7):
+            expires_at = now - timedelta(days=1) if index < 5 else now + timedelta(days=1)
+            token = OutstandingToken.objects.create(
+                user=user, jti=f'jti{index}', token=f'token{index}', created_at=now - timedelta(days=2), expires_at=expires_at,
+            )
+            if index % 2 == 0:
+                BlacklistedToken.objects.create(token=token)
+
+    def test_prunes_in_batches(self):
+        # Select the batch, collect it, delete its blacklist entries, delete it
+        with self.assertNumQueries(4):
+            self.assertEqual(prune_expired_tokens(batch_size=2), 2)
+        self.assertEqual([prune_expired_tokens(batch_size=2) for _ in range(3)], [2, 1, 0])
+        self.assertEqual(set(OutstandingToken.objects.values_list('jti', flat=True)), {'jti5', 'jti6'})
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), ['jti6'])
+
+    def test_command_prunes_everything_once(self):
+        out = StringIO()
+        call_command('prune_tokens', '--once', '--batch-size', '2', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Deleted 5 expired tokens.')
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
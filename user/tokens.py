@@ -0,0 +1,154 @@
+"""JWTs that carry the user's identity and roles as claims.
+
+Tokens are issued with email, department_id, staff_id and roles claims, plus
+``ver``, the user's token version at issue time. ClaimsJWTAuthentication
+(authentication.py) builds request.user from these claims without touching
+the database.
+
+A token version is a random string per user, plus one shared by all users,
+kept in Django's cache. It is replaced whenever the claims could have gone
+stale: the user row is saved or deleted, their groups change, or a group is
+changed (signals.py). A token whose ``ver`` no longer matches falls back to a
+cached database load. So does a token whose version was evicted from the
+cache, because versions are never reused. Access tokens get fresh claims on
+every refresh.
+
+Versions only reach other workers through a shared cache (Redis, see the
+production settings). With the per-process default, another worker would go
+on trusting changed claims until the access token expires, so claims are
+only trusted when claims_trusted() says the cache is shared; otherwise every
+request loads the user from the database as simplejwt does.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import token_blacklist
+from .roles import load_role_names
+
+
+GLOBAL_VERSION_KEY = 'user-token-version'
+
+VERSION_CLAIM = 'ver'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _version_key(user_id):
+    return f'user-token-version:{user_id}'
+
+
+def _join(global_version, user_version):
+    if global_version is None or user_version is None:
+        return None
+    return f'{global_version}.{user_version}'
+
+
+# Backends whose entries never reach another process
+UNSHARED_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def claims_trusted():
+    """TOKEN_CLAIMS_TRUSTED, or when that is None, whether the default cache is shared."""
+    trusted = getattr(settings, 'TOKEN_CLAIMS_TRUSTED', None)
+    if trusted is None:
+        return settings.CACHES['default']['BACKEND'] not in UNSHARED_CACHE_BACKENDS
+    return trusted
+
+
+def token_version(user_id):
+    """The user's current token version, starting one if there is none."""
+    return _join(
+        cache.get_or_set(GLOBAL_VERSION_KEY, _new_version, None),
+        cache.get_or_set(_version_key(user_id), _new_version, None),
+    )
+
+
+def current_token_version(user_id):
+    """The user's current token version, or None if it is not in the cache."""
+    versions = cache.get_many([GLOBAL_VERSION_KEY, _version_key(user_id)])
+    return _join(versions.get(GLOBAL_VERSION_KEY), versions.get(_version_key(user_id)))
+
+
+async def acurrent_token_version(user_id):
+    versions = await cache.aget_many([GLOBAL_VERSION_KEY, _version_key(user_id)])
+    return _join(versions.get(GLOBAL_VERSION_KEY), versions.get(_version_key(user_id)))
+
+
+def bump_token_versions(*user_ids):
+    cache.set_many({_version_key(user_id): _new_version() for user_id in user_ids}, None)
+
+
+def bump_all_token_versions():
+    cache.set(GLOBAL_VERSION_KEY, _new_version(), None)
+
+
+def add_claims(token, user):
+    # Read the version first, so a change made while the claims are being
+    # collected leaves the token stale rather than wrongly fresh
+    token[VERSION_CLAIM] = token_version(user.pk)
+    token['email'] = user.email
+    token['department_id'] = user.department_id
+    token['staff_id'] = user.staff_id
+    token['roles'] = sorted(load_role_names(user))
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """A refresh token that only queries the blacklist for JTIs that may be on it (blacklist.py)."""
+
+    def check_blacklist(self):
+        if token_blacklist.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+def issue_refresh_token(user):
+    """A refresh token for `user` whose access tokens carry the claims."""
+    return add_claims(ClaimsRefreshToken.for_user(user), user)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return issue_refresh_token(user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refreshes with claims reloaded from the user, so a refresh picks up changes."""
+
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        from .models import User
+
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(**{
+            api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM], 'is_active': True,
+        }).first()
+        if user is None:
+            raise AuthenticationFailed('No active account found for this token', code='no_active_account')
+
+        data = {'access': str(add_claims(refresh.access_token, user))}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app is not installed
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(add_claims(refresh, user))
+        return data
@@ -1,25 +1,52 @@
+import csv
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status,viewsets
 from .models import User, Department
-from .serializers import UserSerializer, RegisterUserSerializer, DepartmentSerializer
+from .serializers import UserSerializer, RegisterUserSerializer, DepartmentSerializer, UserImportResultSerializer
+from .imports import import_users, read_upload
+from .roles import HR
+from .tokens import ClaimsTokenObtainPairSerializer, ClaimsTokenRefreshSerializer, issue_refresh_token
+from django.conf import settings
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from django.http import Http404
+from django.db.models import Q
+from egbin_ssp.pagination import IdCursorPagination
+from egbin_ssp.metrics import serialized
+from egbin_ssp.conditional import conditional_response, list_version, make_etag
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
-import requests
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
 from rest_framework.permissions import AllowAny
+from .microsoft import InvalidMicrosoftToken, MicrosoftUnreachable, get_verified_user_id, remember_verified_token, verify_token
 
 
 
 User = get_user_model()
 
 
+def filter_users(users, params):
+    """Apply the `ids` and `search` directory filters; raises ValueError for malformed ids."""
+    ids = params.get('ids')
+    if ids:
+        users = users.filter(id__in=[int(pk) for pk in ids.split(',') if pk.strip()])
+
+    # Prefix matches only, so PostgreSQL can use the UPPER(...) pattern
+    # indexes from migration 0002 instead of scanning the table
+    search = params.get('search', '').strip()
+    if search:
+        users = users.filter(
+            Q(first_name__istartswith=search) | Q(last_name__istartswith=search) |
+            Q(email__istartswith=search) | Q(staff_id__istartswith=search)
+        )
+    return users
+
+
 
 
 @extend_schema(tags=['User Management'])
@@ -30,7 +57,14 @@ class UserView(APIView):
     @extend_schema(
     tags=['User Management'],
         summary="List Users",
-        description="Retrieve a list of users, optionally filtering by department.",
+        description="Retrieve a list of users, optionally filtered by department, IDs or a name/email/staff ID prefix.",
+        parameters=[
+            OpenApiParameter('department', int, description="Only users in this department."),
+            OpenApiParameter('ids', str, description="Comma-separated user IDs."),
+            OpenApiParameter('search', str, description="Prefix of the first name, last name, email or staff ID."),
+            OpenApiParameter('cursor', str, description="Cursor from the previous page's `next`/`previous` link."),
+            OpenApiParameter('page_size', int, description="Number of results per page (max 500)."),
+        ],
         responses={
             200: UserSerializer(many=True),
             404: {
@@ -44,18 +78,26 @@ class UserView(APIView):
         }
     )
     def get(self, request, format=None):
+        users = UserSerializer.setup_eager_loading(User.objects.all())
+
         department_id = request.query_params.get('department', None)
-        
         if department_id:
-            try:
-                department = Department.objects.get(id=department_id)
-                users = User.objects.filter(department=department)
-            except Department.DoesNotExist:
+            if not Department.objects.filter(id=department_id).exists():
                 return Response({'error': 'Department not found'}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+            users = users.filter(department_id=department_id)
+
+        try:
+            users = filter_users(users, request.query_params)
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = IdCursorPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        if page is None:
+            serializer = UserSerializer(users, many=True)
+            return Response(serialized(serializer))
+        serializer = UserSerializer(page, many=True)
+        return paginator.get_paginated_response(serialized(serializer))
     
 
 
@@ -80,10 +122,54 @@ class UserView(APIView):
         serializer = RegisterUserSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serialized(serializer), status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+@extend_schema(tags=['User Management'])
+class UserImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, JSONParser]
+
+    @extend_schema(
+        tags=['User Management'],
+        summary="Import users",
+        description=(
+            "Create or update many users at once, HR only. Send a `file` (.csv or .json) as multipart form data, "
+            "or a JSON list of rows. Rows have email, first_name, last_name, department (a name, created if new), "
+            "staff_id and password (leave empty for Microsoft-only users). Existing users are matched by email, "
+            "then staff_id. Every row is reported as created, updated or failed."
+        ),
+        request={
+            'multipart/form-data': {'type': 'object', 'properties': {'file': {'type': 'string', 'format': 'binary'}}},
+            'application/json': {'type': 'array', 'items': {'type': 'object'}},
+        },
+        responses={200: UserImportResultSerializer},
+    )
+    def post(self, request, format=None):
+        if not request.user.has_role(HR):
+            return Response({'error': 'Not permitted to import users'}, status=status.HTTP_403_FORBIDDEN)
+
+        if isinstance(request.data, list):
+            rows = request.data
+        elif 'file' in request.FILES:
+            try:
+                # Read the whole file first, so an undecodable or malformed
+                # one is refused before any of it is imported
+                rows = list(read_upload(request.FILES['file']))
+            except (ValueError, csv.Error) as error:
+                return Response({'error': f'Could not read the file: {error}'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'error': 'Send a file or a JSON list of rows'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Hashing happens in this worker unless USER_IMPORT_WORKERS asks for a
+        # pool. Forking a threaded web worker is unsafe, so the pool is spawned.
+        summary = import_users(rows, workers=getattr(settings, 'USER_IMPORT_WORKERS', 1), start_method='spawn')
+        return Response(serialized(UserImportResultSerializer(summary)))
+
+
+
+
 @extend_schema(tags=['User Management'])
 class UserOwnView(APIView):
     permission_classes = [IsAuthenticated]
@@ -106,8 +192,10 @@ class UserOwnView(APIView):
         }
     )
     def get(self, request, format=None):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        # request.user may be built from token claims, so load the full record
+        user = UserSerializer.setup_eager_loading(User.objects.all()).get(pk=request.user.pk)
+        serializer = UserSerializer(user)
+        return Response(serialized(serializer))
     
 
 
@@ -141,9 +229,12 @@ class UserDetailView(APIView):
     }
 )
     def get(self, request, pk, format=None):
-        user = self.get_object(pk)
+        try:
+            user = UserSerializer.setup_eager_loading(User.objects.all()).get(pk=pk)
+        except User.DoesNotExist:
+            raise Http404
         serializer = UserSerializer(user)
-        return Response(serializer.data)
+        return Response(serialized(serializer))
 
 
 
@@ -178,7 +269,7 @@ class UserDetailView(APIView):
         serializer = RegisterUserSerializer(user, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serialized(serializer))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
@@ -215,7 +306,7 @@ class UserDetailView(APIView):
         serializer = RegisterUserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data)
+            return Response(serialized(serializer))
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -254,7 +345,8 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         responses={200: DepartmentSerializer(many=True)},
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        etag = make_etag(request, *list_version(self.get_queryset()))
+        return conditional_response(request, lambda: super(DepartmentViewSet, self).list(request, *args, **kwargs), etag)
 
     @extend_schema(
         operation_id="create_department",
@@ -273,7 +365,11 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         responses={200: DepartmentSerializer},
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+        department = self.get_object()
+        return conditional_response(
+            request, lambda: Response(serialized(self.get_serializer(department))),
+            make_etag(request, department.updated_at), department.updated_at,
+        )
 
     @extend_schema(
         operation_id="update_department",
@@ -340,6 +436,12 @@ class DepartmentViewSet(viewsets.ModelViewSet):
             "properties": {
                 "detail": {"type": "string", "example": "Invalid token"}
             }
+        },
+        503: {
+            "type": "object",
+            "properties": {
+                "detail": {"type": "string", "example": "Microsoft sign-in is unavailable, try again later"}
+            }
         }
     }
 )
@@ -350,29 +452,38 @@ class MicrosoftTokenValidationView(APIView):
     def post(self, request):
         token = request.data.get('token')
 
-        # Validate token with Microsoft Graph API
-        response = requests.get(
-            'https://graph.microsoft.com/v1.0/me',
-            headers={'Authorization': f'Bearer {token}'}
-        )
-
-        if response.status_code != 200:
-            return Response({'detail': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
-
-        data = response.json()
-        email = data.get('mail') or data.get('userPrincipalName')
+        # Tokens verified recently map straight to their user
+        user_id = get_verified_user_id(token) if token and isinstance(token, str) else None
+        user = User.objects.filter(pk=user_id).first() if user_id else None
 
-        user, created = User.objects.get_or_create(email=email, defaults={
-            'first_name': data.get('givenName', ''),
-            'last_name': data.get('surname', '')
-        })
-
-        if not created:
-            user.first_name = data.get('givenName', user.first_name)
-            user.last_name = data.get('surname', user.last_name)
-            user.save()
-
-        refresh = RefreshToken.for_user(user)
+        if user is None:
+            try:
+                identity = verify_token(token)
+            except InvalidMicrosoftToken:
+                return Response({'detail': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+            except MicrosoftUnreachable:
+                return Response(
+                    {'detail': 'Microsoft sign-in is unavailable, try again later'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+
+            user, created = User.objects.get_or_create(email=identity.email, defaults={
+                'first_name': identity.first_name or '',
+                'last_name': identity.last_name or ''
+            })
+
+            if not created:
+                # Only write the row when the names actually changed
+                first_name = identity.first_name or user.first_name
+                last_name = identity.last_name or user.last_name
+                if (first_name, last_name) != (user.first_name, user.last_name):
+                    user.first_name = first_name
+                    user.last_name = last_name
+                    user.save(update_fields=['first_name', 'last_name'])
+
+            remember_verified_token(token, identity, user.pk)
+
+        refresh = issue_refresh_token(user)
 
         return Response({
             'refresh': str(refresh),
@@ -409,6 +520,8 @@ class MicrosoftTokenValidationView(APIView):
     )
 )
 class CustomTokenObtainPairView(TokenObtainPairView):
+    serializer_class = ClaimsTokenObtainPairSerializer
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         refresh_token = response.data.get('refresh')
@@ -448,4 +561,4 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     )
 )
 class CustomTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = ClaimsTokenRefreshSerializer